@@ -9,12 +9,22 @@ Handles:
 """
 
 from shared.models import (
-    PriceData, IntradayPriceData, FundamentalData, NewsData,
+    BarBatch, IntradayPriceData, FundamentalData, NewsData,
     DataProvider, HealthCheckResponse, ErrorResponse
 )
 from shared.logging_config import setup_logging, get_logger
-from shared.gcp_secrets import get_alphavantage_key
+from shared.gcp_secrets import get_alphavantage_key, secret_cache, start_secret_cache
 from shared.firestore_client import FirestoreClient
+from shared.metrics import install_metrics
+from shared.retry import DeadlineMiddleware
+from shared.tracing import TracingMiddleware, configure_tracing
+from shared.http_client import http_clients
+from shared.rate_limiter import RateLimitExceeded, rate_limiter
+from shared.responses import FastJSONResponse, FastJSONRoute
+from shared.write_behind import WriteBehindQueue, default_wal_dir
+from shared.price_columns import (
+    epoch_seconds, store_columnar_prices, writes_columnar, writes_rows
+)
 import asyncio
 import os
 from datetime import datetime, timedelta
@@ -39,8 +49,11 @@ logger = get_logger()
 app = FastAPI(
     title="Alpha Vantage Data Ingestion Service",
     description="Fetches financial data from Alpha Vantage API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+# Render results with orjson directly instead of through jsonable_encoder
+app.router.route_class = FastJSONRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -50,26 +63,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Firestore usage per route, served at /metrics
+install_metrics(app, "alphavantage-service", lambda: firestore_client,
+                extra={"write_behind": lambda: write_queue.stats() if write_queue else None,
+                       "secrets": secret_cache.stats,
+                       "http": http_clients.stats,
+                       "rate_limits": rate_limiter.stats})
+
+# Firestore time budget per request (REQUEST_DEADLINE_S)
+app.add_middleware(DeadlineMiddleware)
+
+# Spans per request, continuing the caller's trace (TRACE_EXPORT)
+configure_tracing("alphavantage-service")
+app.add_middleware(TracingMiddleware)
+
 # Global clients
 firestore_client = None
-api_key = None
+write_queue = None
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize clients on startup."""
-    global firestore_client, api_key
+    global firestore_client, write_queue
 
     firestore_client = FirestoreClient()
-    api_key = get_alphavantage_key()
+    # Keys are read from the secret cache per request, so rotations apply live
+    await start_secret_cache("alphavantage-api-key")
 
-    if not api_key:
+    if not get_alphavantage_key():
         logger.error("Alpha Vantage API key not found")
         raise RuntimeError("Alpha Vantage API key not configured")
 
+    # Provider connections are kept alive across background tasks
+    await http_clients.start(AlphaVantageClient.BASE_URL)
+
+    # Provider request budgets; RATE_LIMIT_BACKEND=firestore shares them across instances
+    rate_limiter.configure(firestore_client)
+
+    # Writes are acknowledged once logged locally and drained in the background
+    write_queue = WriteBehindQueue(firestore_client, default_wal_dir("alphavantage-service"))
+    await write_queue.start()
+
     logger.info("Alpha Vantage service started")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Drain queued writes before exiting; the rest is replayed on restart."""
+    if write_queue is not None:
+        await write_queue.stop()
+    await secret_cache.stop()
+    await http_clients.close()
+
+
 class AlphaVantageClient:
     """Client for Alpha Vantage API."""
 
@@ -77,17 +124,19 @@ class AlphaVantageClient:
 
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Shared keep-alive pool; closed at shutdown, not per client
+        self.client = http_clients.client(self.BASE_URL)
         self.logger = get_logger("AlphaVantageClient")
 
-    async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
-
     async def _make_request(self, params: Dict[str, str]) -> Dict[str, Any]:
         """Make API request with error handling."""
         params["apikey"] = self.api_key
 
+        try:
+            await rate_limiter.acquire(DataProvider.ALPHAVANTAGE)
+        except RateLimitExceeded as e:
+            raise HTTPException(status_code=429, detail=str(e))
+
         try:
             response = await self.client.get(self.BASE_URL, params=params)
             response.raise_for_status()
@@ -107,7 +156,7 @@ class AlphaVantageClient:
             raise HTTPException(
                 status_code=500, detail=f"API request failed: {str(e)}")
 
-    async def get_daily_prices(self, symbol: str, outputsize: str = "compact") -> List[PriceData]:
+    async def get_daily_prices(self, symbol: str, outputsize: str = "compact") -> BarBatch:
         """Get daily price data for a symbol."""
         params = {
             "function": "TIME_SERIES_DAILY_ADJUSTED",
@@ -118,26 +167,24 @@ class AlphaVantageClient:
         data = await self._make_request(params)
         time_series = data.get("Time Series (Daily)", {})
 
-        prices = []
+        prices = BarBatch(symbol, DataProvider.ALPHAVANTAGE)
         for date_str, price_data in time_series.items():
             try:
-                price = PriceData(
-                    symbol=symbol,
-                    date=datetime.strptime(date_str, "%Y-%m-%d"),
-                    open_price=Decimal(price_data["1. open"]),
-                    high_price=Decimal(price_data["2. high"]),
-                    low_price=Decimal(price_data["3. low"]),
-                    close_price=Decimal(price_data["4. close"]),
-                    adjusted_close=Decimal(price_data["5. adjusted close"]),
-                    volume=int(price_data["6. volume"]),
-                    provider=DataProvider.ALPHAVANTAGE
+                prices.append(
+                    epoch_seconds(datetime.strptime(date_str, "%Y-%m-%d")),
+                    float(price_data["1. open"]), float(price_data["2. high"]),
+                    float(price_data["3. low"]), float(price_data["4. close"]),
+                    int(price_data["6. volume"]),
+                    adjusted_close=float(price_data["5. adjusted close"])
                 )
-                prices.append(price)
             except (ValueError, KeyError) as e:
                 self.logger.error("Error parsing price data",
                                   symbol=symbol, date=date_str, error=str(e))
                 continue
 
+        dropped = prices.validate()
+        if dropped:
+            self.logger.warning("Invalid bars dropped", symbol=symbol, count=dropped)
         return prices
 
     async def get_intraday_prices(self, symbol: str, interval: str = "5min") -> List[IntradayPriceData]:
@@ -252,62 +299,52 @@ async def ingest_batch_daily(symbols: List[str], background_tasks: BackgroundTas
 # Background tasks
 async def fetch_and_store_daily_prices(symbol: str):
     """Fetch and store daily price data."""
-    client = AlphaVantageClient(api_key)
+    client = AlphaVantageClient(get_alphavantage_key())
 
     try:
         prices = await client.get_daily_prices(symbol)
 
         # Store in Firestore
-        for price in prices:
-            document_id = f"{symbol}_{price.date.strftime('%Y-%m-%d')}"
-            await firestore_client.upsert_document(
-                "di_prices_daily",
-                document_id,
-                price.dict()
-            )
+        if writes_rows():
+            await write_queue.upsert_many("di_prices_daily", prices.to_documents())
+        if writes_columnar():
+            await store_columnar_prices(firestore_client, symbol, prices)
 
         logger.info("Daily prices stored", symbol=symbol, count=len(prices))
     except Exception as e:
         logger.error("Failed to fetch daily prices",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_intraday_prices(symbol: str):
     """Fetch and store intraday price data."""
-    client = AlphaVantageClient(api_key)
+    client = AlphaVantageClient(get_alphavantage_key())
 
     try:
         prices = await client.get_intraday_prices(symbol)
 
         # Store in Firestore
-        for price in prices:
-            document_id = f"{symbol}_{price.timestamp.strftime('%Y-%m-%d_%H-%M-%S')}"
-            await firestore_client.upsert_document(
-                "di_prices_intraday",
-                document_id,
-                price.dict()
-            )
+        await write_queue.upsert_many("di_prices_intraday", [
+            (f"{symbol}_{price.timestamp.strftime('%Y-%m-%d_%H-%M-%S')}", price.dict())
+            for price in prices
+        ])
 
         logger.info("Intraday prices stored", symbol=symbol, count=len(prices))
     except Exception as e:
         logger.error("Failed to fetch intraday prices",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_fundamentals(symbol: str):
     """Fetch and store fundamental data."""
-    client = AlphaVantageClient(api_key)
+    client = AlphaVantageClient(get_alphavantage_key())
 
     try:
         fundamental = await client.get_company_overview(symbol)
 
         if fundamental:
             document_id = f"{symbol}_{datetime.now().strftime('%Y-%m-%d')}"
-            await firestore_client.upsert_document(
+            await write_queue.upsert(
                 "di_fundamentals",
                 document_id,
                 fundamental.dict()
@@ -318,8 +355,6 @@ async def fetch_and_store_fundamentals(symbol: str):
     except Exception as e:
         logger.error("Failed to fetch fundamental data",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 if __name__ == "__main__":
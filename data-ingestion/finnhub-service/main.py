@@ -10,12 +10,20 @@ Handles:
 """
 
 from shared.models import (
-    PriceData, IntradayPriceData, FundamentalData, NewsData,
+    BarBatch, IntradayPriceData, FundamentalData, NewsData,
     DataProvider, HealthCheckResponse, ErrorResponse
 )
 from shared.logging_config import setup_logging, get_logger
-from shared.gcp_secrets import get_finnhub_key
+from shared.gcp_secrets import get_finnhub_key, secret_cache, start_secret_cache
 from shared.firestore_client import FirestoreClient
+from shared.metrics import install_metrics
+from shared.retry import DeadlineMiddleware
+from shared.tracing import TracingMiddleware, configure_tracing
+from shared.http_client import http_clients
+from shared.rate_limiter import RateLimitExceeded, rate_limiter
+from shared.responses import FastJSONResponse, FastJSONRoute
+from shared.write_behind import WriteBehindQueue, default_wal_dir
+from shared.price_columns import store_columnar_prices, writes_columnar, writes_rows
 import asyncio
 import os
 from datetime import datetime, timedelta
@@ -39,8 +47,11 @@ logger = get_logger()
 app = FastAPI(
     title="Finnhub Data Ingestion Service",
     description="Fetches financial data from Finnhub API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+# Render results with orjson directly instead of through jsonable_encoder
+app.router.route_class = FastJSONRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -50,26 +61,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Firestore usage per route, served at /metrics
+install_metrics(app, "finnhub-service", lambda: firestore_client,
+                extra={"write_behind": lambda: write_queue.stats() if write_queue else None,
+                       "secrets": secret_cache.stats,
+                       "http": http_clients.stats,
+                       "rate_limits": rate_limiter.stats})
+
+# Firestore time budget per request (REQUEST_DEADLINE_S)
+app.add_middleware(DeadlineMiddleware)
+
+# Spans per request, continuing the caller's trace (TRACE_EXPORT)
+configure_tracing("finnhub-service")
+app.add_middleware(TracingMiddleware)
+
 # Global clients
 firestore_client = None
-api_key = None
+write_queue = None
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize clients on startup."""
-    global firestore_client, api_key
+    global firestore_client, write_queue
 
     firestore_client = FirestoreClient()
-    api_key = get_finnhub_key()
+    # Keys are read from the secret cache per request, so rotations apply live
+    await start_secret_cache("finnhub-api-key")
 
-    if not api_key:
+    if not get_finnhub_key():
         logger.error("Finnhub API key not found")
         raise RuntimeError("Finnhub API key not configured")
 
+    # Provider connections are kept alive across background tasks
+    await http_clients.start(FinnhubClient.BASE_URL)
+
+    # Provider request budgets; RATE_LIMIT_BACKEND=firestore shares them across instances
+    rate_limiter.configure(firestore_client)
+
+    # Writes are acknowledged once logged locally and drained in the background
+    write_queue = WriteBehindQueue(firestore_client, default_wal_dir("finnhub-service"))
+    await write_queue.start()
+
     logger.info("Finnhub service started")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Drain queued writes before exiting; the rest is replayed on restart."""
+    if write_queue is not None:
+        await write_queue.stop()
+    await secret_cache.stop()
+    await http_clients.close()
+
+
 class FinnhubClient:
     """Client for Finnhub API."""
 
@@ -77,13 +122,10 @@ class FinnhubClient:
 
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Shared keep-alive pool; closed at shutdown, not per client
+        self.client = http_clients.client(self.BASE_URL)
         self.logger = get_logger("FinnhubClient")
 
-    async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
-
     async def _make_request(self, endpoint: str, params: Dict[str, str] = None) -> Dict[str, Any]:
         """Make API request with error handling."""
         if params is None:
@@ -92,6 +134,11 @@ class FinnhubClient:
 
         url = f"{self.BASE_URL}/{endpoint}"
 
+        try:
+            await rate_limiter.acquire(DataProvider.FINNHUB)
+        except RateLimitExceeded as e:
+            raise HTTPException(status_code=429, detail=str(e))
+
         try:
             response = await self.client.get(url, params=params)
             response.raise_for_status()
@@ -131,7 +178,7 @@ class FinnhubClient:
             return None
 
     async def get_candles(self, symbol: str, resolution: str = "D",
-                          from_date: datetime = None, to_date: datetime = None) -> List[PriceData]:
+                          from_date: datetime = None, to_date: datetime = None) -> BarBatch:
         """Get candlestick data for a symbol."""
         if from_date is None:
             from_date = datetime.now() - timedelta(days=365)
@@ -147,28 +194,26 @@ class FinnhubClient:
 
         data = await self._make_request("stock/candle", params)
 
+        prices = BarBatch(symbol, DataProvider.FINNHUB)
         if data.get("s") != "ok" or not data.get("c"):
-            return []
+            return prices
 
-        prices = []
         for i in range(len(data["c"])):
             try:
-                price = PriceData(
-                    symbol=symbol,
-                    date=datetime.fromtimestamp(data["t"][i]),
-                    open_price=Decimal(str(data["o"][i])),
-                    high_price=Decimal(str(data["h"][i])),
-                    low_price=Decimal(str(data["l"][i])),
-                    close_price=Decimal(str(data["c"][i])),
-                    volume=data["v"][i],
-                    provider=DataProvider.FINNHUB
+                prices.append(
+                    int(data["t"][i]),
+                    float(data["o"][i]), float(data["h"][i]),
+                    float(data["l"][i]), float(data["c"][i]),
+                    int(data["v"][i])
                 )
-                prices.append(price)
-            except (ValueError, KeyError, IndexError) as e:
+            except (ValueError, KeyError, IndexError, TypeError) as e:
                 self.logger.error("Error parsing candle data",
                                   symbol=symbol, index=i, error=str(e))
                 continue
 
+        dropped = prices.validate()
+        if dropped:
+            self.logger.warning("Invalid bars dropped", symbol=symbol, count=dropped)
         return prices
 
     async def get_basic_fundamentals(self, symbol: str) -> Optional[FundamentalData]:
@@ -312,14 +357,14 @@ async def ingest_market_news(background_tasks: BackgroundTasks, category: str =
 # Background tasks
 async def fetch_and_store_quote(symbol: str):
     """Fetch and store real-time quote."""
-    client = FinnhubClient(api_key)
+    client = FinnhubClient(get_finnhub_key())
 
     try:
         quote = await client.get_quote(symbol)
 
         if quote:
             document_id = f"{symbol}_{quote.timestamp.strftime('%Y-%m-%d_%H-%M-%S')}"
-            await firestore_client.upsert_document(
+            await write_queue.upsert(
                 "di_prices_intraday",
                 document_id,
                 quote.dict()
@@ -327,44 +372,37 @@ async def fetch_and_store_quote(symbol: str):
             logger.info("Quote stored", symbol=symbol)
     except Exception as e:
         logger.error("Failed to fetch quote", symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_daily_prices(symbol: str):
     """Fetch and store daily price data."""
-    client = FinnhubClient(api_key)
+    client = FinnhubClient(get_finnhub_key())
 
     try:
         prices = await client.get_candles(symbol, resolution="D")
 
         # Store in Firestore
-        for price in prices:
-            document_id = f"{symbol}_{price.date.strftime('%Y-%m-%d')}"
-            await firestore_client.upsert_document(
-                "di_prices_daily",
-                document_id,
-                price.dict()
-            )
+        if writes_rows():
+            await write_queue.upsert_many("di_prices_daily", prices.to_documents())
+        if writes_columnar():
+            await store_columnar_prices(firestore_client, symbol, prices)
 
         logger.info("Daily prices stored", symbol=symbol, count=len(prices))
     except Exception as e:
         logger.error("Failed to fetch daily prices",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_fundamentals(symbol: str):
     """Fetch and store fundamental data."""
-    client = FinnhubClient(api_key)
+    client = FinnhubClient(get_finnhub_key())
 
     try:
         fundamental = await client.get_basic_fundamentals(symbol)
 
         if fundamental:
             document_id = f"{symbol}_{datetime.now().strftime('%Y-%m-%d')}"
-            await firestore_client.upsert_document(
+            await write_queue.upsert(
                 "di_fundamentals",
                 document_id,
                 fundamental.dict()
@@ -373,58 +411,46 @@ async def fetch_and_store_fundamentals(symbol: str):
     except Exception as e:
         logger.error("Failed to fetch fundamental data",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_company_news(symbol: str):
     """Fetch and store company news."""
-    client = FinnhubClient(api_key)
+    client = FinnhubClient(get_finnhub_key())
 
     try:
         news_items = await client.get_company_news(symbol)
 
         # Store in Firestore
-        for news in news_items:
-            document_id = f"{symbol}_{news.published_at.strftime('%Y-%m-%d_%H-%M-%S')}"
-            await firestore_client.upsert_document(
-                "di_company_news",
-                document_id,
-                news.dict()
-            )
+        await write_queue.upsert_many("di_company_news", [
+            (f"{symbol}_{news.published_at.strftime('%Y-%m-%d_%H-%M-%S')}", news.dict())
+            for news in news_items
+        ])
 
         logger.info("Company news stored",
                     symbol=symbol, count=len(news_items))
     except Exception as e:
         logger.error("Failed to fetch company news",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_market_news(category: str):
     """Fetch and store market news."""
-    client = FinnhubClient(api_key)
+    client = FinnhubClient(get_finnhub_key())
 
     try:
         news_items = await client.get_market_news(category)
 
         # Store in Firestore
-        for news in news_items:
-            document_id = f"market_{news.published_at.strftime('%Y-%m-%d_%H-%M-%S')}"
-            await firestore_client.upsert_document(
-                "di_market_news",
-                document_id,
-                news.dict()
-            )
+        await write_queue.upsert_many("di_market_news", [
+            (f"market_{news.published_at.strftime('%Y-%m-%d_%H-%M-%S')}", news.dict())
+            for news in news_items
+        ])
 
         logger.info("Market news stored", category=category,
                     count=len(news_items))
     except Exception as e:
         logger.error("Failed to fetch market news",
                      category=category, error=str(e))
-    finally:
-        await client.close()
 
 
 if __name__ == "__main__":
@@ -6,12 +6,19 @@ Coordinates data collection from multiple sources based on:
 - Watchlist symbols (daily prices, monthly fundamentals)
 - Market news (regular intervals)
 
-Optimizes API calls to stay within free tier limits.
+Provider API calls are paced by the services themselves (shared/rate_limiter.py),
+so collection calls are made concurrently instead of behind fixed delays.
 """
 
 from shared.models import HealthCheckResponse, ErrorResponse
 from shared.logging_config import setup_logging, get_logger
 from shared.firestore_client import FirestoreClient
+from shared.live_view import LiveCollection
+from shared.metrics import install_metrics
+from shared.retry import DeadlineMiddleware
+from shared.tracing import TracingMiddleware, TracingTransport, configure_tracing, traced
+from shared.responses import FastJSONResponse, FastJSONRoute
+from shared.rate_limiter import daily_limit
 import asyncio
 import os
 from datetime import datetime, timedelta
@@ -36,8 +43,11 @@ logger = get_logger()
 app = FastAPI(
     title="Data Ingestion Orchestrator",
     description="Coordinates data collection from multiple financial data sources",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+# Render results with orjson directly instead of through jsonable_encoder
+app.router.route_class = FastJSONRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -47,6 +57,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Firestore usage per route, served at /metrics
+install_metrics(app, "orchestrator-service", lambda: firestore_client,
+                extra={"live_views": lambda: {view.collection: view.stats()
+                                              for view in (positions_view, watchlist_view) if view}})
+
+# Firestore time budget per request (REQUEST_DEADLINE_S)
+app.add_middleware(DeadlineMiddleware)
+
+# Spans per request, continuing the caller's trace (TRACE_EXPORT)
+configure_tracing("orchestrator-service")
+app.add_middleware(TracingMiddleware)
+
 
 class TaskType(str, Enum):
     INTRADAY_PRICES = "intraday_prices"
@@ -71,20 +93,46 @@ SERVICE_URLS = {
     DataProvider.TIINGO: "http://tiingo-service:8080"
 }
 
+# Read cache TTLs (seconds) for the symbol lists, used until the live views are ready
+FIRESTORE_CACHE_TTLS = {
+    "pf_watchlist": 60,
+    "pf_positions_active": 30,
+}
+
+# Service calls in flight at once; the provider services pace the API requests
+MAX_CONCURRENT_CALLS = int(os.getenv("ORCHESTRATOR_CONCURRENCY", "8"))
+
 # Global clients
 firestore_client = None
 publisher = None
 http_client = None
 
+# Live mirrors of the symbol lists (see shared/live_view.py)
+positions_view = None
+watchlist_view = None
+
+
+def _live(view: Optional[LiveCollection]) -> Optional[LiveCollection]:
+    """The view once it is serving, else None (read Firestore)."""
+    return view if view is not None and view.ready else None
+
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize clients on startup."""
-    global firestore_client, publisher, http_client
+    global firestore_client, publisher, http_client, positions_view, watchlist_view
 
-    firestore_client = FirestoreClient()
-    publisher = pubsub_v1.PublisherClient()
-    http_client = httpx.AsyncClient(timeout=60.0)
+    firestore_client = FirestoreClient(cache_ttls=FIRESTORE_CACHE_TTLS)
+    positions_view = LiveCollection(firestore_client, "pf_positions_active",
+                                    filters=[("status", "==", "active")])
+    watchlist_view = LiveCollection(firestore_client, "pf_watchlist")
+    await asyncio.gather(positions_view.start(), watchlist_view.start())
+    try:
+        publisher = pubsub_v1.PublisherClient()
+    except Exception as e:
+        # Not used on the request path; lets the service start without GCP credentials
+        logger.warning("Pub/Sub publisher unavailable", error=str(e))
+    http_client = httpx.AsyncClient(timeout=60.0, transport=TracingTransport())
 
     logger.info("Orchestrator service started")
 
@@ -95,6 +143,9 @@ async def shutdown_event():
     global http_client
     if http_client:
         await http_client.aclose()
+    for view in (positions_view, watchlist_view):
+        if view is not None:
+            await view.stop()
 
 
 class OrchestrationEngine:
@@ -117,19 +168,11 @@ class OrchestrationEngine:
         """Check if we can make an API call without exceeding limits."""
         self.reset_api_counters_if_needed()
 
-        # Free tier limits (conservative estimates)
-        DAILY_LIMITS = {
-            DataProvider.ALPHAVANTAGE: 100,  # 5 calls per minute, ~500/day conservative
-            DataProvider.FINNHUB: 250,      # 60 calls per minute on free tier
-            DataProvider.POLYGON: 100,      # 5 calls per minute on free tier
-            DataProvider.TIINGO: 500        # 1000 calls per day on free tier
-        }
-
-        provider_key = provider.value
-        current_count = self.api_call_counts.get(provider_key, 0)
-        limit = DAILY_LIMITS.get(provider, 100)
+        # Same daily budgets the provider services enforce (shared/rate_limiter.py)
+        limit = daily_limit(provider)
+        current_count = self.api_call_counts.get(provider.value, 0)
 
-        return current_count < limit
+        return limit is None or current_count < limit
 
     def increment_api_call_count(self, provider: DataProvider):
         """Increment API call count for a provider."""
@@ -137,12 +180,32 @@ class OrchestrationEngine:
         self.api_call_counts[provider_key] = self.api_call_counts.get(
             provider_key, 0) + 1
 
+    def release_api_call(self, provider: DataProvider):
+        """Return a counted API call that did not go through."""
+        provider_key = provider.value
+        self.api_call_counts[provider_key] = max(
+            0, self.api_call_counts.get(provider_key, 0) - 1)
+
+    async def run_calls(self, calls: List) -> List[bool]:
+        """Await service calls concurrently, at most MAX_CONCURRENT_CALLS at a time."""
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+
+        async def run(call):
+            async with semaphore:
+                return await call
+
+        return await asyncio.gather(*(run(call) for call in calls))
+
     async def get_active_positions(self) -> List[str]:
         """Get list of symbols from active positions."""
         try:
+            view = _live(positions_view)
+            if view is not None:
+                return [pos["symbol"] for pos in view.values()]
             positions = await firestore_client.query_documents(
                 "pf_positions_active",
-                filters=[("status", "==", "active")]
+                filters=[("status", "==", "active")],
+                select=["symbol"]
             )
             return [pos["symbol"] for pos in positions]
         except Exception as e:
@@ -152,7 +215,11 @@ class OrchestrationEngine:
     async def get_watchlist_symbols(self) -> List[str]:
         """Get list of symbols from watchlist."""
         try:
-            watchlist = await firestore_client.query_documents("pf_watchlist")
+            view = _live(watchlist_view)
+            if view is not None:
+                return [item["symbol"] for item in view.values()]
+            watchlist = await firestore_client.query_documents(
+                "pf_watchlist", select=["symbol"])
             return [item["symbol"] for item in watchlist]
         except Exception as e:
             self.logger.error("Failed to get watchlist symbols", error=str(e))
@@ -161,17 +228,20 @@ class OrchestrationEngine:
     async def call_service_endpoint(self, provider: DataProvider, endpoint: str,
                                     symbol: str = None) -> bool:
         """Call a specific service endpoint."""
+        base_url = SERVICE_URLS.get(provider)
+        if not base_url:
+            self.logger.error("Service URL not configured",
+                              provider=provider.value)
+            return False
+
         if not self.can_make_api_call(provider, TaskType.DAILY_PRICES):
             self.logger.warning("API limit reached", provider=provider.value)
             return False
+        # Count the call before awaiting it, so concurrent calls cannot all
+        # pass the check for the same last slot
+        self.increment_api_call_count(provider)
 
         try:
-            base_url = SERVICE_URLS.get(provider)
-            if not base_url:
-                self.logger.error("Service URL not configured",
-                                  provider=provider.value)
-                return False
-
             url = f"{base_url}/{endpoint}"
             if symbol:
                 url = url.replace("{symbol}", symbol)
@@ -179,16 +249,17 @@ class OrchestrationEngine:
             response = await http_client.post(url)
             response.raise_for_status()
 
-            self.increment_api_call_count(provider)
             self.logger.info("Service endpoint called",
                              provider=provider.value, endpoint=endpoint, symbol=symbol)
             return True
 
         except Exception as e:
+            self.release_api_call(provider)
             self.logger.error("Failed to call service endpoint",
                               provider=provider.value, endpoint=endpoint, symbol=symbol, error=str(e))
             return False
 
+    @traced()
     async def orchestrate_intraday_data_collection(self):
         """Collect intraday data for active positions."""
         active_symbols = await self.get_active_positions()
@@ -203,21 +274,25 @@ class OrchestrationEngine:
         # Distribute symbols across providers to balance load
         providers = [DataProvider.FINNHUB, DataProvider.ALPHAVANTAGE]
 
+        calls = []
         for i, symbol in enumerate(active_symbols):
             provider = providers[i % len(providers)]
 
             # Get real-time quotes
             if provider == DataProvider.FINNHUB:
-                await self.call_service_endpoint(provider, "ingest/quote/{symbol}", symbol)
+                calls.append(self.call_service_endpoint(
+                    provider, "ingest/quote/{symbol}", symbol))
             elif provider == DataProvider.ALPHAVANTAGE:
-                await self.call_service_endpoint(provider, "ingest/intraday-prices/{symbol}", symbol)
+                calls.append(self.call_service_endpoint(
+                    provider, "ingest/intraday-prices/{symbol}", symbol))
 
             # Get company news
-            await self.call_service_endpoint(provider, "ingest/company-news/{symbol}", symbol)
+            calls.append(self.call_service_endpoint(
+                provider, "ingest/company-news/{symbol}", symbol))
 
-            # Small delay to avoid rate limiting
-            await asyncio.sleep(0.5)
+        await self.run_calls(calls)
 
+    @traced()
     async def orchestrate_daily_data_collection(self):
         """Collect daily data for watchlist symbols."""
         watchlist_symbols = await self.get_watchlist_symbols()
@@ -237,15 +312,14 @@ class OrchestrationEngine:
         providers = [DataProvider.ALPHAVANTAGE, DataProvider.FINNHUB,
                      DataProvider.POLYGON, DataProvider.TIINGO]
 
-        for i, symbol in enumerate(all_symbols):
-            provider = providers[i % len(providers)]
-
-            # Get daily prices
-            await self.call_service_endpoint(provider, "ingest/daily-prices/{symbol}", symbol)
-
-            # Small delay to avoid rate limiting
-            await asyncio.sleep(1.0)
+        # Get daily prices
+        await self.run_calls([
+            self.call_service_endpoint(
+                providers[i % len(providers)], "ingest/daily-prices/{symbol}", symbol)
+            for i, symbol in enumerate(all_symbols)
+        ])
 
+    @traced()
     async def orchestrate_fundamental_data_collection(self):
         """Collect fundamental data (monthly for watchlist)."""
         watchlist_symbols = await self.get_watchlist_symbols()
@@ -261,14 +335,13 @@ class OrchestrationEngine:
         # Use providers that have good fundamental data
         providers = [DataProvider.ALPHAVANTAGE, DataProvider.FINNHUB]
 
-        for i, symbol in enumerate(watchlist_symbols):
-            provider = providers[i % len(providers)]
-
-            await self.call_service_endpoint(provider, "ingest/fundamentals/{symbol}", symbol)
-
-            # Longer delay for fundamental data
-            await asyncio.sleep(2.0)
+        await self.run_calls([
+            self.call_service_endpoint(
+                providers[i % len(providers)], "ingest/fundamentals/{symbol}", symbol)
+            for i, symbol in enumerate(watchlist_symbols)
+        ])
 
+    @traced()
     async def orchestrate_market_news_collection(self):
         """Collect general market news."""
         self.logger.info("Starting market news collection")
@@ -276,20 +349,26 @@ class OrchestrationEngine:
         # Use providers that have good news coverage
         providers = [DataProvider.FINNHUB]
 
-        for provider in providers:
-            if provider == DataProvider.FINNHUB:
-                await self.call_service_endpoint(provider, "ingest/market-news")
-
-            await asyncio.sleep(1.0)
+        await self.run_calls([
+            self.call_service_endpoint(provider, "ingest/market-news")
+            for provider in providers if provider == DataProvider.FINNHUB
+        ])
 
     async def get_orchestration_status(self) -> Dict[str, Any]:
         """Get current orchestration status."""
-        active_symbols = await self.get_active_positions()
-        watchlist_symbols = await self.get_watchlist_symbols()
+        positions, watchlist = _live(positions_view), _live(watchlist_view)
+        if positions is not None and watchlist is not None:
+            active_positions_count, watchlist_count = len(positions), len(watchlist)
+        else:
+            active_positions_count, watchlist_count = await asyncio.gather(
+                firestore_client.count_documents(
+                    "pf_positions_active", filters=[("status", "==", "active")]),
+                firestore_client.count_documents("pf_watchlist")
+            )
 
         return {
-            "active_positions_count": len(active_symbols),
-            "watchlist_count": len(watchlist_symbols),
+            "active_positions_count": active_positions_count,
+            "watchlist_count": watchlist_count,
             "api_call_counts": self.api_call_counts,
             "last_counter_reset": self.last_reset.isoformat(),
             "service_urls": SERVICE_URLS
@@ -351,6 +430,7 @@ async def orchestrate_full_collection(background_tasks: BackgroundTasks):
 
 
 # Background tasks
+@traced()
 async def run_full_collection_cycle():
     """Run a complete data collection cycle."""
     logger.info("Starting full collection cycle")
@@ -358,15 +438,12 @@ async def run_full_collection_cycle():
     try:
         # Market news (independent of symbols)
         await orchestrator.orchestrate_market_news_collection()
-        await asyncio.sleep(5)
 
         # Intraday data for active positions
         await orchestrator.orchestrate_intraday_data_collection()
-        await asyncio.sleep(10)
 
         # Daily data for all symbols
         await orchestrator.orchestrate_daily_data_collection()
-        await asyncio.sleep(10)
 
         # Fundamental data (less frequent)
         current_hour = datetime.now().hour
@@ -9,12 +9,20 @@ Handles:
 """
 
 from shared.models import (
-    PriceData, IntradayPriceData, FundamentalData, NewsData,
+    BarBatch, IntradayPriceData, FundamentalData, NewsData,
     DataProvider, HealthCheckResponse, ErrorResponse
 )
 from shared.logging_config import setup_logging, get_logger
-from shared.gcp_secrets import get_polygon_key
+from shared.gcp_secrets import get_polygon_key, secret_cache, start_secret_cache
 from shared.firestore_client import FirestoreClient
+from shared.metrics import install_metrics
+from shared.retry import DeadlineMiddleware
+from shared.tracing import TracingMiddleware, configure_tracing
+from shared.http_client import http_clients
+from shared.rate_limiter import RateLimitExceeded, rate_limiter
+from shared.responses import FastJSONResponse, FastJSONRoute
+from shared.write_behind import WriteBehindQueue, default_wal_dir
+from shared.price_columns import store_columnar_prices, writes_columnar, writes_rows
 import asyncio
 import os
 from datetime import datetime, timedelta
@@ -38,8 +46,11 @@ logger = get_logger()
 app = FastAPI(
     title="Polygon.io Data Ingestion Service",
     description="Fetches financial data from Polygon.io API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+# Render results with orjson directly instead of through jsonable_encoder
+app.router.route_class = FastJSONRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,26 +60,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Firestore usage per route, served at /metrics
+install_metrics(app, "polygon-service", lambda: firestore_client,
+                extra={"write_behind": lambda: write_queue.stats() if write_queue else None,
+                       "secrets": secret_cache.stats,
+                       "http": http_clients.stats,
+                       "rate_limits": rate_limiter.stats})
+
+# Firestore time budget per request (REQUEST_DEADLINE_S)
+app.add_middleware(DeadlineMiddleware)
+
+# Spans per request, continuing the caller's trace (TRACE_EXPORT)
+configure_tracing("polygon-service")
+app.add_middleware(TracingMiddleware)
+
 # Global clients
 firestore_client = None
-api_key = None
+write_queue = None
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize clients on startup."""
-    global firestore_client, api_key
+    global firestore_client, write_queue
 
     firestore_client = FirestoreClient()
-    api_key = get_polygon_key()
+    # Keys are read from the secret cache per request, so rotations apply live
+    await start_secret_cache("polygon-api-key")
 
-    if not api_key:
+    if not get_polygon_key():
         logger.error("Polygon API key not found")
         raise RuntimeError("Polygon API key not configured")
 
+    # Provider connections are kept alive across background tasks
+    await http_clients.start(PolygonClient.BASE_URL)
+
+    # Provider request budgets; RATE_LIMIT_BACKEND=firestore shares them across instances
+    rate_limiter.configure(firestore_client)
+
+    # Writes are acknowledged once logged locally and drained in the background
+    write_queue = WriteBehindQueue(firestore_client, default_wal_dir("polygon-service"))
+    await write_queue.start()
+
     logger.info("Polygon service started")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Drain queued writes before exiting; the rest is replayed on restart."""
+    if write_queue is not None:
+        await write_queue.stop()
+    await secret_cache.stop()
+    await http_clients.close()
+
+
 class PolygonClient:
     """Client for Polygon.io API."""
 
@@ -76,13 +121,10 @@ class PolygonClient:
 
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Shared keep-alive pool; closed at shutdown, not per client
+        self.client = http_clients.client(self.BASE_URL)
         self.logger = get_logger("PolygonClient")
 
-    async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
-
     async def _make_request(self, endpoint: str, params: Dict[str, str] = None) -> Dict[str, Any]:
         """Make API request with error handling."""
         if params is None:
@@ -91,6 +133,11 @@ class PolygonClient:
 
         url = f"{self.BASE_URL}/{endpoint}"
 
+        try:
+            await rate_limiter.acquire(DataProvider.POLYGON)
+        except RateLimitExceeded as e:
+            raise HTTPException(status_code=429, detail=str(e))
+
         try:
             response = await self.client.get(url, params=params)
             response.raise_for_status()
@@ -110,7 +157,7 @@ class PolygonClient:
                 status_code=500, detail=f"API request failed: {str(e)}")
 
     async def get_daily_bars(self, symbol: str, from_date: datetime = None,
-                             to_date: datetime = None) -> List[PriceData]:
+                             to_date: datetime = None) -> BarBatch:
         """Get daily price bars for a symbol."""
         if from_date is None:
             from_date = datetime.now() - timedelta(days=365)
@@ -123,29 +170,23 @@ class PolygonClient:
         endpoint = f"v2/aggs/ticker/{symbol}/range/1/day/{from_str}/{to_str}"
         data = await self._make_request(endpoint)
 
-        if not data.get("results"):
-            return []
-
-        prices = []
-        for bar in data["results"]:
+        prices = BarBatch(symbol, DataProvider.POLYGON)
+        for bar in data.get("results") or []:
             try:
-                price = PriceData(
-                    symbol=symbol,
+                prices.append(
                     # Polygon uses milliseconds
-                    date=datetime.fromtimestamp(bar["t"] / 1000),
-                    open_price=Decimal(str(bar["o"])),
-                    high_price=Decimal(str(bar["h"])),
-                    low_price=Decimal(str(bar["l"])),
-                    close_price=Decimal(str(bar["c"])),
-                    volume=bar["v"],
-                    provider=DataProvider.POLYGON
+                    bar["t"] // 1000,
+                    float(bar["o"]), float(bar["h"]), float(bar["l"]), float(bar["c"]),
+                    int(bar["v"])
                 )
-                prices.append(price)
-            except (ValueError, KeyError) as e:
+            except (ValueError, KeyError, TypeError) as e:
                 self.logger.error("Error parsing bar data",
                                   symbol=symbol, error=str(e))
                 continue
 
+        dropped = prices.validate()
+        if dropped:
+            self.logger.warning("Invalid bars dropped", symbol=symbol, count=dropped)
         return prices
 
     async def get_minute_bars(self, symbol: str, date: datetime = None) -> List[IntradayPriceData]:
@@ -281,62 +322,52 @@ async def ingest_company_news(symbol: str, background_tasks: BackgroundTasks):
 # Background tasks
 async def fetch_and_store_daily_prices(symbol: str):
     """Fetch and store daily price data."""
-    client = PolygonClient(api_key)
+    client = PolygonClient(get_polygon_key())
 
     try:
         prices = await client.get_daily_bars(symbol)
 
         # Store in Firestore
-        for price in prices:
-            document_id = f"{symbol}_{price.date.strftime('%Y-%m-%d')}"
-            await firestore_client.upsert_document(
-                "di_prices_daily",
-                document_id,
-                price.dict()
-            )
+        if writes_rows():
+            await write_queue.upsert_many("di_prices_daily", prices.to_documents())
+        if writes_columnar():
+            await store_columnar_prices(firestore_client, symbol, prices)
 
         logger.info("Daily prices stored", symbol=symbol, count=len(prices))
     except Exception as e:
         logger.error("Failed to fetch daily prices",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_minute_prices(symbol: str):
     """Fetch and store minute-level price data."""
-    client = PolygonClient(api_key)
+    client = PolygonClient(get_polygon_key())
 
     try:
         prices = await client.get_minute_bars(symbol)
 
         # Store in Firestore
-        for price in prices:
-            document_id = f"{symbol}_{price.timestamp.strftime('%Y-%m-%d_%H-%M-%S')}"
-            await firestore_client.upsert_document(
-                "di_prices_intraday",
-                document_id,
-                price.dict()
-            )
+        await write_queue.upsert_many("di_prices_intraday", [
+            (f"{symbol}_{price.timestamp.strftime('%Y-%m-%d_%H-%M-%S')}", price.dict())
+            for price in prices
+        ])
 
         logger.info("Minute prices stored", symbol=symbol, count=len(prices))
     except Exception as e:
         logger.error("Failed to fetch minute prices",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_fundamentals(symbol: str):
     """Fetch and store fundamental data."""
-    client = PolygonClient(api_key)
+    client = PolygonClient(get_polygon_key())
 
     try:
         fundamental = await client.get_ticker_details(symbol)
 
         if fundamental:
             document_id = f"{symbol}_{datetime.now().strftime('%Y-%m-%d')}"
-            await firestore_client.upsert_document(
+            await write_queue.upsert(
                 "di_fundamentals",
                 document_id,
                 fundamental.dict()
@@ -347,33 +378,26 @@ async def fetch_and_store_fundamentals(symbol: str):
     except Exception as e:
         logger.error("Failed to fetch fundamental data",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_company_news(symbol: str):
     """Fetch and store company news."""
-    client = PolygonClient(api_key)
+    client = PolygonClient(get_polygon_key())
 
     try:
         news_items = await client.get_ticker_news(symbol)
 
         # Store in Firestore
-        for news in news_items:
-            document_id = f"{symbol}_{news.published_at.strftime('%Y-%m-%d_%H-%M-%S')}"
-            await firestore_client.upsert_document(
-                "di_company_news",
-                document_id,
-                news.dict()
-            )
+        await write_queue.upsert_many("di_company_news", [
+            (f"{symbol}_{news.published_at.strftime('%Y-%m-%d_%H-%M-%S')}", news.dict())
+            for news in news_items
+        ])
 
         logger.info("Company news stored",
                     symbol=symbol, count=len(news_items))
     except Exception as e:
         logger.error("Failed to fetch company news",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 if __name__ == "__main__":
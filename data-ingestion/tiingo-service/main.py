@@ -9,12 +9,22 @@ Handles:
 """
 
 from shared.models import (
-    PriceData, IntradayPriceData, FundamentalData, NewsData,
+    BarBatch, IntradayPriceData, FundamentalData, NewsData,
     DataProvider, HealthCheckResponse, ErrorResponse
 )
 from shared.logging_config import setup_logging, get_logger
-from shared.gcp_secrets import get_tiingo_key
+from shared.gcp_secrets import get_tiingo_key, secret_cache, start_secret_cache
 from shared.firestore_client import FirestoreClient
+from shared.metrics import install_metrics
+from shared.retry import DeadlineMiddleware
+from shared.tracing import TracingMiddleware, configure_tracing
+from shared.http_client import http_clients
+from shared.rate_limiter import RateLimitExceeded, rate_limiter
+from shared.responses import FastJSONResponse, FastJSONRoute
+from shared.write_behind import WriteBehindQueue, default_wal_dir
+from shared.price_columns import (
+    epoch_seconds, store_columnar_prices, writes_columnar, writes_rows
+)
 import asyncio
 import os
 from datetime import datetime, timedelta
@@ -38,8 +48,11 @@ logger = get_logger()
 app = FastAPI(
     title="Tiingo Data Ingestion Service",
     description="Fetches financial data from Tiingo API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+# Render results with orjson directly instead of through jsonable_encoder
+app.router.route_class = FastJSONRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,26 +62,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Firestore usage per route, served at /metrics
+install_metrics(app, "tiingo-service", lambda: firestore_client,
+                extra={"write_behind": lambda: write_queue.stats() if write_queue else None,
+                       "secrets": secret_cache.stats,
+                       "http": http_clients.stats,
+                       "rate_limits": rate_limiter.stats})
+
+# Firestore time budget per request (REQUEST_DEADLINE_S)
+app.add_middleware(DeadlineMiddleware)
+
+# Spans per request, continuing the caller's trace (TRACE_EXPORT)
+configure_tracing("tiingo-service")
+app.add_middleware(TracingMiddleware)
+
 # Global clients
 firestore_client = None
-api_key = None
+write_queue = None
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize clients on startup."""
-    global firestore_client, api_key
+    global firestore_client, write_queue
 
     firestore_client = FirestoreClient()
-    api_key = get_tiingo_key()
+    # Keys are read from the secret cache per request, so rotations apply live
+    await start_secret_cache("tiingo-api-key")
 
-    if not api_key:
+    if not get_tiingo_key():
         logger.error("Tiingo API key not found")
         raise RuntimeError("Tiingo API key not configured")
 
+    # Provider connections are kept alive across background tasks
+    await http_clients.start(TiingoClient.BASE_URL)
+
+    # Provider request budgets; RATE_LIMIT_BACKEND=firestore shares them across instances
+    rate_limiter.configure(firestore_client)
+
+    # Writes are acknowledged once logged locally and drained in the background
+    write_queue = WriteBehindQueue(firestore_client, default_wal_dir("tiingo-service"))
+    await write_queue.start()
+
     logger.info("Tiingo service started")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Drain queued writes before exiting; the rest is replayed on restart."""
+    if write_queue is not None:
+        await write_queue.stop()
+    await secret_cache.stop()
+    await http_clients.close()
+
+
 class TiingoClient:
     """Client for Tiingo API."""
 
@@ -76,13 +123,10 @@ class TiingoClient:
 
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Shared keep-alive pool; closed at shutdown, not per client
+        self.client = http_clients.client(self.BASE_URL)
         self.logger = get_logger("TiingoClient")
 
-    async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
-
     async def _make_request(self, endpoint: str, params: Dict[str, str] = None) -> Any:
         """Make API request with error handling."""
         if params is None:
@@ -95,6 +139,11 @@ class TiingoClient:
 
         url = f"{self.BASE_URL}/{endpoint}"
 
+        try:
+            await rate_limiter.acquire(DataProvider.TIINGO)
+        except RateLimitExceeded as e:
+            raise HTTPException(status_code=429, detail=str(e))
+
         try:
             response = await self.client.get(url, params=params, headers=headers)
             response.raise_for_status()
@@ -113,7 +162,7 @@ class TiingoClient:
                 status_code=500, detail=f"API request failed: {str(e)}")
 
     async def get_daily_prices(self, symbol: str, start_date: datetime = None,
-                               end_date: datetime = None) -> List[PriceData]:
+                               end_date: datetime = None) -> BarBatch:
         """Get daily price data for a symbol."""
         if start_date is None:
             start_date = datetime.now() - timedelta(days=365)
@@ -129,30 +178,27 @@ class TiingoClient:
         endpoint = f"daily/{symbol}/prices"
         data = await self._make_request(endpoint, params)
 
+        prices = BarBatch(symbol, DataProvider.TIINGO)
         if not isinstance(data, list):
-            return []
+            return prices
 
-        prices = []
         for item in data:
             try:
-                price = PriceData(
-                    symbol=symbol,
-                    date=datetime.fromisoformat(
-                        item["date"].replace("Z", "+00:00")),
-                    open_price=Decimal(str(item["open"])),
-                    high_price=Decimal(str(item["high"])),
-                    low_price=Decimal(str(item["low"])),
-                    close_price=Decimal(str(item["close"])),
-                    adjusted_close=Decimal(str(item["adjClose"])),
-                    volume=item["volume"],
-                    provider=DataProvider.TIINGO
+                prices.append(
+                    epoch_seconds(datetime.fromisoformat(item["date"].replace("Z", "+00:00"))),
+                    float(item["open"]), float(item["high"]),
+                    float(item["low"]), float(item["close"]),
+                    int(item["volume"]),
+                    adjusted_close=float(item["adjClose"])
                 )
-                prices.append(price)
-            except (ValueError, KeyError) as e:
+            except (ValueError, KeyError, TypeError) as e:
                 self.logger.error("Error parsing price data",
                                   symbol=symbol, error=str(e))
                 continue
 
+        dropped = prices.validate()
+        if dropped:
+            self.logger.warning("Invalid bars dropped", symbol=symbol, count=dropped)
         return prices
 
     async def get_intraday_prices(self, symbol: str, date: datetime = None) -> List[IntradayPriceData]:
@@ -230,6 +276,11 @@ class TiingoClient:
             "Content-Type": "application/json"
         }
 
+        try:
+            await rate_limiter.acquire(DataProvider.TIINGO)
+        except RateLimitExceeded as e:
+            raise HTTPException(status_code=429, detail=str(e))
+
         try:
             response = await self.client.get(url, params=params, headers=headers)
             response.raise_for_status()
@@ -300,62 +351,52 @@ async def ingest_news(background_tasks: BackgroundTasks, symbols: List[str] = No
 # Background tasks
 async def fetch_and_store_daily_prices(symbol: str):
     """Fetch and store daily price data."""
-    client = TiingoClient(api_key)
+    client = TiingoClient(get_tiingo_key())
 
     try:
         prices = await client.get_daily_prices(symbol)
 
         # Store in Firestore
-        for price in prices:
-            document_id = f"{symbol}_{price.date.strftime('%Y-%m-%d')}"
-            await firestore_client.upsert_document(
-                "di_prices_daily",
-                document_id,
-                price.dict()
-            )
+        if writes_rows():
+            await write_queue.upsert_many("di_prices_daily", prices.to_documents())
+        if writes_columnar():
+            await store_columnar_prices(firestore_client, symbol, prices)
 
         logger.info("Daily prices stored", symbol=symbol, count=len(prices))
     except Exception as e:
         logger.error("Failed to fetch daily prices",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_intraday_prices(symbol: str):
     """Fetch and store intraday price data."""
-    client = TiingoClient(api_key)
+    client = TiingoClient(get_tiingo_key())
 
     try:
         prices = await client.get_intraday_prices(symbol)
 
         # Store in Firestore
-        for price in prices:
-            document_id = f"{symbol}_{price.timestamp.strftime('%Y-%m-%d_%H-%M-%S')}"
-            await firestore_client.upsert_document(
-                "di_prices_intraday",
-                document_id,
-                price.dict()
-            )
+        await write_queue.upsert_many("di_prices_intraday", [
+            (f"{symbol}_{price.timestamp.strftime('%Y-%m-%d_%H-%M-%S')}", price.dict())
+            for price in prices
+        ])
 
         logger.info("Intraday prices stored", symbol=symbol, count=len(prices))
     except Exception as e:
         logger.error("Failed to fetch intraday prices",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_fundamentals(symbol: str):
     """Fetch and store fundamental data."""
-    client = TiingoClient(api_key)
+    client = TiingoClient(get_tiingo_key())
 
     try:
         fundamental = await client.get_company_metadata(symbol)
 
         if fundamental:
             document_id = f"{symbol}_{datetime.now().strftime('%Y-%m-%d')}"
-            await firestore_client.upsert_document(
+            await write_queue.upsert(
                 "di_fundamentals",
                 document_id,
                 fundamental.dict()
@@ -366,13 +407,11 @@ async def fetch_and_store_fundamentals(symbol: str):
     except Exception as e:
         logger.error("Failed to fetch fundamental data",
                      symbol=symbol, error=str(e))
-    finally:
-        await client.close()
 
 
 async def fetch_and_store_news(symbols: List[str] = None):
     """Fetch and store news data."""
-    client = TiingoClient(api_key)
+    client = TiingoClient(get_tiingo_key())
 
     try:
         news_items = await client.get_news(symbols)
@@ -380,19 +419,14 @@ async def fetch_and_store_news(symbols: List[str] = None):
         # Store in Firestore
         collection = "di_company_news" if symbols else "di_market_news"
 
-        for news in news_items:
-            document_id = f"tiingo_{news.published_at.strftime('%Y-%m-%d_%H-%M-%S')}"
-            await firestore_client.upsert_document(
-                collection,
-                document_id,
-                news.dict()
-            )
+        await write_queue.upsert_many(collection, [
+            (f"tiingo_{news.published_at.strftime('%Y-%m-%d_%H-%M-%S')}", news.dict())
+            for news in news_items
+        ])
 
         logger.info("News stored", symbols=symbols, count=len(news_items))
     except Exception as e:
         logger.error("Failed to fetch news", symbols=symbols, error=str(e))
-    finally:
-        await client.close()
 
 
 if __name__ == "__main__":
@@ -13,13 +13,21 @@ from shared.models import (
     DataProvider, HealthCheckResponse
 )
 from shared.logging_config import setup_logging, get_logger
-from shared.firestore_client import FirestoreClient
+from shared.firestore_client import FirestoreClient, in_chunks
+from shared.metrics import install_metrics
+from shared.retry import DeadlineMiddleware
+from shared.tracing import TracingMiddleware, configure_tracing
+from shared.responses import FastJSONResponse, FastJSONRoute
+from shared.cold_storage import PriceArchive, archive_uri
+from shared.price_columns import (
+    COLUMNAR_COLLECTION, COLUMN_TYPES, document_id, epoch_seconds, reads_columnar
+)
 import asyncio
 import os
 import pickle
 import json
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from decimal import Decimal
 
 import pandas as pd
@@ -47,8 +55,11 @@ logger = get_logger()
 app = FastAPI(
     title="ML Pipeline Service",
     description="AI/ML models for stock trading recommendations",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+# Render results with orjson directly instead of through jsonable_encoder
+app.router.route_class = FastJSONRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -58,9 +69,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Firestore usage per route, served at /metrics
+install_metrics(app, "ml-pipeline-service", lambda: firestore_client)
+
+# Firestore time budget per request (recommendation generation runs inline)
+app.add_middleware(DeadlineMiddleware,
+                   seconds=float(os.getenv("REQUEST_DEADLINE_S", "120")))
+
+# Spans per request, continuing the caller's trace (TRACE_EXPORT)
+configure_tracing("ml-pipeline-service")
+app.add_middleware(TracingMiddleware)
+
 # Global clients
 firestore_client = None
 
+# Columns kept from di_prices_daily documents when building training frames
+PRICE_FRAME_COLUMNS = ['symbol', 'date', 'open_price', 'high_price', 'low_price',
+                       'close_price', 'adjusted_close', 'volume']
+
+# Documents per Firestore page when streaming training data
+TRAINING_PAGE_SIZE = int(os.getenv("TRAINING_PAGE_SIZE", "1000"))
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -331,54 +360,129 @@ class MLPipeline:
         self.model = MLModel()
         self.logger = get_logger("MLPipeline")
 
+    @staticmethod
+    def _price_frame(records: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Build a compact, typed price frame from raw Firestore documents."""
+        df = pd.DataFrame.from_records(records, columns=PRICE_FRAME_COLUMNS)
+
+        # Convert string dates to datetime
+        df['date'] = pd.to_datetime(df['date'])
+
+        # Convert price and volume columns to numeric
+        for col in PRICE_FRAME_COLUMNS[2:]:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+        return df
+
+    async def iter_price_frames(self, filters: List[tuple],
+                                page_size: int = TRAINING_PAGE_SIZE) -> AsyncIterator[pd.DataFrame]:
+        """Stream daily prices as one DataFrame per Firestore page."""
+        async for page in firestore_client.stream_documents(
+                "di_prices_daily", filters=filters, page_size=page_size,
+                select=PRICE_FRAME_COLUMNS):
+            yield self._price_frame(page)
+
+    @staticmethod
+    def _columnar_frame(doc: Dict[str, Any], start_ts: int, end_ts: int) -> pd.DataFrame:
+        """Decode a symbol-year columnar document straight into a price frame."""
+        columns = {name: np.frombuffer(doc[name], dtype=dtype)
+                   for name, (_, dtype) in COLUMN_TYPES.items()}
+        mask = (columns['dates'] >= start_ts) & (columns['dates'] <= end_ts)
+
+        df = pd.DataFrame({name: values[mask] for name, values in columns.items()
+                           if name != 'dates'})
+        df.insert(0, 'date', pd.to_datetime(columns['dates'][mask], unit='s', utc=True))
+        df.insert(0, 'symbol', doc['symbol'])
+        return df
+
+    async def get_columnar_prices(self, symbols: Optional[List[str]],
+                                  start_date: datetime, end_date: datetime) -> List[pd.DataFrame]:
+        """Read daily prices from the per-symbol-year columnar documents."""
+        start_ts, end_ts = epoch_seconds(start_date), epoch_seconds(end_date)
+        years = range(start_date.year, end_date.year + 1)
+        frames = []
+
+        if symbols:
+            # Document IDs are deterministic, so this is one batched read
+            ids = [document_id(symbol, year) for symbol in symbols for year in years]
+            docs = await firestore_client.get_documents(COLUMNAR_COLLECTION, ids)
+            frames = [self._columnar_frame(doc, start_ts, end_ts) for doc in docs if doc]
+        else:
+            filters = [("year", ">=", start_date.year), ("year", "<=", end_date.year)]
+            async for page in firestore_client.stream_documents(
+                    COLUMNAR_COLLECTION, filters=filters, page_size=100):
+                frames.extend(self._columnar_frame(doc, start_ts, end_ts) for doc in page)
+
+        return [frame for frame in frames if not frame.empty]
+
+    async def get_archived_prices(self, symbols: Optional[List[str]],
+                                  start_date: datetime, end_date: datetime) -> List[pd.DataFrame]:
+        """Read daily prices from the Parquet cold tier, if one is configured."""
+        uri = archive_uri()
+        if not uri:
+            return []
+
+        loop = asyncio.get_running_loop()
+        df = await loop.run_in_executor(
+            None, lambda: PriceArchive(uri).read("daily", symbols, start_date, end_date,
+                                                 columns=PRICE_FRAME_COLUMNS))
+        return [df] if not df.empty else []
+
     async def get_training_data(self, symbols: List[str] = None,
                                 days_back: int = 730) -> pd.DataFrame:
-        """Get training data from Firestore."""
+        """Get training data from the Parquet archive and Firestore.
+
+        Closed periods live in the archive (scripts/archive_prices.py) and
+        recent ones in Firestore; where both hold a bar, Firestore wins.
+        """
         try:
             end_date = datetime.now()
             start_date = end_date - timedelta(days=days_back)
 
-            # Get price data
-            filters = [
-                ("date", ">=", start_date),
-                ("date", "<=", end_date)
-            ]
+            # Read the cold tier while Firestore is queried
+            archived = asyncio.ensure_future(
+                self.get_archived_prices(symbols, start_date, end_date))
 
-            if symbols:
-                # For multiple symbols, we'd need to query each separately in Firestore
-                all_data = []
-                for symbol in symbols:
-                    symbol_filters = filters + [("symbol", "==", symbol)]
-                    data = await firestore_client.query_documents("di_prices_daily", filters=symbol_filters)
-                    all_data.extend(data)
+            if reads_columnar():
+                frames = await self.get_columnar_prices(symbols, start_date, end_date)
             else:
-                all_data = await firestore_client.query_documents("di_prices_daily", filters=filters)
-
-            if not all_data:
+                # Get price data
+                filters = [
+                    ("date", ">=", start_date),
+                    ("date", "<=", end_date)
+                ]
+
+                # Build the frame page by page so raw documents never pile up
+                frames = []
+                if symbols:
+                    # One `in` query per chunk of symbols, streamed concurrently
+                    async def _collect(chunk: List[str]) -> List[pd.DataFrame]:
+                        chunk_filters = filters + [("symbol", "in", chunk)]
+                        return [frame async for frame in self.iter_price_frames(chunk_filters)]
+
+                    chunk_frames = await asyncio.gather(
+                        *[_collect(chunk) for chunk in in_chunks(symbols)])
+                    frames = [frame for chunk in chunk_frames for frame in chunk]
+                else:
+                    async for frame in self.iter_price_frames(filters):
+                        frames.append(frame)
+
+            cold_frames = await archived
+            if not frames and not cold_frames:
                 self.logger.warning("No training data found")
                 return pd.DataFrame()
 
-            # Convert to DataFrame
-            df = pd.DataFrame(all_data)
-
-            # Convert string dates to datetime
-            df['date'] = pd.to_datetime(df['date'])
-
-            # Convert price columns to numeric
-            price_cols = ['open_price', 'high_price',
-                          'low_price', 'close_price', 'adjusted_close']
-            for col in price_cols:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            # Convert volume to numeric
-            if 'volume' in df.columns:
-                df['volume'] = pd.to_numeric(df['volume'], errors='coerce')
+            # Hot frames come last so they win the de-duplication
+            df = pd.concat(cold_frames + frames, ignore_index=True)
+            if cold_frames:
+                df = df.drop_duplicates(subset=['symbol', 'date'], keep='last',
+                                        ignore_index=True)
 
             self.logger.info("Training data retrieved",
-                             symbols_count=df['symbol'].nunique(
-                             ) if 'symbol' in df.columns else 0,
-                             records_count=len(df))
+                             symbols_count=df['symbol'].nunique(),
+                             records_count=len(df),
+                             archived_records=sum(len(frame) for frame in cold_frames),
+                             pages=len(frames))
 
             return df
 
@@ -476,38 +580,44 @@ class MLPipeline:
             self.logger.error("Error in model training", error=str(e))
             return None
 
+    async def get_recent_prices(self, symbols: List[str], bars: int = 100,
+                                days_back: int = 200) -> Dict[str, pd.DataFrame]:
+        """Most recent daily bars per symbol, fetched for all symbols at once."""
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=days_back)
+
+        if reads_columnar():
+            frames = await self.get_columnar_prices(symbols, start_date, end_date)
+        else:
+            records = await firestore_client.query_documents_in(
+                "di_prices_daily", "symbol", symbols,
+                filters=[("date", ">=", start_date)],
+                select=PRICE_FRAME_COLUMNS
+            )
+            frames = [self._price_frame(records)] if records else []
+
+        if not frames:
+            return {}
+
+        df = pd.concat(frames, ignore_index=True).sort_values('date')
+        return {symbol: group.tail(bars) for symbol, group in df.groupby('symbol')}
+
     async def generate_recommendations(self, symbols: List[str]) -> List[MLRecommendation]:
         """Generate recommendations for given symbols."""
         try:
             recommendations = []
+            recent_prices = await self.get_recent_prices(symbols)
 
             for symbol in symbols:
                 # Get recent data for the symbol
-                recent_data = await firestore_client.query_documents(
-                    "di_prices_daily",
-                    filters=[("symbol", "==", symbol)],
-                    order_by="date",
-                    limit=100
-                )
-
-                if not recent_data:
+                recent_data = recent_prices.get(symbol)
+
+                if recent_data is None or len(recent_data) == 0:
                     self.logger.warning("No recent data found", symbol=symbol)
                     continue
 
-                # Convert to DataFrame and prepare features
-                df = pd.DataFrame(recent_data)
-                df['date'] = pd.to_datetime(df['date'])
-                df = df.sort_values('date')
-
-                # Convert price columns to numeric
-                price_cols = ['open_price', 'high_price',
-                              'low_price', 'close_price', 'adjusted_close']
-                for col in price_cols:
-                    if col in df.columns:
-                        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-                if 'volume' in df.columns:
-                    df['volume'] = pd.to_numeric(df['volume'], errors='coerce')
+                # Frames are already typed and date-sorted
+                df = recent_data.reset_index(drop=True)
 
                 # Calculate technical indicators
                 df = self.feature_engineer.calculate_technical_indicators(df)
@@ -14,9 +14,15 @@ from shared.models import (
 )
 from shared.logging_config import setup_logging, get_logger
 from shared.firestore_client import FirestoreClient
+from shared.live_view import LiveCollection
+from shared.metrics import install_metrics
+from shared.retry import DeadlineMiddleware
+from shared.tracing import TracingMiddleware, configure_tracing
+from shared.responses import FastJSONResponse, FastJSONRoute
+from shared.price_columns import COLUMNAR_COLLECTION, latest_closes, reads_columnar
 import asyncio
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
 from decimal import Decimal
 from enum import Enum
@@ -37,8 +43,11 @@ logger = get_logger()
 app = FastAPI(
     title="Portfolio Service",
     description="Portfolio and transaction management service",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+# Render results with orjson directly instead of through jsonable_encoder
+app.router.route_class = FastJSONRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -48,19 +57,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Firestore usage per route, served at /metrics
+install_metrics(app, "portfolio-service", lambda: firestore_client,
+                extra={"live_views": lambda: {view.collection: view.stats()
+                                              for view in live_views()}})
+
+# Firestore time budget per request (REQUEST_DEADLINE_S)
+app.add_middleware(DeadlineMiddleware)
+
+# Spans per request, continuing the caller's trace (TRACE_EXPORT)
+configure_tracing("portfolio-service")
+app.add_middleware(TracingMiddleware)
+
+# Read cache TTLs (seconds); the service's own writes invalidate these
+FIRESTORE_CACHE_TTLS = {
+    "di_prices_daily": 60,
+    COLUMNAR_COLLECTION: 60,
+    "pf_positions_active": 10,
+}
+
+# Window for batched latest-price reads; older symbols fall back to a per-symbol query
+PRICE_LOOKBACK_DAYS = 10
+
 # Global clients
 firestore_client = None
 
+# Live mirrors of the small collections read on every call (see shared/live_view.py)
+positions_view = None
+watchlist_view = None
+signals_view = None
+
+
+def live_views() -> List[LiveCollection]:
+    return [view for view in (positions_view, watchlist_view, signals_view) if view is not None]
+
+
+def _live(view: Optional[LiveCollection]) -> Optional[LiveCollection]:
+    """The view once it is serving, else None (read Firestore)."""
+    return view if view is not None and view.ready else None
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _signal_pending(signal: Dict[str, Any]) -> bool:
+    expires_at = signal.get('expires_at')
+    return expires_at is not None and _as_utc(expires_at) > datetime.now(timezone.utc)
+
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize clients on startup."""
-    global firestore_client
-
-    firestore_client = FirestoreClient()
+    global firestore_client, positions_view, watchlist_view, signals_view
+
+    firestore_client = FirestoreClient(cache_ttls=FIRESTORE_CACHE_TTLS)
+    positions_view = LiveCollection(firestore_client, "pf_positions_active",
+                                    filters=[("status", "==", "active")])
+    watchlist_view = LiveCollection(firestore_client, "pf_watchlist")
+    # Signals that expire are dropped locally; the listener only sends changes
+    signals_view = LiveCollection(firestore_client, "se_trade_signals",
+                                  filters=[("expires_at", ">", datetime.now())],
+                                  retain=_signal_pending)
+    await asyncio.gather(*(view.start() for view in live_views()))
     logger.info("Portfolio service started")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detach live views."""
+    await asyncio.gather(*(view.stop() for view in live_views()))
+
+
+async def get_active_positions_list() -> List[Dict[str, Any]]:
+    """Active positions from the live view, or Firestore until it is ready."""
+    view = _live(positions_view)
+    if view is not None:
+        return view.values()
+    return await firestore_client.query_documents(
+        "pf_positions_active",
+        filters=[("status", "==", "active")]
+    )
+
+
 class PortfolioManager:
     """Main portfolio management class."""
 
@@ -70,12 +149,20 @@ class PortfolioManager:
     async def get_current_price(self, symbol: str) -> Optional[Decimal]:
         """Get current price for a symbol."""
         try:
+            if reads_columnar():
+                closes = await latest_closes(firestore_client, [symbol])
+                if symbol in closes:
+                    return Decimal(str(closes[symbol]))
+                return None
+
             # Get most recent price data
             prices = await firestore_client.query_documents(
                 "di_prices_daily",
                 filters=[("symbol", "==", symbol)],
                 order_by="date",
-                limit=1
+                descending=True,
+                limit=1,
+                select=["close_price"]
             )
 
             if prices:
@@ -88,6 +175,39 @@ class PortfolioManager:
                               symbol=symbol, error=str(e))
             return None
 
+    async def get_current_prices(self, symbols: List[str]) -> Dict[str, Decimal]:
+        """Get current prices for several symbols in a handful of round trips."""
+        try:
+            if reads_columnar():
+                closes = await latest_closes(firestore_client, symbols)
+                return {symbol: Decimal(str(close)) for symbol, close in closes.items()}
+
+            cutoff_date = datetime.now() - timedelta(days=PRICE_LOOKBACK_DAYS)
+            prices = await firestore_client.query_documents_in(
+                "di_prices_daily", "symbol", symbols,
+                filters=[("date", ">=", cutoff_date)],
+                order_by="date",
+                descending=True,
+                select=["symbol", "close_price"]
+            )
+
+            current_prices = {}
+            for price in prices:
+                if price['symbol'] not in current_prices:
+                    current_prices[price['symbol']] = Decimal(str(price['close_price']))
+
+            missing = [symbol for symbol in dict.fromkeys(symbols) if symbol not in current_prices]
+            fallback = await asyncio.gather(*[self.get_current_price(symbol) for symbol in missing])
+            current_prices.update(
+                {symbol: price for symbol, price in zip(missing, fallback) if price})
+
+            return current_prices
+
+        except Exception as e:
+            self.logger.error("Error getting current prices",
+                              symbols=len(symbols), error=str(e))
+            return {}
+
     async def execute_trade(self, signal: Dict[str, Any]) -> Optional[str]:
         """Execute a trade based on a trade signal."""
         try:
@@ -174,6 +294,7 @@ class PortfolioManager:
                     # Update position
                     position_data['quantity'] = new_quantity
                     position_data['average_cost'] = float(new_average_cost)
+                    position_data['cost_basis'] = float(total_cost)
                     position_data['updated_at'] = datetime.now()
 
                     await firestore_client.update_document(
@@ -182,11 +303,12 @@ class PortfolioManager:
                         position_data
                     )
                 else:
-                    # Create new position
-                    position = Position(
+                    # Create new position from the already validated transaction
+                    position = Position.from_trusted(
                         symbol=symbol,
                         quantity=transaction.quantity,
                         average_cost=transaction.price,
+                        cost_basis=transaction.price * transaction.quantity,
                         opened_at=transaction.executed_at,
                         status=PositionStatus.ACTIVE
                     )
@@ -225,6 +347,8 @@ class PortfolioManager:
                         # Partial sell
                         position_data['quantity'] = existing_quantity - \
                             transaction.quantity
+                        position_data['cost_basis'] = float(
+                            Decimal(str(position_data['average_cost'])) * position_data['quantity'])
                         position_data['updated_at'] = datetime.now()
 
                         await firestore_client.update_document(
@@ -248,20 +372,26 @@ class PortfolioManager:
                 filters=[("status", "==", "active")]
             )
 
+            current_prices = await self.get_current_prices(
+                [position['symbol'] for position in positions])
+
             for position in positions:
                 symbol = position['symbol']
                 quantity = position['quantity']
 
+                average_cost = Decimal(str(position['average_cost']))
+                cost_basis = float(average_cost * quantity)
+
                 # Get current price
-                current_price = await self.get_current_price(symbol)
+                current_price = current_prices.get(symbol)
                 if current_price:
                     market_value = current_price * quantity
-                    average_cost = Decimal(str(position['average_cost']))
                     unrealized_pnl = (current_price - average_cost) * quantity
 
                     # Update position with current values
                     position['current_price'] = float(current_price)
                     position['market_value'] = float(market_value)
+                    position['cost_basis'] = cost_basis
                     position['unrealized_pnl'] = float(unrealized_pnl)
                     position['updated_at'] = datetime.now()
 
@@ -270,6 +400,13 @@ class PortfolioManager:
                         position['id'],
                         position
                     )
+                elif position.get('cost_basis') != cost_basis:
+                    # Unpriced positions still count towards total_cost_basis
+                    await firestore_client.update_document(
+                        "pf_positions_active",
+                        position['id'],
+                        {'cost_basis': cost_basis}
+                    )
 
             self.logger.info("Position values updated", count=len(positions))
 
@@ -279,44 +416,35 @@ class PortfolioManager:
     async def get_portfolio_summary(self) -> Dict[str, Any]:
         """Get portfolio summary statistics."""
         try:
-            # Get active positions
-            positions = await firestore_client.query_documents(
-                "pf_positions_active",
-                filters=[("status", "==", "active")]
-            )
-
-            # Calculate totals
-            total_market_value = Decimal('0')
-            total_cost_basis = Decimal('0')
-            total_unrealized_pnl = Decimal('0')
-
-            for position in positions:
-                if position.get('market_value'):
-                    total_market_value += Decimal(
-                        str(position['market_value']))
-                if position.get('average_cost') and position.get('quantity'):
-                    total_cost_basis += Decimal(
-                        str(position['average_cost'])) * position['quantity']
-                if position.get('unrealized_pnl'):
-                    total_unrealized_pnl += Decimal(
-                        str(position['unrealized_pnl']))
-
-            # Get recent transactions
+            # Totals and counts are aggregated server-side, so this reads a
+            # handful of index entries instead of every position and transaction
             cutoff_date = datetime.now() - timedelta(days=30)
-            recent_transactions = await firestore_client.query_documents(
-                "pf_transactions",
-                filters=[("executed_at", ">=", cutoff_date)],
-                order_by="executed_at",
-                limit=100
+            totals, recent_transactions_count = await asyncio.gather(
+                firestore_client.aggregate(
+                    "pf_positions_active",
+                    filters=[("status", "==", "active")],
+                    count=True,
+                    sum_fields=["market_value", "cost_basis", "unrealized_pnl"]
+                ),
+                firestore_client.count_documents(
+                    "pf_transactions",
+                    filters=[("executed_at", ">=", cutoff_date)]
+                )
             )
+            if totals is None or recent_transactions_count is None:
+                return {}
+
+            total_market_value = Decimal(str(totals['sum_market_value']))
+            total_cost_basis = Decimal(str(totals['sum_cost_basis']))
+            total_unrealized_pnl = Decimal(str(totals['sum_unrealized_pnl']))
 
             return {
-                "active_positions_count": len(positions),
+                "active_positions_count": totals['count'],
                 "total_market_value": float(total_market_value),
                 "total_cost_basis": float(total_cost_basis),
                 "total_unrealized_pnl": float(total_unrealized_pnl),
                 "unrealized_return_pct": float((total_unrealized_pnl / total_cost_basis * 100)) if total_cost_basis > 0 else 0,
-                "recent_transactions_count": len(recent_transactions),
+                "recent_transactions_count": recent_transactions_count,
                 "last_updated": datetime.now().isoformat()
             }
 
@@ -328,14 +456,20 @@ class PortfolioManager:
         """Process pending trade signals."""
         try:
             # Get recent trade signals that haven't expired
-            current_time = datetime.now()
-            signals = await firestore_client.query_documents(
-                "se_trade_signals",
-                filters=[
-                    ("expires_at", ">", current_time),
-                    ("created_at", ">=", current_time - timedelta(hours=24))
-                ]
-            )
+            view = _live(signals_view)
+            if view is not None:
+                cutoff = datetime.now(timezone.utc) - timedelta(hours=24)
+                signals = [signal for signal in view.values()
+                           if signal.get('created_at') and _as_utc(signal['created_at']) >= cutoff]
+            else:
+                current_time = datetime.now()
+                signals = await firestore_client.query_documents(
+                    "se_trade_signals",
+                    filters=[
+                        ("expires_at", ">", current_time),
+                        ("created_at", ">=", current_time - timedelta(hours=24))
+                    ]
+                )
 
             executed_count = 0
             for signal in signals:
@@ -399,7 +533,8 @@ class WatchlistManager:
         try:
             watchlist_items = await firestore_client.query_documents(
                 "pf_watchlist",
-                filters=[("symbol", "==", symbol)]
+                filters=[("symbol", "==", symbol)],
+                select=["symbol"]
             )
 
             for item in watchlist_items:
@@ -416,6 +551,11 @@ class WatchlistManager:
     async def get_watchlist(self) -> List[Dict[str, Any]]:
         """Get current watchlist."""
         try:
+            view = _live(watchlist_view)
+            if view is not None:
+                return sorted((item for item in view.values() if 'priority' in item),
+                              key=lambda item: item['priority'])
+
             watchlist = await firestore_client.query_documents(
                 "pf_watchlist",
                 order_by="priority"
@@ -449,10 +589,7 @@ async def get_portfolio_summary():
 @app.get("/positions/active")
 async def get_active_positions():
     """Get all active positions."""
-    positions = await firestore_client.query_documents(
-        "pf_positions_active",
-        filters=[("status", "==", "active")]
-    )
+    positions = await get_active_positions_list()
     return {"positions": positions}
 
 
@@ -545,10 +682,7 @@ async def get_daily_performance(days_back: int = 30):
 async def get_holdings_performance():
     """Get performance breakdown by holdings."""
     try:
-        positions = await firestore_client.query_documents(
-            "pf_positions_active",
-            filters=[("status", "==", "active")]
-        )
+        positions = await get_active_positions_list()
 
         performance_data = []
         for position in positions:
@@ -0,0 +1,188 @@
+"""
+Price History Archival
+
+Moves closed periods of price history out of Firestore into the Parquet
+archive at PRICE_ARCHIVE_URI (see shared/cold_storage.py), then deletes the
+archived documents from Firestore. Each symbol-year partition is written and
+verified before its documents are deleted, and partitions are merged by
+timestamp, so an interrupted run can simply be repeated.
+
+Usage:
+    python scripts/archive_prices.py --dataset daily [--before 2024-01-01] [--symbols AAPL MSFT]
+    python scripts/archive_prices.py --dataset intraday [--keep] [--dry-run]
+
+Defaults for --before: daily prices are archived up to January 1 of last
+year, so Firestore always keeps at least a year of bars (recommendations read
+the last ~200 days from Firestore only); intraday prices older than 30 days
+are archived. With PRICE_STORAGE_LAYOUT=columnar or both, closed years of
+di_prices_daily_columnar are archived too.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.cold_storage import DATASETS, PriceArchive, archive_uri  # noqa: E402
+from shared.firestore_client import FirestoreClient  # noqa: E402
+from shared.logging_config import setup_logging  # noqa: E402
+from shared.price_columns import (  # noqa: E402
+    COLUMNAR_COLLECTION, COLUMN_TYPES, decode_document, writes_columnar, writes_rows
+)
+
+# Buffered rows that force a flush before the scan reaches a year boundary
+DEFAULT_FLUSH_ROWS = 200_000
+
+# Source document ids and the rows they hold for one symbol-year
+Partition = Tuple[List[str], List[Dict[str, Any]]]
+
+
+class Archiver:
+    """Writes buffered partitions to the archive and prunes them from Firestore."""
+
+    def __init__(self, client: FirestoreClient, archive: PriceArchive, dataset: str,
+                 keep: bool, dry_run: bool):
+        self.client = client
+        self.archive = archive
+        self.dataset = dataset
+        self.keep = keep
+        self.dry_run = dry_run
+        self.archived = 0
+        self.deleted = 0
+        self.partitions = set()
+
+    async def flush(self, collection: str, partitions: Dict[Tuple[str, int], Partition]):
+        """Archive each partition's rows, then delete its source documents."""
+        loop = asyncio.get_running_loop()
+        for (symbol, year), (document_ids, rows) in sorted(partitions.items()):
+            self.partitions.add((symbol, year))
+            self.archived += len(rows)
+            if self.dry_run:
+                print(f"  {symbol} {year}: {len(rows)} rows (dry run)")
+                continue
+
+            stored = await loop.run_in_executor(
+                None, self.archive.write_partition, self.dataset, symbol, year, rows)
+            print(f"  {symbol} {year}: {len(rows)} rows archived ({stored} in partition)")
+            if self.keep:
+                continue
+
+            deletes = [{'collection': collection, 'document_id': document_id,
+                        'operation': 'delete'} for document_id in document_ids]
+            if not await self.client.batch_write(deletes):
+                raise RuntimeError(f"Failed to prune {collection} for {symbol} {year}")
+            self.deleted += len(deletes)
+        partitions.clear()
+
+
+async def archive_rows(client: FirestoreClient, archiver: Archiver, collection: str,
+                       time_field: str, before: datetime, symbols: List[str],
+                       page_size: int, flush_rows: int):
+    """Archive per-bar documents older than ``before``.
+
+    The scan is ordered by time, so every partition of a year is complete
+    once the scan reaches the next year and can be flushed then.
+    """
+    filters = [(time_field, "<", before)]
+    if symbols:
+        filters.append(("symbol", "in", symbols))
+
+    partitions: Dict[Tuple[str, int], Partition] = defaultdict(lambda: ([], []))
+    buffered = 0
+    current_year = None
+    async for page in client.stream_documents(collection, filters=filters,
+                                              order_by=time_field, page_size=page_size):
+        for row in page:
+            year = row[time_field].year
+            if current_year is not None and year != current_year or buffered >= flush_rows:
+                await archiver.flush(collection, partitions)
+                buffered = 0
+            current_year = year
+            document_ids, rows = partitions[(row['symbol'], year)]
+            document_ids.append(row.pop('id'))
+            rows.append(row)
+            buffered += 1
+    await archiver.flush(collection, partitions)
+
+
+async def archive_columnar(client: FirestoreClient, archiver: Archiver,
+                           before: datetime, symbols: List[str]):
+    """Archive whole symbol-year columnar documents for years before ``before``."""
+    value_columns = [name for name in COLUMN_TYPES if name != 'dates']
+    filters = [("year", "<", before.year)]
+    if symbols:
+        filters.append(("symbol", "in", symbols))
+
+    async for page in client.stream_documents(COLUMNAR_COLLECTION, filters=filters,
+                                              page_size=50):
+        partitions: Dict[Tuple[str, int], Partition] = {}
+        for doc in page:
+            columns = decode_document(doc)
+            rows = []
+            for i, ts in enumerate(columns['dates']):
+                row = {name: columns[name][i] for name in value_columns}
+                if math.isnan(row['adjusted_close']):
+                    row['adjusted_close'] = None
+                row['date'] = datetime.fromtimestamp(ts, tz=timezone.utc)
+                row['provider'] = doc.get('provider')
+                rows.append(row)
+            partitions[(doc['symbol'], doc['year'])] = ([doc['id']], rows)
+        await archiver.flush(COLUMNAR_COLLECTION, partitions)
+
+
+def default_before(dataset: str) -> datetime:
+    now = datetime.utcnow()
+    if dataset == "daily":
+        return datetime(now.year - 1, 1, 1)
+    return (now - timedelta(days=30)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dataset", choices=sorted(DATASETS), required=True)
+    parser.add_argument("--before", type=datetime.fromisoformat,
+                        help="Archive bars strictly before this date (UTC)")
+    parser.add_argument("--symbols", nargs="*", help="Only archive these symbols (up to 30)")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--flush-rows", type=int, default=DEFAULT_FLUSH_ROWS)
+    parser.add_argument("--keep", action="store_true",
+                        help="Write the archive but do not delete from Firestore")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Read and group bars without writing or deleting")
+    args = parser.parse_args()
+    setup_logging("archive-prices", level="WARNING")
+
+    uri = archive_uri()
+    if not uri:
+        sys.exit("PRICE_ARCHIVE_URI is not set")
+
+    before = args.before or default_before(args.dataset)
+    collection, time_field, _ = DATASETS[args.dataset]
+    client = FirestoreClient(os.getenv('GCP_PROJECT_ID', 'moda-trader'))
+    archiver = Archiver(client, PriceArchive(uri), args.dataset, args.keep, args.dry_run)
+
+    started = time.perf_counter()
+    print(f"🧊 Archiving {args.dataset} prices before {before.date()} to {uri}...")
+    try:
+        if args.dataset == "intraday" or writes_rows():
+            await archive_rows(client, archiver, collection, time_field, before,
+                               args.symbols, args.page_size, args.flush_rows)
+        if args.dataset == "daily" and writes_columnar():
+            await archive_columnar(client, archiver, before, args.symbols)
+    finally:
+        client.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ {archiver.archived} rows in {len(archiver.partitions)} partitions archived, "
+          f"{archiver.deleted} documents deleted in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+"""
+Position Cost Basis Backfill
+
+Sets cost_basis = average_cost * quantity on every active position in
+pf_positions_active. The portfolio summary sums cost_basis server-side, so
+positions written before the field existed would otherwise be left out of
+total_cost_basis. Positions whose stored value already matches are skipped,
+so re-running is safe.
+
+Usage:
+    python scripts/backfill_position_cost_basis.py [--dry-run]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.firestore_client import FirestoreClient  # noqa: E402
+from shared.logging_config import setup_logging  # noqa: E402
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Report positions to update without writing")
+    args = parser.parse_args()
+    setup_logging("backfill-position-cost-basis", level="WARNING")
+
+    client = FirestoreClient(os.getenv('GCP_PROJECT_ID', 'moda-trader'))
+    started = time.perf_counter()
+    read = updated = 0
+
+    print("🧮 Backfilling cost_basis on active positions...")
+    try:
+        async with client.bulk_writer() as writer:
+            async for page in client.stream_documents(
+                    "pf_positions_active", filters=[("status", "==", "active")]):
+                read += len(page)
+                for position in page:
+                    cost_basis = float(Decimal(str(position['average_cost'])) * position['quantity'])
+                    if position.get('cost_basis') == cost_basis:
+                        continue
+                    updated += 1
+                    print(f"  {position['symbol']}: {position.get('cost_basis')} -> {cost_basis}")
+                    if not args.dry_run:
+                        await writer.upsert("pf_positions_active", position['id'],
+                                            {'cost_basis': cost_basis})
+        failed = writer.failed
+    finally:
+        client.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ {updated} of {read} positions {'to update' if args.dry_run else 'updated'} "
+          f"in {elapsed:.1f}s" + (f", {failed} failed" if failed else ""))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
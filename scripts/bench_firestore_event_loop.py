@@ -0,0 +1,123 @@
+"""
+Firestore Event Loop Lag Benchmark
+
+Fires concurrent upserts through FirestoreClient against a local stand-in that
+sleeps for a fixed round-trip time, and measures how late a 10ms heartbeat on
+the same event loop wakes up. Compares the old inline (blocking) call path with
+the thread-pool offload.
+
+Usage:
+    python scripts/bench_firestore_event_loop.py [--upserts 100] [--latency-ms 20]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.firestore_client import FirestoreClient  # noqa: E402
+from shared.logging_config import setup_logging  # noqa: E402
+
+HEARTBEAT_INTERVAL = 0.01
+
+
+class _SleepyDocument:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def set(self, data, merge=False, retry=None, timeout=None):
+        time.sleep(self.latency)
+
+
+class _SleepyCollection:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def document(self, document_id):
+        return _SleepyDocument(self.latency)
+
+
+class SleepyFirestore:
+    """Stand-in for firestore.Client whose writes block for a fixed time."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def collection(self, name):
+        return _SleepyCollection(self.latency)
+
+
+class InlineFirestoreClient(FirestoreClient):
+    """FirestoreClient with the pre-offload behaviour: calls run on the loop."""
+
+    async def _run(self, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+
+async def _heartbeat(lags: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + HEARTBEAT_INTERVAL
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run_case(client: FirestoreClient, upserts: int) -> dict:
+    lags = []
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(lags, stop))
+    await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[
+        client.upsert_document("bench", f"doc_{i}", {"i": i})
+        for i in range(upserts)
+    ])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await heartbeat
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    return {
+        "wall_s": elapsed,
+        "written": sum(1 for ok in results if ok),
+        "lag_p50_ms": statistics.median(lags_ms),
+        "lag_p99_ms": lags_ms[round(0.99 * (len(lags_ms) - 1))],
+        "lag_max_ms": lags_ms[-1],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--upserts", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    args = parser.parse_args()
+    setup_logging("bench-firestore", level="WARNING")
+
+    db = SleepyFirestore(args.latency_ms / 1000)
+    cases = [
+        ("inline (before)", InlineFirestoreClient(db=db)),
+        ("thread pool (after)", FirestoreClient(
+            db=db, max_concurrency=args.max_concurrency)),
+    ]
+
+    print(f"{args.upserts} concurrent upserts, {args.latency_ms:.0f}ms simulated round trip")
+    for name, client in cases:
+        result = await run_case(client, args.upserts)
+        client.close()
+        print(f"  {name:<20} written={result['written']}/{args.upserts} "
+              f"wall={result['wall_s']:.2f}s "
+              f"lag p50={result['lag_p50_ms']:.1f}ms "
+              f"p99={result['lag_p99_ms']:.1f}ms "
+              f"max={result['lag_max_ms']:.1f}ms")
+        if result["written"] != args.upserts:
+            sys.exit(f"{name}: {args.upserts - result['written']} upserts failed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+JSON Response Benchmark
+
+Renders a list of transaction-like rows (Decimal prices, datetimes, enums) the
+way FastAPI's default path does (jsonable_encoder + JSONResponse) and with
+FastJSONResponse, then times full GET requests against two small apps, one
+with the default route class and one with FastJSONRoute.
+
+Usage:
+    python scripts/bench_json_response.py [--rows 10000] [--repeat 20]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from shared.models import TransactionType  # noqa: E402
+from shared.responses import FastJSONResponse, FastJSONRoute  # noqa: E402
+
+
+def make_rows(count: int) -> list:
+    executed = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"txn_{i:06d}",
+            "symbol": f"SYM{i % 500}",
+            "transaction_type": TransactionType.BUY if i % 2 else TransactionType.SELL,
+            "quantity": 10 + i % 90,
+            "price": Decimal("187.25") + Decimal(i % 100) / 100,
+            "total_amount": Decimal("18725.00") + i,
+            "fees": Decimal("1.00"),
+            "executed_at": executed + timedelta(minutes=i),
+            "order_id": None,
+            "created_at": executed + timedelta(minutes=i, seconds=1),
+            "updated_at": executed + timedelta(minutes=i, seconds=1),
+        }
+        for i in range(count)
+    ]
+
+
+def timed(func, repeat: int) -> float:
+    """Median milliseconds per call."""
+    func()  # warm up
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def make_app(rows: list, fast: bool) -> FastAPI:
+    if fast:
+        app = FastAPI(default_response_class=FastJSONResponse)
+        app.router.route_class = FastJSONRoute
+    else:
+        app = FastAPI()
+
+    @app.get("/transactions")
+    async def transactions():
+        return {"transactions": rows}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    content = {"transactions": make_rows(args.rows)}
+    default_body = JSONResponse(jsonable_encoder(content)).body
+    fast_body = FastJSONResponse(content).body
+
+    print(f"{args.rows} rows, median of {args.repeat} runs "
+          f"({len(default_body) / 1024:.0f}KB default, {len(fast_body) / 1024:.0f}KB fast)")
+
+    render_default = timed(lambda: JSONResponse(jsonable_encoder(content)), args.repeat)
+    render_fast = timed(lambda: FastJSONResponse(content), args.repeat)
+    print(f"  render   default={render_default:8.1f}ms  fast={render_fast:8.1f}ms  "
+          f"{render_default / render_fast:5.1f}x")
+
+    clients = [TestClient(make_app(content["transactions"], fast)) for fast in (False, True)]
+    request_default, request_fast = (
+        timed(lambda client=client: client.get("/transactions").raise_for_status(), args.repeat)
+        for client in clients
+    )
+    print(f"  request  default={request_default:8.1f}ms  fast={request_fast:8.1f}ms  "
+          f"{request_default / request_fast:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,571 +1,253 @@
 """
 Firestore Database Initialization Script
 
-This script initializes all Firestore collections with proper structure and sample data.
-Run this after setting up your GCP project and Firestore database.
+This script initializes the Firestore collections used by the services with
+sample data. Run this after setting up your GCP project and Firestore database,
+or against the local stand-in for load tests:
+
+    FIRESTORE_BACKEND=sqlite python scripts/init_firestore.py
+
+SEED_DAYS controls how many days of synthetic daily prices are written per
+symbol (default 30).
 """
 
-from models import (
-    Stock, Company, PriceData, NewsItem, Portfolio, Position,
-    Transaction, WatchlistItem, MLModel, TradeSignal, TradingRecommendation
-)
-from firestore_client import FirestoreClient
 import os
+import random
 import sys
 from datetime import datetime, timedelta
 from decimal import Decimal
+from typing import Any, Dict
+
+# Add the repository root to the path for shared imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.models import (  # noqa: E402
+    PriceData, NewsData, Position, Transaction, WatchlistItem, ModelMetadata,
+    MLRecommendation, TradeSignal, DataProvider, RecommendationType,
+    TransactionType
+)
+from shared.firestore_client import FirestoreClient  # noqa: E402
+
+SYMBOLS = ["AAPL", "MSFT", "GOOGL", "AMZN", "TSLA"]
+BASE_PRICES = [175.50, 378.85, 140.25, 145.80, 248.50]
+WATCHLIST_SYMBOLS = ["NVDA", "META", "NFLX"]
+
 
-# Add the shared directory to the path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'shared'))
+def to_document(model) -> Dict[str, Any]:
+    """Model payload with Decimals as floats, which Firestore can store."""
+    return {
+        key: float(value) if isinstance(value, Decimal) else value
+        for key, value in model.dict().items()
+    }
 
 
 class FirestoreInitializer:
     """Initialize Firestore collections with proper structure and sample data."""
 
-    def __init__(self, project_id: str):
+    def __init__(self, project_id: str, seed_days: int = 30):
         self.client = FirestoreClient(project_id)
+        self.seed_days = seed_days
+        self.latest_prices: Dict[str, float] = {}
 
     async def create_collections(self):
         """Create all collections with sample data."""
         print("🚀 Initializing Firestore collections...")
 
         # Initialize collections in order
-        await self._init_companies()
-        await self._init_stocks()
         await self._init_price_data()
         await self._init_news()
-        await self._init_portfolio()
         await self._init_positions()
         await self._init_transactions()
         await self._init_watchlist()
         await self._init_ml_models()
-        await self._init_trade_signals()
         await self._init_recommendations()
+        await self._init_trade_signals()
 
         print("✅ All Firestore collections initialized successfully!")
 
-    async def _init_companies(self):
-        """Initialize companies collection with sample companies."""
-        print("  📊 Creating companies collection...")
-
-        companies = [
-            Company(
-                symbol="AAPL",
-                name="Apple Inc.",
-                sector="Technology",
-                industry="Consumer Electronics",
-                market_cap=3000000000000,  # $3T
-                employees=161000,
-                description="Apple Inc. designs, manufactures, and markets smartphones, personal computers, tablets, wearables, and accessories worldwide.",
-                website="https://www.apple.com",
-                headquarters="Cupertino, CA"
-            ),
-            Company(
-                symbol="MSFT",
-                name="Microsoft Corporation",
-                sector="Technology",
-                industry="Software",
-                market_cap=2800000000000,  # $2.8T
-                employees=221000,
-                description="Microsoft Corporation develops, licenses, and supports software, services, devices, and solutions worldwide.",
-                website="https://www.microsoft.com",
-                headquarters="Redmond, WA"
-            ),
-            Company(
-                symbol="GOOGL",
-                name="Alphabet Inc.",
-                sector="Technology",
-                industry="Internet Content & Information",
-                market_cap=1700000000000,  # $1.7T
-                employees=182000,
-                description="Alphabet Inc. provides online advertising services in the United States, Europe, the Middle East, Africa, the Asia-Pacific, Canada, and Latin America.",
-                website="https://www.alphabet.com",
-                headquarters="Mountain View, CA"
-            ),
-            Company(
-                symbol="AMZN",
-                name="Amazon.com Inc.",
-                sector="Consumer Discretionary",
-                industry="Internet Retail",
-                market_cap=1500000000000,  # $1.5T
-                employees=1541000,
-                description="Amazon.com, Inc. engages in the retail sale of consumer products and subscriptions in North America and internationally.",
-                website="https://www.amazon.com",
-                headquarters="Seattle, WA"
-            ),
-            Company(
-                symbol="TSLA",
-                name="Tesla Inc.",
-                sector="Consumer Discretionary",
-                industry="Auto Manufacturers",
-                market_cap=800000000000,  # $800B
-                employees=140000,
-                description="Tesla, Inc. designs, develops, manufactures, leases, and sells electric vehicles, and energy generation and storage systems.",
-                website="https://www.tesla.com",
-                headquarters="Austin, TX"
-            )
-        ]
-
-        for company in companies:
-            await self.client.set_document("companies", company.symbol, company.dict())
-
-    async def _init_stocks(self):
-        """Initialize stocks collection."""
-        print("  📈 Creating stocks collection...")
-
-        stocks = [
-            Stock(
-                symbol="AAPL",
-                current_price=175.50,
-                previous_close=174.20,
-                day_change=1.30,
-                day_change_percent=0.75,
-                volume=45230000,
-                market_cap=3000000000000,
-                pe_ratio=28.5,
-                dividend_yield=0.44,
-                fifty_two_week_high=199.62,
-                fifty_two_week_low=164.08,
-                last_updated=datetime.utcnow()
-            ),
-            Stock(
-                symbol="MSFT",
-                current_price=378.85,
-                previous_close=376.12,
-                day_change=2.73,
-                day_change_percent=0.73,
-                volume=18450000,
-                market_cap=2800000000000,
-                pe_ratio=35.2,
-                dividend_yield=0.68,
-                fifty_two_week_high=468.35,
-                fifty_two_week_low=309.45,
-                last_updated=datetime.utcnow()
-            ),
-            Stock(
-                symbol="GOOGL",
-                current_price=140.25,
-                previous_close=138.92,
-                day_change=1.33,
-                day_change_percent=0.96,
-                volume=25870000,
-                market_cap=1700000000000,
-                pe_ratio=25.8,
-                dividend_yield=0.0,
-                fifty_two_week_high=153.78,
-                fifty_two_week_low=121.46,
-                last_updated=datetime.utcnow()
-            ),
-            Stock(
-                symbol="AMZN",
-                current_price=145.80,
-                previous_close=144.35,
-                day_change=1.45,
-                day_change_percent=1.00,
-                volume=32110000,
-                market_cap=1500000000000,
-                pe_ratio=52.3,
-                dividend_yield=0.0,
-                fifty_two_week_high=170.19,
-                fifty_two_week_low=118.35,
-                last_updated=datetime.utcnow()
-            ),
-            Stock(
-                symbol="TSLA",
-                current_price=248.50,
-                previous_close=245.20,
-                day_change=3.30,
-                day_change_percent=1.35,
-                volume=89340000,
-                market_cap=800000000000,
-                pe_ratio=65.8,
-                dividend_yield=0.0,
-                fifty_two_week_high=299.29,
-                fifty_two_week_low=152.37,
-                last_updated=datetime.utcnow()
-            )
-        ]
-
-        for stock in stocks:
-            await self.client.set_document("stocks", stock.symbol, stock.dict())
-
     async def _init_price_data(self):
-        """Initialize price_data collection with historical data."""
-        print("  📊 Creating price_data collection...")
-
-        symbols = ["AAPL", "MSFT", "GOOGL", "AMZN", "TSLA"]
-        base_prices = [175.50, 378.85, 140.25, 145.80, 248.50]
-
-        for i, symbol in enumerate(symbols):
-            # Create 30 days of historical data
-            for days_back in range(30, 0, -1):
-                date = datetime.utcnow() - timedelta(days=days_back)
-                base_price = base_prices[i]
-
-                # Simulate some price variation
-                import random
-                variation = random.uniform(-0.05, 0.05)  # ±5% variation
-                close_price = base_price * (1 + variation)
-                open_price = close_price * (1 + random.uniform(-0.02, 0.02))
-                high_price = max(open_price, close_price) * \
-                    (1 + random.uniform(0, 0.03))
-                low_price = min(open_price, close_price) * \
-                    (1 - random.uniform(0, 0.03))
-                volume = random.randint(20000000, 60000000)
-
-                price_data = PriceData(
-                    symbol=symbol,
-                    date=date,
-                    open=round(open_price, 2),
-                    high=round(high_price, 2),
-                    low=round(low_price, 2),
-                    close=round(close_price, 2),
-                    volume=volume,
-                    adjusted_close=round(close_price, 2)
-                )
-
-                doc_id = f"{symbol}_{date.strftime('%Y-%m-%d')}"
-                await self.client.set_document("price_data", doc_id, price_data.dict())
+        """Initialize di_prices_daily with a random walk per symbol."""
+        print("  📊 Creating di_prices_daily collection...")
+
+        async with self.client.bulk_writer() as writer:
+            for symbol, base_price in zip(SYMBOLS + WATCHLIST_SYMBOLS,
+                                          BASE_PRICES + [480.0, 330.0, 450.0]):
+                close_price = base_price
+                for days_back in range(self.seed_days, 0, -1):
+                    date = datetime.utcnow().replace(
+                        hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days_back)
+
+                    # Simulate some price variation
+                    close_price *= 1 + random.uniform(-0.02, 0.02)
+                    open_price = close_price * (1 + random.uniform(-0.01, 0.01))
+                    high_price = max(open_price, close_price) * \
+                        (1 + random.uniform(0, 0.015))
+                    low_price = min(open_price, close_price) * \
+                        (1 - random.uniform(0, 0.015))
+
+                    price_data = PriceData(
+                        symbol=symbol,
+                        date=date,
+                        open_price=Decimal(str(round(open_price, 2))),
+                        high_price=Decimal(str(round(high_price, 2))),
+                        low_price=Decimal(str(round(low_price, 2))),
+                        close_price=Decimal(str(round(close_price, 2))),
+                        adjusted_close=Decimal(str(round(close_price, 2))),
+                        volume=random.randint(20000000, 60000000),
+                        provider=DataProvider.POLYGON
+                    )
+
+                    doc_id = f"{symbol}_{date.strftime('%Y-%m-%d')}"
+                    await writer.upsert("di_prices_daily", doc_id, to_document(price_data))
+
+                self.latest_prices[symbol] = round(close_price, 2)
 
     async def _init_news(self):
-        """Initialize news collection with sample news items."""
-        print("  📰 Creating news collection...")
+        """Initialize di_company_news with sample news items."""
+        print("  📰 Creating di_company_news collection...")
 
         news_items = [
-            NewsItem(
-                id="news_001",
-                symbol="AAPL",
-                title="Apple Reports Strong Q4 Earnings",
-                summary="Apple Inc. reported better-than-expected earnings for Q4, driven by strong iPhone sales.",
-                content="Apple Inc. today announced financial results for its fiscal 2024 fourth quarter...",
-                source="MarketWatch",
-                url="https://example.com/news/1",
-                published_at=datetime.utcnow() - timedelta(hours=2),
-                sentiment_score=0.8,
-                relevance_score=0.95
-            ),
-            NewsItem(
-                id="news_002",
-                symbol="TSLA",
-                title="Tesla Announces New Manufacturing Plant",
-                summary="Tesla plans to open a new gigafactory in the southwestern United States.",
-                content="Tesla Inc. announced plans for a new manufacturing facility...",
-                source="Reuters",
-                url="https://example.com/news/2",
-                published_at=datetime.utcnow() - timedelta(hours=5),
-                sentiment_score=0.7,
-                relevance_score=0.85
-            ),
-            NewsItem(
-                id="news_003",
-                symbol="MSFT",
-                title="Microsoft Partners with Major Cloud Client",
-                summary="Microsoft secures multi-billion dollar cloud computing contract.",
-                content="Microsoft Corporation announced a significant partnership...",
-                source="TechCrunch",
-                url="https://example.com/news/3",
-                published_at=datetime.utcnow() - timedelta(hours=8),
-                sentiment_score=0.9,
-                relevance_score=0.88
-            )
+            ("AAPL", "Apple Reports Strong Q4 Earnings",
+             "Apple Inc. reported better-than-expected earnings for Q4, driven by strong iPhone sales.", 0.8),
+            ("TSLA", "Tesla Announces New Manufacturing Plant",
+             "Tesla plans to open a new gigafactory in the southwestern United States.", 0.7),
+            ("MSFT", "Microsoft Partners with Major Cloud Client",
+             "Microsoft secures multi-billion dollar cloud computing contract.", 0.9),
         ]
 
-        for news in news_items:
-            await self.client.set_document("news", news.id, news.dict())
-
-    async def _init_portfolio(self):
-        """Initialize portfolio collection."""
-        print("  💼 Creating portfolio collection...")
-
-        portfolio = Portfolio(
-            user_id="default_user",
-            total_value=125000.00,
-            cash_balance=25000.00,
-            invested_value=100000.00,
-            day_change=1250.00,
-            day_change_percent=1.01,
-            total_return=25000.00,
-            total_return_percent=25.0,
-            last_updated=datetime.utcnow()
-        )
-
-        await self.client.set_document("portfolio", "default_user", portfolio.dict())
+        for i, (symbol, headline, summary, sentiment) in enumerate(news_items):
+            news = NewsData(
+                headline=headline,
+                summary=summary,
+                url=f"https://example.com/news/{i + 1}",
+                published_at=datetime.utcnow() - timedelta(hours=2 + 3 * i),
+                symbols=[symbol],
+                sentiment_score=sentiment,
+                provider=DataProvider.FINNHUB
+            )
+            doc_id = f"{symbol}_{news.published_at.strftime('%Y-%m-%d_%H-%M-%S')}"
+            await self.client.upsert_document("di_company_news", doc_id, to_document(news))
 
     async def _init_positions(self):
-        """Initialize positions collection with sample positions."""
-        print("  📊 Creating positions collection...")
-
-        positions = [
-            Position(
-                user_id="default_user",
-                symbol="AAPL",
-                quantity=100,
-                average_cost=165.50,
-                current_price=175.50,
-                market_value=17550.00,
-                unrealized_pnl=1000.00,
-                unrealized_pnl_percent=6.04,
-                last_updated=datetime.utcnow()
-            ),
-            Position(
-                user_id="default_user",
-                symbol="MSFT",
-                quantity=50,
-                average_cost=350.00,
-                current_price=378.85,
-                market_value=18942.50,
-                unrealized_pnl=1442.50,
-                unrealized_pnl_percent=8.24,
-                last_updated=datetime.utcnow()
-            ),
-            Position(
-                user_id="default_user",
-                symbol="GOOGL",
-                quantity=150,
-                average_cost=135.00,
-                current_price=140.25,
-                market_value=21037.50,
-                unrealized_pnl=787.50,
-                unrealized_pnl_percent=3.89,
-                last_updated=datetime.utcnow()
-            ),
-            Position(
-                user_id="default_user",
-                symbol="TSLA",
-                quantity=75,
-                average_cost=220.00,
-                current_price=248.50,
-                market_value=18637.50,
-                unrealized_pnl=2137.50,
-                unrealized_pnl_percent=12.95,
-                last_updated=datetime.utcnow()
+        """Initialize pf_positions_active with sample positions."""
+        print("  📊 Creating pf_positions_active collection...")
+
+        holdings = [("AAPL", 100, 165.50), ("MSFT", 50, 350.00),
+                    ("GOOGL", 150, 135.00), ("TSLA", 75, 220.00)]
+
+        for symbol, quantity, average_cost in holdings:
+            current_price = self.latest_prices.get(symbol, average_cost)
+            position = Position(
+                symbol=symbol,
+                quantity=quantity,
+                average_cost=Decimal(str(average_cost)),
+                cost_basis=Decimal(str(round(average_cost * quantity, 2))),
+                current_price=Decimal(str(current_price)),
+                market_value=Decimal(str(round(current_price * quantity, 2))),
+                unrealized_pnl=Decimal(
+                    str(round((current_price - average_cost) * quantity, 2))),
+                opened_at=datetime.utcnow() - timedelta(days=15)
             )
-        ]
-
-        for position in positions:
-            doc_id = f"{position.user_id}_{position.symbol}"
-            await self.client.set_document("positions", doc_id, position.dict())
+            doc_id = f"{symbol}_{position.opened_at.strftime('%Y%m%d_%H%M%S')}"
+            await self.client.upsert_document("pf_positions_active", doc_id, to_document(position))
 
     async def _init_transactions(self):
-        """Initialize transactions collection with sample transactions."""
-        print("  💳 Creating transactions collection...")
-
-        transactions = [
-            Transaction(
-                id="txn_001",
-                user_id="default_user",
-                symbol="AAPL",
-                transaction_type="BUY",
-                quantity=100,
-                price=165.50,
-                total_amount=16550.00,
-                fees=1.00,
-                timestamp=datetime.utcnow() - timedelta(days=15)
-            ),
-            Transaction(
-                id="txn_002",
-                user_id="default_user",
-                symbol="MSFT",
-                transaction_type="BUY",
-                quantity=50,
-                price=350.00,
-                total_amount=17500.00,
-                fees=1.00,
-                timestamp=datetime.utcnow() - timedelta(days=10)
-            ),
-            Transaction(
-                id="txn_003",
-                user_id="default_user",
-                symbol="GOOGL",
-                transaction_type="BUY",
-                quantity=150,
-                price=135.00,
-                total_amount=20250.00,
-                fees=1.00,
-                timestamp=datetime.utcnow() - timedelta(days=8)
-            ),
-            Transaction(
-                id="txn_004",
-                user_id="default_user",
-                symbol="TSLA",
-                transaction_type="BUY",
-                quantity=75,
-                price=220.00,
-                total_amount=16500.00,
-                fees=1.00,
-                timestamp=datetime.utcnow() - timedelta(days=5)
+        """Initialize pf_transactions with the buys behind the positions."""
+        print("  💳 Creating pf_transactions collection...")
+
+        buys = [("AAPL", 100, 165.50, 15), ("MSFT", 50, 350.00, 10),
+                ("GOOGL", 150, 135.00, 8), ("TSLA", 75, 220.00, 5)]
+
+        for symbol, quantity, price, days_ago in buys:
+            transaction = Transaction(
+                symbol=symbol,
+                transaction_type=TransactionType.BUY,
+                quantity=quantity,
+                price=Decimal(str(price)),
+                total_amount=Decimal(str(price * quantity)),
+                fees=Decimal('1.00'),
+                executed_at=datetime.utcnow() - timedelta(days=days_ago)
             )
-        ]
-
-        for transaction in transactions:
-            await self.client.set_document("transactions", transaction.id, transaction.dict())
+            doc_id = f"{symbol}_buy_{transaction.executed_at.strftime('%Y%m%d_%H%M%S')}"
+            await self.client.upsert_document("pf_transactions", doc_id, to_document(transaction))
 
     async def _init_watchlist(self):
-        """Initialize watchlist collection."""
-        print("  👀 Creating watchlist collection...")
-
-        watchlist_items = [
-            WatchlistItem(
-                user_id="default_user",
-                symbol="NVDA",
-                added_by="user",
-                priority=1,
-                added_at=datetime.utcnow() - timedelta(days=3)
-            ),
-            WatchlistItem(
-                user_id="default_user",
-                symbol="META",
-                added_by="user",
-                priority=2,
-                added_at=datetime.utcnow() - timedelta(days=2)
-            ),
-            WatchlistItem(
-                user_id="default_user",
-                symbol="NFLX",
-                added_by="strategy_engine",
-                priority=1,
-                added_at=datetime.utcnow() - timedelta(days=1)
+        """Initialize pf_watchlist."""
+        print("  👀 Creating pf_watchlist collection...")
+
+        for priority, symbol in enumerate(WATCHLIST_SYMBOLS + SYMBOLS, start=1):
+            item = WatchlistItem(
+                symbol=symbol,
+                added_by="init_script",
+                priority=min(priority, 5)
             )
-        ]
-
-        for item in watchlist_items:
-            doc_id = f"{item.user_id}_{item.symbol}"
-            await self.client.set_document("watchlist", doc_id, item.dict())
+            doc_id = f"{symbol}_{item.created_at.strftime('%Y%m%d_%H%M%S')}"
+            await self.client.upsert_document("pf_watchlist", doc_id, to_document(item))
 
     async def _init_ml_models(self):
-        """Initialize ml_models collection."""
-        print("  🤖 Creating ml_models collection...")
-
-        model = MLModel(
-            model_id="xgboost_v1",
-            model_type="classification",
-            algorithm="XGBoost",
-            version="1.0.0",
-            features=[
-                "rsi_14", "macd", "bb_position", "sma_20", "sma_50",
-                "volume_sma", "price_momentum", "volatility"
-            ],
-            training_symbols=["AAPL", "MSFT", "GOOGL", "AMZN", "TSLA"],
-            training_start_date=datetime.utcnow() - timedelta(days=365),
-            training_end_date=datetime.utcnow() - timedelta(days=1),
+        """Initialize ml_model_metadata."""
+        print("  🤖 Creating ml_model_metadata collection...")
+
+        model = ModelMetadata(
+            model_name="xgboost_classifier",
+            model_version="init",
+            training_date=datetime.utcnow() - timedelta(days=1),
             accuracy=0.68,
             precision=0.72,
             recall=0.65,
             f1_score=0.68,
-            created_at=datetime.utcnow(),
-            is_active=True
+            auc_score=0.74,
+            hyperparameters={"n_estimators": 100, "max_depth": 6, "learning_rate": 0.1},
+            feature_importance={"rsi": 0.18, "macd": 0.15, "bb_position": 0.12}
         )
-
-        await self.client.set_document("ml_models", model.model_id, model.dict())
-
-    async def _init_trade_signals(self):
-        """Initialize trade_signals collection."""
-        print("  📊 Creating trade_signals collection...")
-
-        signals = [
-            TradeSignal(
-                id="signal_001",
-                symbol="AAPL",
-                signal="BUY",
-                confidence=0.85,
-                entry_price=175.50,
-                stop_loss=165.00,
-                take_profit=190.00,
-                position_size=0.05,
-                reasoning="Strong technical indicators with RSI oversold and positive momentum",
-                model_id="xgboost_v1",
-                generated_at=datetime.utcnow() - timedelta(minutes=30),
-                expires_at=datetime.utcnow() + timedelta(hours=24),
-                is_active=True
-            ),
-            TradeSignal(
-                id="signal_002",
-                symbol="TSLA",
-                signal="SELL",
-                confidence=0.72,
-                entry_price=248.50,
-                stop_loss=255.00,
-                take_profit=230.00,
-                position_size=0.03,
-                reasoning="Overbought conditions with negative divergence in momentum indicators",
-                model_id="xgboost_v1",
-                generated_at=datetime.utcnow() - timedelta(minutes=15),
-                expires_at=datetime.utcnow() + timedelta(hours=24),
-                is_active=True
-            )
-        ]
-
-        for signal in signals:
-            await self.client.set_document("trade_signals", signal.id, signal.dict())
+        await self.client.upsert_document(
+            "ml_model_metadata", f"{model.model_name}_{model.model_version}", to_document(model))
 
     async def _init_recommendations(self):
-        """Initialize recommendations collection."""
-        print("  💡 Creating recommendations collection...")
-
-        recommendations = [
-            TradingRecommendation(
-                id="rec_001",
-                user_id="default_user",
-                symbol="AAPL",
-                recommendation="BUY",
-                confidence=0.85,
-                target_price=190.00,
-                stop_loss=165.00,
-                reasoning="Strong fundamentals combined with positive technical setup. Q4 earnings beat expectations and guidance raised.",
-                risk_score=0.3,
-                expected_return=0.12,
-                time_horizon="medium_term",
-                model_id="xgboost_v1",
-                generated_at=datetime.utcnow(),
-                expires_at=datetime.utcnow() + timedelta(days=7),
-                is_active=True
-            ),
-            TradingRecommendation(
-                id="rec_002",
-                user_id="default_user",
-                symbol="MSFT",
-                recommendation="HOLD",
-                confidence=0.75,
-                target_price=385.00,
-                stop_loss=350.00,
-                reasoning="Maintain current position. Cloud growth remains strong but stock is fairly valued at current levels.",
-                risk_score=0.25,
-                expected_return=0.08,
-                time_horizon="long_term",
-                model_id="xgboost_v1",
-                generated_at=datetime.utcnow(),
-                expires_at=datetime.utcnow() + timedelta(days=7),
-                is_active=True
-            ),
-            TradingRecommendation(
-                id="rec_003",
-                user_id="default_user",
-                symbol="TSLA",
-                recommendation="SELL",
-                confidence=0.68,
-                target_price=230.00,
-                stop_loss=255.00,
-                reasoning="Technical indicators suggest short-term weakness. Consider taking profits and re-entering at lower levels.",
-                risk_score=0.4,
-                expected_return=-0.08,
-                time_horizon="short_term",
-                model_id="xgboost_v1",
-                generated_at=datetime.utcnow(),
-                expires_at=datetime.utcnow() + timedelta(days=3),
-                is_active=True
+        """Initialize ml_recommendations_log."""
+        print("  💡 Creating ml_recommendations_log collection...")
+
+        choices = [RecommendationType.BUY, RecommendationType.HOLD, RecommendationType.SELL]
+        for symbol in SYMBOLS + WATCHLIST_SYMBOLS:
+            recommendation = MLRecommendation(
+                symbol=symbol,
+                recommendation=random.choice(choices),
+                confidence_score=round(random.uniform(60, 95), 1),
+                model_version="xgboost_classifier",
+                features_used={"rsi": round(random.uniform(20, 80), 2)}
             )
-        ]
+            doc_id = f"{symbol}_{recommendation.created_at.strftime('%Y-%m-%d_%H-%M-%S')}"
+            await self.client.upsert_document(
+                "ml_recommendations_log", doc_id, to_document(recommendation))
 
-        for rec in recommendations:
-            await self.client.set_document("recommendations", rec.id, rec.dict())
+    async def _init_trade_signals(self):
+        """Initialize se_trade_signals."""
+        print("  📡 Creating se_trade_signals collection...")
+
+        for symbol in WATCHLIST_SYMBOLS[:2]:
+            price = Decimal(str(self.latest_prices.get(symbol, 100.0)))
+            signal = TradeSignal(
+                symbol=symbol,
+                signal_type=RecommendationType.BUY,
+                quantity=10,
+                price_limit=price,
+                stop_loss=price * Decimal('0.92'),
+                take_profit=price * Decimal('1.15'),
+                confidence=85.0,
+                reasoning="Seeded signal",
+                expires_at=datetime.utcnow() + timedelta(hours=24)
+            )
+            doc_id = f"{symbol}_{signal.created_at.strftime('%Y-%m-%d_%H-%M-%S')}"
+            await self.client.upsert_document("se_trade_signals", doc_id, to_document(signal))
 
 
 async def main():
     """Main function to run the initialization."""
-    import asyncio
-
     # Get project ID from environment or prompt
     project_id = os.getenv('GCP_PROJECT_ID')
+    local_backend = os.getenv('FIRESTORE_BACKEND', 'firestore').lower() != 'firestore'
+    if not project_id and local_backend:
+        project_id = "moda-trader"
     if not project_id:
         project_id = input("Enter your GCP Project ID: ").strip()
         if not project_id:
@@ -574,21 +256,19 @@ async def main():
 
     try:
         print(f"🚀 Initializing Firestore for project: {project_id}")
-        initializer = FirestoreInitializer(project_id)
+        initializer = FirestoreInitializer(
+            project_id, seed_days=int(os.getenv('SEED_DAYS', '30')))
         await initializer.create_collections()
         print("\n🎉 Firestore initialization completed successfully!")
         print("\nCollections created:")
-        print("  - companies: Company information and fundamentals")
-        print("  - stocks: Current stock data and prices")
-        print("  - price_data: Historical price and volume data")
-        print("  - news: News articles and sentiment analysis")
-        print("  - portfolio: User portfolio summaries")
-        print("  - positions: Individual stock positions")
-        print("  - transactions: Trade transaction history")
-        print("  - watchlist: Symbols being monitored")
-        print("  - ml_models: Machine learning model metadata")
-        print("  - trade_signals: Generated trading signals")
-        print("  - recommendations: AI-powered trading recommendations")
+        print("  - di_prices_daily: Historical daily price and volume data")
+        print("  - di_company_news: Company news articles")
+        print("  - pf_positions_active: Open portfolio positions")
+        print("  - pf_transactions: Trade transaction history")
+        print("  - pf_watchlist: Symbols being monitored")
+        print("  - ml_model_metadata: Machine learning model metadata")
+        print("  - ml_recommendations_log: ML trading recommendations")
+        print("  - se_trade_signals: Generated trading signals")
 
     except Exception as e:
         print(f"❌ Error initializing Firestore: {e}")
@@ -0,0 +1,90 @@
+"""
+Price History Columnar Migration
+
+Copies per-bar di_prices_daily documents into the per-symbol-year layout in
+di_prices_daily_columnar (see shared/price_columns.py). The source collection
+is streamed page by page in document ID order, which keeps each symbol's bars
+contiguous, and each symbol is merged into its year documents as soon as its
+last bar has been read. Re-running is safe: bars are merged by date. With
+--symbols, the collection is streamed once per 30 symbols (Firestore's limit
+for an "in" filter).
+
+Usage:
+    python scripts/migrate_prices_columnar.py [--symbols AAPL MSFT] [--page-size 1000]
+
+Set PRICE_STORAGE_LAYOUT=both on the ingestion services before migrating so
+new bars land in both layouts, then switch readers with PRICE_STORAGE_LAYOUT=columnar.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.firestore_client import FirestoreClient, in_chunks  # noqa: E402
+from shared.logging_config import setup_logging  # noqa: E402
+from shared.price_columns import store_columnar_prices  # noqa: E402
+
+
+async def migrate_symbol(client: FirestoreClient, symbol: str,
+                         rows: List[Dict[str, Any]], dry_run: bool) -> bool:
+    years = sorted({row['date'].year for row in rows})
+    print(f"  {symbol}: {len(rows)} bars -> {len(years)} documents ({years[0]}-{years[-1]})")
+    if dry_run:
+        return True
+    return await store_columnar_prices(client, symbol, rows)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--symbols", nargs="*", help="Only migrate these symbols")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Read and group bars without writing")
+    args = parser.parse_args()
+    setup_logging("migrate-prices-columnar", level="WARNING")
+
+    client = FirestoreClient(os.getenv('GCP_PROJECT_ID', 'moda-trader'))
+    filter_sets = ([[("symbol", "in", chunk)] for chunk in in_chunks(args.symbols)]
+                   if args.symbols else [None])
+
+    started = time.perf_counter()
+    current_symbol, rows = None, []
+    read = symbols = failures = 0
+
+    print("🚚 Migrating di_prices_daily to the columnar layout...")
+    try:
+        for filters in filter_sets:
+            async for page in client.stream_documents(
+                    "di_prices_daily", filters=filters, page_size=args.page_size):
+                read += len(page)
+                for row in page:
+                    if row['symbol'] != current_symbol and rows:
+                        symbols += 1
+                        if not await migrate_symbol(client, current_symbol, rows, args.dry_run):
+                            failures += 1
+                        rows = []
+                    current_symbol = row['symbol']
+                    rows.append(row)
+
+            if rows:
+                symbols += 1
+                if not await migrate_symbol(client, current_symbol, rows, args.dry_run):
+                    failures += 1
+                current_symbol, rows = None, []
+    finally:
+        client.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ {read} bars from {symbols} symbols in {elapsed:.1f}s"
+          + (f", {failures} failed" if failures else ""))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
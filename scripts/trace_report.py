@@ -0,0 +1,228 @@
+"""
+Trace Report
+
+Prints where the wall time of one trace went, from the JSON-lines span files
+written with TRACE_EXPORT=file (see shared/tracing.py). Spans from several
+services can be passed as several files.
+
+Usage:
+    python scripts/trace_report.py /tmp/moda-traces.jsonl [more.jsonl ...]
+    python scripts/trace_report.py traces.jsonl --trace-id 4bf92f3577b34da6a3ce929d0e0e4736
+    python scripts/trace_report.py traces.jsonl --list
+
+Without --trace-id the longest trace started by an HTTP request (e.g.
+POST /orchestrate/full) is reported. The report has three parts:
+
+    tree           every span with its start offset and duration
+    critical path  the chain of spans that determined when the trace ended;
+                   shortening anything else would not finish it sooner
+    breakdown      critical-path time by service and span kind
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+
+class SpanNode:
+    def __init__(self, record: Dict):
+        self.record = record
+        self.span_id = record["span_id"]
+        self.parent_id = record.get("parent_id")
+        self.name = record["name"]
+        self.kind = record.get("kind", "internal")
+        self.service = record.get("service", "?")
+        self.status = record.get("status", "ok")
+        self.start = record["start"]
+        self.end = self.start + (record.get("duration_ms") or 0) / 1000
+        self.children: List["SpanNode"] = []
+        # End of this span or of anything it started, whichever is later
+        self.tree_end = self.end
+
+    @property
+    def label(self) -> str:
+        return f"[{self.service}] {self.name}"
+
+
+def load_spans(paths: List[str]) -> Dict[str, List[Dict]]:
+    traces: Dict[str, List[Dict]] = defaultdict(list)
+    for path in paths:
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line.startswith("{"):
+                    continue  # stdout exports are mixed with log lines
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    print(f"⚠️  {path}:{line_number}: unreadable line skipped", file=sys.stderr)
+                    continue
+                if "trace_id" in record and "span_id" in record:
+                    traces[record["trace_id"]].append(record)
+    return traces
+
+
+def build_tree(records: List[Dict]) -> List[SpanNode]:
+    """Link spans to their parents; returns the roots (spans without a known parent)."""
+    nodes = {record["span_id"]: SpanNode(record) for record in records}
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node.parent_id) if node.parent_id else None
+        if parent is not None:
+            parent.children.append(node)
+        else:
+            roots.append(node)
+
+    def settle(node: SpanNode) -> float:
+        node.children.sort(key=lambda child: child.start)
+        for child in node.children:
+            node.tree_end = max(node.tree_end, settle(child))
+        return node.tree_end
+
+    for root in roots:
+        settle(root)
+    return sorted(roots, key=lambda root: root.start)
+
+
+def critical_path(node: SpanNode, until: float) -> List[Tuple[SpanNode, float, float]]:
+    """(span, start, end) segments of the critical path within ``node`` up to ``until``.
+
+    Walks backwards from ``until``: the child that finished last before that
+    point is what the span was waiting for, and the gaps between such
+    children are the span's own time. While the span is running it only
+    waits for its children's own spans; work they left running (background
+    tasks in another service) matters only past the span's end.
+    """
+    segments: List[Tuple[SpanNode, float, float]] = []
+    cursor = until
+    remaining = list(node.children)
+
+    def reach(child: SpanNode) -> float:
+        return min(child.tree_end if cursor > node.end else child.end, cursor)
+
+    while True:
+        candidates = [child for child in remaining if child.start < cursor]
+        if not candidates:
+            break
+        child = max(candidates, key=reach)
+        child_end = reach(child)
+        remaining.remove(child)
+        if child_end < cursor:
+            segments.append((node, child_end, cursor))
+        segments.extend(critical_path(child, child_end))
+        cursor = child.start
+    if cursor > node.start:
+        segments.append((node, node.start, cursor))
+    return segments
+
+
+def pick_trace(traces: Dict[str, List[Dict]], trace_id: Optional[str]) -> Optional[str]:
+    if trace_id:
+        matches = [tid for tid in traces if tid.startswith(trace_id)]
+        return matches[0] if len(matches) == 1 else None
+
+    def wall_time(records: List[Dict]) -> float:
+        return (max(r["start"] + (r.get("duration_ms") or 0) / 1000 for r in records)
+                - min(r["start"] for r in records))
+
+    served = [tid for tid, records in traces.items()
+              if any(r.get("kind") == "server" and not r.get("parent_id") for r in records)]
+    candidates = served or list(traces)
+    return max(candidates, key=lambda tid: wall_time(traces[tid]), default=None)
+
+
+def tree_lines(node: SpanNode, origin: float, depth: int = 0):
+    flag = " ❌" if node.status == "error" else ""
+    yield (f"{(node.start - origin) * 1000:10.1f} {(node.end - node.start) * 1000:10.1f}  "
+           f"{'  ' * depth}{node.label}{flag}")
+    for child in node.children:
+        yield from tree_lines(child, origin, depth + 1)
+
+
+def report(records: List[Dict], max_spans: int):
+    roots = build_tree(records)
+    origin = min(root.start for root in roots)
+    end = max(root.tree_end for root in roots)
+    total = end - origin
+
+    print(f"🔎 Trace {records[0]['trace_id']}: {len(records)} spans, "
+          f"{len({r.get('service') for r in records})} services, {total * 1000:.1f} ms wall time")
+    if len(roots) > 1:
+        print(f"⚠️  {len(roots)} root spans; some parents are missing from the input files")
+
+    print("\n   start ms     dur ms  span")
+    lines = [line for root in roots for line in tree_lines(root, origin)]
+    for line in lines[:max_spans]:
+        print(line)
+    if len(lines) > max_spans:
+        print(f"{'':21}... {len(lines) - max_spans} more spans")
+
+    segments: List[Tuple[SpanNode, float, float]] = []
+    cursor = end
+    for root in sorted(roots, key=lambda r: r.tree_end, reverse=True):
+        if root.start >= cursor:
+            continue
+        segments.extend(critical_path(root, min(root.tree_end, cursor)))
+        cursor = root.start
+    segments.sort(key=lambda segment: segment[1])
+
+    # Merge adjacent segments of the same span for readability
+    merged: List[List] = []
+    for node, start, stop in segments:
+        if merged and merged[-1][0] is node and abs(merged[-1][2] - start) < 1e-6:
+            merged[-1][2] = stop
+        else:
+            merged.append([node, start, stop])
+
+    print("\n🧭 Critical path")
+    for node, start, stop in merged:
+        duration = (stop - start) * 1000
+        if duration < 0.05:
+            continue
+        print(f"{(start - origin) * 1000:10.1f} {duration:10.1f}  {node.label}")
+
+    by_service: Dict[str, float] = defaultdict(float)
+    by_kind: Dict[str, float] = defaultdict(float)
+    by_span: Dict[str, float] = defaultdict(float)
+    for node, start, stop in merged:
+        by_service[node.service] += stop - start
+        by_kind[node.kind] += stop - start
+        by_span[node.label] += stop - start
+
+    for title, totals in (("service", by_service), ("kind", by_kind), ("span", by_span)):
+        print(f"\n📊 Critical path by {title}")
+        for key, seconds in sorted(totals.items(), key=lambda item: -item[1])[:15]:
+            share = seconds / total * 100 if total else 0
+            print(f"{seconds * 1000:10.1f} ms {share:5.1f}%  {key}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Critical-path report for one trace")
+    parser.add_argument("files", nargs="+", help="JSON-lines span files")
+    parser.add_argument("--trace-id", help="Trace to report (a unique prefix is enough)")
+    parser.add_argument("--list", action="store_true", help="List traces and exit")
+    parser.add_argument("--max-spans", type=int, default=200,
+                        help="Print at most this many spans of the tree")
+    args = parser.parse_args()
+
+    traces = load_spans(args.files)
+    if not traces:
+        sys.exit("No spans found")
+
+    if args.list:
+        for trace_id, records in sorted(traces.items(), key=lambda item: min(r["start"] for r in item[1])):
+            roots = [r for r in records if not r.get("parent_id")]
+            name = roots[0]["name"] if roots else records[0]["name"]
+            print(f"{trace_id}  {len(records):6d} spans  {name}")
+        return
+
+    trace_id = pick_trace(traces, args.trace_id)
+    if trace_id is None:
+        sys.exit(f"No single trace matches {args.trace_id}")
+    report(traces[trace_id], args.max_spans)
+
+
+if __name__ == "__main__":
+    main()
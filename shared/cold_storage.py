@@ -0,0 +1,168 @@
+"""
+Parquet cold tier for historical prices.
+
+Closed periods of daily and intraday prices are moved out of Firestore into
+Parquet files (scripts/archive_prices.py), partitioned Hive-style by symbol
+and year:
+
+    {PRICE_ARCHIVE_URI}/daily/symbol=AAPL/year=2022/data.parquet
+    {PRICE_ARCHIVE_URI}/intraday/symbol=AAPL/year=2024/data.parquet
+
+PRICE_ARCHIVE_URI is a local directory or any URI pyarrow's filesystem layer
+understands, e.g. gs://moda-trader-archive/prices. Reads push the symbol and
+year predicates down to partition pruning and the date range down to Parquet
+row-group statistics, so a training read only opens the files it needs.
+
+pyarrow is imported lazily; services that never touch the archive do not need
+it installed.
+"""
+
+import functools
+import os
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+PARTITION_FILE = "data.parquet"
+
+# Dataset name -> (source collection, time field, stored columns and types).
+# symbol and year live in the partition path, not in the files.
+DATASETS: Dict[str, Tuple[str, str, Tuple[Tuple[str, str], ...]]] = {
+    "daily": ("di_prices_daily", "date", (
+        ("date", "timestamp"),
+        ("open_price", "float64"),
+        ("high_price", "float64"),
+        ("low_price", "float64"),
+        ("close_price", "float64"),
+        ("adjusted_close", "float64"),
+        ("volume", "int64"),
+        ("provider", "string"),
+    )),
+    "intraday": ("di_prices_intraday", "timestamp", (
+        ("timestamp", "timestamp"),
+        ("price", "float64"),
+        ("volume", "int64"),
+        ("provider", "string"),
+    )),
+}
+
+
+def archive_uri() -> Optional[str]:
+    """Configured archive location (PRICE_ARCHIVE_URI), or None if there is no cold tier."""
+    return os.getenv("PRICE_ARCHIVE_URI") or None
+
+
+@functools.lru_cache(maxsize=None)
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.fs
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("The price archive needs pyarrow installed") from e
+    return pyarrow
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _plain(value: Any) -> Any:
+    """Firestore/pydantic values to what Arrow stores."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return _as_utc(value)
+    return getattr(value, "value", value)
+
+
+class PriceArchive:
+    """Reads and writes the partitioned Parquet price archive."""
+
+    def __init__(self, uri: str):
+        pa = _pyarrow()
+        self.uri = uri
+        self.filesystem, self.root = pa.fs.FileSystem.from_uri(uri)
+
+    def _schema(self, dataset: str):
+        pa = _pyarrow()
+        types = {"timestamp": pa.timestamp("us", tz="UTC"), "float64": pa.float64(),
+                 "int64": pa.int64(), "string": pa.string()}
+        return pa.schema([(name, types[kind]) for name, kind in DATASETS[dataset][2]])
+
+    def _partitioning(self):
+        pa = _pyarrow()
+        return pa.dataset.partitioning(
+            pa.schema([("symbol", pa.string()), ("year", pa.int16())]), flavor="hive")
+
+    def partition_path(self, dataset: str, symbol: str, year: int) -> str:
+        return f"{self.root}/{dataset}/symbol={symbol}/year={year}/{PARTITION_FILE}"
+
+    def write_partition(self, dataset: str, symbol: str, year: int,
+                        rows: Iterable[Dict[str, Any]]) -> int:
+        """Merge rows into one symbol-year file; returns the file's row count.
+
+        Rows are keyed by the dataset's time field and new rows win, so
+        re-archiving the same period is idempotent. The file is written next
+        to its final path (with a "_" prefix, which dataset discovery skips)
+        and then moved into place.
+        """
+        pa = _pyarrow()
+        schema = self._schema(dataset)
+        time_field = DATASETS[dataset][1]
+        path = self.partition_path(dataset, symbol, year)
+
+        frame = pd.DataFrame.from_records(
+            [{name: _plain(row.get(name)) for name in schema.names} for row in rows],
+            columns=schema.names)
+        if self.filesystem.get_file_info(path).type != pa.fs.FileType.NotFound:
+            existing = pa.parquet.read_table(path, filesystem=self.filesystem).to_pandas()
+            frame = pd.concat([existing, frame], ignore_index=True)
+        frame = (frame.drop_duplicates(subset=[time_field], keep="last")
+                 .sort_values(time_field, ignore_index=True))
+
+        table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+        directory = path.rsplit("/", 1)[0]
+        self.filesystem.create_dir(directory, recursive=True)
+        tmp_path = f"{directory}/_{PARTITION_FILE}.tmp"
+        pa.parquet.write_table(table, tmp_path, filesystem=self.filesystem, compression="zstd")
+        self.filesystem.move(tmp_path, path)
+        return table.num_rows
+
+    def read(self, dataset: str, symbols: Optional[List[str]],
+             start: datetime, end: datetime,
+             columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Rows of ``symbols`` (all if None) with start <= time <= end.
+
+        The frame has ``symbol`` plus the requested columns (all by default),
+        with times as UTC datetimes; it is empty if nothing is archived.
+        """
+        pa = _pyarrow()
+        time_field = DATASETS[dataset][1]
+        base = f"{self.root}/{dataset}"
+        if self.filesystem.get_file_info(base).type == pa.fs.FileType.NotFound:
+            return pd.DataFrame()
+
+        data = pa.dataset.dataset(base, format="parquet", filesystem=self.filesystem,
+                                  partitioning=self._partitioning())
+        start, end = _as_utc(start), _as_utc(end)
+        field = pa.dataset.field
+        predicate = ((field("year") >= start.year) & (field("year") <= end.year)
+                     & (field(time_field) >= pa.scalar(start, pa.timestamp("us", tz="UTC")))
+                     & (field(time_field) <= pa.scalar(end, pa.timestamp("us", tz="UTC"))))
+        if symbols:
+            predicate &= field("symbol").isin(list(symbols))
+
+        names = columns or [name for name, _ in DATASETS[dataset][2]]
+        table = data.to_table(columns=["symbol"] + [n for n in names if n != "symbol"],
+                              filter=predicate)
+        frame = table.to_pandas()
+        frame[time_field] = frame[time_field].astype("datetime64[ns, UTC]")
+        logger.info("Archived prices read", dataset=dataset, rows=len(frame))
+        return frame
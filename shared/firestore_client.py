@@ -2,145 +2,966 @@
 Firestore client wrapper for consistent database operations across services.
 """
 
+import asyncio
+import functools
 import os
-from typing import Dict, List, Optional, Any
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, AsyncIterator, Awaitable, Callable, Set, Tuple
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 import structlog
 
+from . import tracing
+from .metrics import FirestoreMetrics, firestore_metrics
+from .retry import RetryPolicy
+
 logger = structlog.get_logger()
 
+# Upper bound on Firestore RPCs in flight per client (FIRESTORE_MAX_CONCURRENCY)
+DEFAULT_MAX_CONCURRENCY = 16
+
+# Firestore rejects batched writes with more than 500 operations
+MAX_BATCH_SIZE = 500
+
+# Documents fetched per round trip by stream_documents
+DEFAULT_PAGE_SIZE = 1000
+
+# Document references per get_all round trip in get_documents
+GET_ALL_CHUNK_SIZE = 100
+# Firestore caps disjunctions, so `in` filters take at most 30 values
+IN_QUERY_CHUNK_SIZE = 30
+
+
+def in_chunks(values: List[Any], size: int = IN_QUERY_CHUNK_SIZE) -> List[List[Any]]:
+    """De-duplicate values and split them into `in`-clause sized chunks."""
+    unique = list(dict.fromkeys(values))
+    return [unique[i:i + size] for i in range(0, len(unique), size)]
+
+
+def _freeze(value: Any) -> Any:
+    """Make a filter value usable as part of a cache key."""
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class QueryCache:
+    """Read-through TTL + LRU cache for query and document reads.
+
+    Caching is opt-in per collection: only collections listed in ``ttls``
+    (seconds) are cached. Writes made through the owning FirestoreClient
+    invalidate every entry of the written collection, and a per-collection
+    generation counter stops a read that raced a write from repopulating the
+    cache with stale results. Writes from other processes are only picked up
+    when the TTL expires, so keep TTLs short for shared collections.
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 1024):
+        self.ttls = dict(ttls)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[tuple, Tuple[float, Any]]" = OrderedDict()
+        self._keys_by_collection: Dict[str, Set[tuple]] = {}
+        self._generations: Dict[str, int] = {}
+
+    def enabled_for(self, collection: str) -> bool:
+        return collection in self.ttls
+
+    @staticmethod
+    def query_key(collection: str, filters: Optional[List[tuple]], order_by: Optional[str],
+                  limit: Optional[int], descending: bool = False,
+                  select: Optional[List[str]] = None) -> tuple:
+        frozen = tuple((f, op, _freeze(v)) for f, op, v in filters or [])
+        projection = tuple(sorted(select)) if select is not None else None
+        return ("query", collection, frozen, order_by, descending, limit, projection)
+
+    @staticmethod
+    def aggregate_key(collection: str, filters: Optional[List[tuple]], spec: tuple) -> tuple:
+        frozen = tuple((f, op, _freeze(v)) for f, op, v in filters or [])
+        return ("aggregate", collection, frozen, spec)
+
+    @staticmethod
+    def document_key(collection: str, document_id: str) -> tuple:
+        return ("document", collection, document_id)
+
+    def generation(self, collection: str) -> int:
+        return self._generations.get(collection, 0)
+
+    def get(self, key: tuple) -> Optional[Any]:
+        """Return a cached value, or None on a miss or expired entry."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._evict(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: tuple, value: Any, generation: int):
+        """Store a value read at ``generation``; dropped if a write happened since."""
+        collection = key[1]
+        if generation != self.generation(collection):
+            return
+        self._entries[key] = (time.monotonic() + self.ttls[collection], value)
+        self._entries.move_to_end(key)
+        self._keys_by_collection.setdefault(collection, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def invalidate(self, collection: str):
+        """Drop all entries for a collection."""
+        self._generations[collection] = self.generation(collection) + 1
+        keys = self._keys_by_collection.pop(collection, set())
+        for key in keys:
+            self._entries.pop(key, None)
+        if keys:
+            self.invalidations += 1
+
+    def _evict(self, key: tuple):
+        self._entries.pop(key, None)
+        keys = self._keys_by_collection.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "invalidations": self.invalidations,
+        }
+
+
+class _Flight:
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 1
+
+
+class SingleFlight:
+    """Collapse concurrent identical reads into one in-flight call.
+
+    The first caller for a key starts the fetch; callers arriving while it is
+    still running await the same task instead of issuing their own RPC. The
+    key is forgotten once the fetch completes, so this never serves results
+    after the fact; that is QueryCache's job. A caller being cancelled does
+    not cancel the fetch for the others.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._flights: Dict[tuple, _Flight] = {}
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._flights
+
+    async def do(self, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return ``(result, shared)``; shared is True if other callers got the same object."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fetch()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _, f=flight: self._done(key, f))
+            self.leaders += 1
+        else:
+            flight.waiters += 1
+            self.coalesced += 1
+        result = await asyncio.shield(flight.task)
+        return result, flight.waiters > 1
+
+    def forget(self, collection: str):
+        """Make later reads of a written collection start a fresh fetch."""
+        for key in [key for key in self._flights if key[1] == collection]:
+            del self._flights[key]
+
+    def _done(self, key: tuple, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / calls, 3) if calls else None,
+        }
+
+
+class SnapshotListener:
+    """Handle for a snapshot listener attached by FirestoreClient.listen."""
+
+    def __init__(self, watch):
+        self._watch = watch
+
+    @property
+    def active(self) -> bool:
+        """False once the watch has stopped, e.g. closed by a non-retryable error."""
+        return bool(self._watch.is_active)
+
+    def unsubscribe(self):
+        self._watch.unsubscribe()
+
 
 class FirestoreClient:
-    """Wrapper for Google Cloud Firestore operations."""
+    """Wrapper for Google Cloud Firestore operations.
+
+    The google-cloud-firestore client is synchronous, so every round trip is
+    offloaded to a bounded thread pool instead of blocking the event loop.
+    Set FIRESTORE_BACKEND=memory or sqlite to run against the local stand-in
+    in shared/firestore_memory.py instead of Cloud Firestore. Every call is
+    recorded in shared/metrics.py (latency, billed documents, cost).
+
+    Concurrent identical reads (get_document, query_documents, aggregate)
+    share one RPC through SingleFlight; set FIRESTORE_SINGLE_FLIGHT=false
+    to turn this off. Every RPC is retried and time-bounded by a RetryPolicy
+    (shared/retry.py), so methods only report failure once transient errors
+    have outlasted the policy or the request's deadline budget.
+    """
 
-    def __init__(self, project_id: str = "moda-trader"):
-        """Initialize Firestore client."""
+    def __init__(self, project_id: str = "moda-trader", max_concurrency: Optional[int] = None,
+                 db: Optional[Any] = None, cache_ttls: Optional[Dict[str, float]] = None,
+                 cache_size: int = 1024, metrics: Optional[FirestoreMetrics] = None,
+                 single_flight: Optional[bool] = None,
+                 retry_policy: Optional[RetryPolicy] = None):
+        """Initialize Firestore client.
+
+        Pass ``cache_ttls`` ({collection: seconds}) to cache reads of those
+        collections; see QueryCache. ``retry_policy`` defaults to
+        RetryPolicy.from_env().
+        """
         self.project_id = project_id
-        self.db = firestore.Client(project=project_id)
-        logger.info("Firestore client initialized", project_id=project_id)
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("FIRESTORE_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        self.db = db if db is not None else self._create_db(project_id)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix="firestore")
+        self.cache = QueryCache(cache_ttls, cache_size) if cache_ttls else None
+        self.metrics = metrics if metrics is not None else firestore_metrics
+        if single_flight is None:
+            single_flight = os.getenv("FIRESTORE_SINGLE_FLIGHT", "true").lower() != "false"
+        self.flights = SingleFlight() if single_flight else None
+        self.retry = retry_policy if retry_policy is not None else RetryPolicy.from_env()
+        logger.info("Firestore client initialized", project_id=project_id,
+                    max_concurrency=self.max_concurrency)
+
+    @staticmethod
+    def _create_db(project_id: str):
+        """Pick the storage backend from FIRESTORE_BACKEND (firestore, memory, sqlite)."""
+        backend = os.getenv("FIRESTORE_BACKEND", "firestore").lower()
+        if backend in ("memory", "sqlite"):
+            from .firestore_memory import MemoryFirestore
+            db = MemoryFirestore.from_env()
+            logger.info("Using local Firestore stand-in", backend=backend,
+                        path=db.path, latency_ms=db.latency * 1000,
+                        failure_rate=db.failure_rate)
+            return db
+        if backend != "firestore":
+            raise ValueError(f"Unknown FIRESTORE_BACKEND: {backend}")
+        return firestore.Client(project=project_id)
+
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking Firestore call on the client's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _call(self, collection: str, operation: str, func: Callable, *args,
+                    policy: Optional[RetryPolicy] = None, **kwargs) -> Any:
+        """Run a blocking Firestore RPC on the pool under the retry policy.
+
+        ``func`` is called with ``retry=None`` (the library's own retries are
+        replaced by the policy) and the attempt's ``timeout``.
+        """
+        async def attempt(timeout):
+            return await self._run(func, *args, retry=None, timeout=timeout, **kwargs)
+
+        with tracing.span(f"firestore {operation}", "firestore", start_trace=False,
+                          collection=collection):
+            return await (policy or self.retry).run(attempt, collection=collection,
+                                                    operation=operation)
+
+    def close(self):
+        """Release the worker threads."""
+        self._executor.shutdown(wait=False)
+
+    def _record(self, collection: str, operation: str, started: float, **counts) -> float:
+        """Record a call's latency and billed documents (reads/writes/deletes/error).
+
+        Returns the latency in milliseconds, for logging.
+        """
+        latency = time.perf_counter() - started
+        self.metrics.record(collection, operation, latency, **counts)
+        return round(latency * 1000, 1)
+
+    def _invalidate(self, collection: str):
+        if self.cache is not None:
+            self.cache.invalidate(collection)
+        if self.flights is not None:
+            self.flights.forget(collection)
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Hit/miss counters for the read cache, if enabled."""
+        return self.cache.stats() if self.cache is not None else None
+
+    def single_flight_stats(self) -> Optional[Dict[str, Any]]:
+        """Leader/coalesced counters for in-flight read sharing, if enabled."""
+        return self.flights.stats() if self.flights is not None else None
+
+    async def _read_once(self, key: tuple, operation: str,
+                         fetch: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run a read through SingleFlight; returns ``(result, shared)``."""
+        if self.flights is None:
+            return await fetch(), False
+        if key in self.flights:
+            self.metrics.record_coalesced(key[1], operation)
+        return await self.flights.do(key, fetch)
 
     async def create_document(self, collection: str, document_id: str, data: Dict[str, Any]) -> bool:
         """Create a new document in the specified collection."""
+        started = time.perf_counter()
         try:
             doc_ref = self.db.collection(collection).document(document_id)
-            doc_ref.set(data)
+            await self._call(collection, "create", doc_ref.set, data)
+            duration_ms = self._record(collection, "create", started, writes=1)
             logger.info("Document created", collection=collection,
-                        document_id=document_id)
+                        document_id=document_id, duration_ms=duration_ms)
             return True
         except Exception as e:
+            self._record(collection, "create", started, error=True)
             logger.error("Failed to create document", collection=collection,
                          document_id=document_id, error=str(e))
             return False
+        finally:
+            self._invalidate(collection)
 
     async def update_document(self, collection: str, document_id: str, data: Dict[str, Any]) -> bool:
         """Update an existing document."""
+        started = time.perf_counter()
         try:
             doc_ref = self.db.collection(collection).document(document_id)
-            doc_ref.update(data)
+            await self._call(collection, "update", doc_ref.update, data)
+            duration_ms = self._record(collection, "update", started, writes=1)
             logger.info("Document updated", collection=collection,
-                        document_id=document_id)
+                        document_id=document_id, duration_ms=duration_ms)
             return True
         except Exception as e:
+            self._record(collection, "update", started, error=True)
             logger.error("Failed to update document", collection=collection,
                          document_id=document_id, error=str(e))
             return False
+        finally:
+            self._invalidate(collection)
 
     async def upsert_document(self, collection: str, document_id: str, data: Dict[str, Any]) -> bool:
         """Create or update a document."""
+        started = time.perf_counter()
         try:
             doc_ref = self.db.collection(collection).document(document_id)
-            doc_ref.set(data, merge=True)
+            await self._call(collection, "upsert", doc_ref.set, data, merge=True)
+            duration_ms = self._record(collection, "upsert", started, writes=1)
             logger.info("Document upserted", collection=collection,
-                        document_id=document_id)
+                        document_id=document_id, duration_ms=duration_ms)
             return True
         except Exception as e:
+            self._record(collection, "upsert", started, error=True)
             logger.error("Failed to upsert document", collection=collection,
                          document_id=document_id, error=str(e))
             return False
+        finally:
+            self._invalidate(collection)
 
     async def get_document(self, collection: str, document_id: str) -> Optional[Dict[str, Any]]:
         """Get a document by ID."""
-        try:
-            doc_ref = self.db.collection(collection).document(document_id)
-            doc = doc_ref.get()
-            if doc.exists:
-                return doc.to_dict()
-            return None
-        except Exception as e:
-            logger.error("Failed to get document", collection=collection,
-                         document_id=document_id, error=str(e))
-            return None
+        cache = self.cache if self.cache is not None and self.cache.enabled_for(collection) else None
+        key = QueryCache.document_key(collection, document_id)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                self.metrics.record_cache_hit(collection, "get")
+                return dict(cached)
+
+        async def fetch() -> Optional[Dict[str, Any]]:
+            generation = cache.generation(collection) if cache is not None else None
+            started = time.perf_counter()
+            try:
+                doc_ref = self.db.collection(collection).document(document_id)
+                doc = await self._call(collection, "get", doc_ref.get)
+                self._record(collection, "get", started, reads=1)
+                if not doc.exists:
+                    return None
+                data = doc.to_dict()
+                if cache is not None:
+                    cache.set(key, data, generation)
+                return data
+            except Exception as e:
+                self._record(collection, "get", started, error=True)
+                logger.error("Failed to get document", collection=collection,
+                             document_id=document_id, error=str(e))
+                return None
+
+        data, shared = await self._read_once(key, "get", fetch)
+        if data is not None and (shared or cache is not None):
+            return dict(data)
+        return data
+
+    async def get_documents(self, collection: str, document_ids: List[str],
+                            chunk_size: int = GET_ALL_CHUNK_SIZE) -> List[Optional[Dict[str, Any]]]:
+        """Get many documents by ID in batched reads.
+
+        IDs are fetched with ``get_all`` in chunks that run in parallel. Results
+        come back in the order of ``document_ids``, with None for documents
+        that do not exist or could not be read.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        cache = self.cache if self.cache is not None and self.cache.enabled_for(collection) else None
+        pending = list(dict.fromkeys(document_ids))
+        if cache is not None:
+            generation = cache.generation(collection)
+            missing = []
+            for document_id in pending:
+                cached = cache.get(cache.document_key(collection, document_id))
+                if cached is not None:
+                    results[document_id] = dict(cached)
+                else:
+                    missing.append(document_id)
+            if len(missing) < len(pending):
+                self.metrics.record_cache_hit(collection, "get_all")
+            pending = missing
+
+        col_ref = self.db.collection(collection)
+
+        def _get_chunk(ids, **options):
+            refs = [col_ref.document(document_id) for document_id in ids]
+            return {doc.id: doc.to_dict() for doc in self.db.get_all(refs, **options) if doc.exists}
+
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        started = time.perf_counter()
+        fetched = await asyncio.gather(*[self._call(collection, "get_all", _get_chunk, chunk)
+                                         for chunk in chunks],
+                                       return_exceptions=True)
+        if chunks:
+            # Every requested document is billed as a read, found or not
+            failed = [chunk for chunk, found in zip(chunks, fetched) if isinstance(found, Exception)]
+            self._record(collection, "get_all", started,
+                         reads=len(pending) - sum(len(chunk) for chunk in failed),
+                         error=bool(failed))
+        for chunk, found in zip(chunks, fetched):
+            if isinstance(found, Exception):
+                logger.error("Failed to get documents", collection=collection,
+                             count=len(chunk), error=str(found))
+                continue
+            for document_id, data in found.items():
+                if cache is not None:
+                    cache.set(cache.document_key(collection, document_id), data, generation)
+                    data = dict(data)
+                results[document_id] = data
+
+        logger.info("Documents fetched", collection=collection,
+                    requested=len(document_ids), found=len(results), chunks=len(chunks))
+        return [results.get(document_id) for document_id in document_ids]
+
+    def _build_query(self, collection: str, filters: Optional[List[tuple]] = None,
+                     order_by: Optional[str] = None, limit: Optional[int] = None,
+                     descending: bool = False, select: Optional[List[str]] = None):
+        """Translate filter tuples, ordering and projection into a Firestore query."""
+        query = self.db.collection(collection)
+
+        if filters:
+            for field, operator, value in filters:
+                query = query.where(
+                    filter=FieldFilter(field, operator, value))
+
+        if order_by:
+            direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+            query = query.order_by(order_by, direction=direction)
+
+        if limit:
+            query = query.limit(limit)
+
+        if select is not None:
+            # Keep the order field so results can be merged and used as cursors
+            fields = list(select)
+            if order_by and order_by not in fields:
+                fields.append(order_by)
+            query = query.select(fields)
+
+        return query
+
+    @staticmethod
+    def _snapshot_to_dict(doc) -> Dict[str, Any]:
+        data = doc.to_dict()
+        data['id'] = doc.id
+        return data
 
     async def query_documents(self, collection: str, filters: Optional[List[tuple]] = None,
-                              order_by: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Query documents with optional filters."""
-        try:
-            query = self.db.collection(collection)
+                              order_by: Optional[str] = None, limit: Optional[int] = None,
+                              descending: bool = False,
+                              select: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Query documents with optional filters.
 
-            if filters:
-                for field, operator, value in filters:
-                    query = query.where(
-                        filter=FieldFilter(field, operator, value))
+        ``select`` limits the returned fields (plus ``id``) to a projection,
+        so unused fields never cross the wire or get deserialized.
+        """
+        cache = self.cache if self.cache is not None and self.cache.enabled_for(collection) else None
+        key = QueryCache.query_key(collection, filters, order_by, limit, descending, select)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                self.metrics.record_cache_hit(collection, "query")
+                # Callers mutate the returned dicts, so hand out copies
+                return [dict(doc) for doc in cached]
 
-            if order_by:
-                query = query.order_by(order_by)
+        async def fetch() -> List[Dict[str, Any]]:
+            generation = cache.generation(collection) if cache is not None else None
+            started = time.perf_counter()
+            try:
+                query = self._build_query(collection, filters, order_by, limit, descending, select)
 
-            if limit:
-                query = query.limit(limit)
+                def _stream(**options):
+                    # Iterating the stream issues the RPCs, so it stays on the pool
+                    return [self._snapshot_to_dict(doc) for doc in query.stream(**options)]
 
-            docs = query.stream()
-            results = []
-            for doc in docs:
-                data = doc.to_dict()
-                data['id'] = doc.id
-                results.append(data)
+                results = await self._call(collection, "query", _stream)
+                # A query is billed at least one read even when nothing matches
+                duration_ms = self._record(collection, "query", started,
+                                           reads=max(1, len(results)))
 
-            logger.info("Documents queried",
-                        collection=collection, count=len(results))
-            return results
-        except Exception as e:
-            logger.error("Failed to query documents",
-                         collection=collection, error=str(e))
+                logger.info("Documents queried", collection=collection,
+                            count=len(results), duration_ms=duration_ms)
+                if cache is not None:
+                    cache.set(key, results, generation)
+                return results
+            except Exception as e:
+                self._record(collection, "query", started, error=True)
+                logger.error("Failed to query documents",
+                             collection=collection, error=str(e))
+                return []
+
+        results, shared = await self._read_once(key, "query", fetch)
+        if shared or cache is not None:
+            return [dict(doc) for doc in results]
+        return results
+
+    async def query_documents_in(self, collection: str, field: str, values: List[Any],
+                                 filters: Optional[List[tuple]] = None,
+                                 order_by: Optional[str] = None, limit: Optional[int] = None,
+                                 descending: bool = False,
+                                 select: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Query documents whose ``field`` is any of ``values``.
+
+        Values are split into `in` clauses of IN_QUERY_CHUNK_SIZE, the chunk
+        queries run concurrently and their results are merged. With order_by
+        the merged list is re-sorted; limit applies to the merged result.
+        """
+        chunks = in_chunks(values)
+        if not chunks:
             return []
 
+        results = await asyncio.gather(*[
+            self.query_documents(collection,
+                                 filters=list(filters or []) + [(field, "in", chunk)],
+                                 order_by=order_by, limit=limit, descending=descending,
+                                 select=select)
+            for chunk in chunks
+        ])
+
+        merged = [doc for chunk_results in results for doc in chunk_results]
+        if order_by and len(chunks) > 1:
+            merged.sort(key=lambda doc: doc.get(order_by), reverse=descending)
+        if limit:
+            merged = merged[:limit]
+
+        logger.info("Documents queried by value list", collection=collection,
+                    field=field, chunks=len(chunks), count=len(merged))
+        return merged
+
+    async def aggregate(self, collection: str, filters: Optional[List[tuple]] = None,
+                        count: bool = False, sum_fields: Optional[List[str]] = None,
+                        avg_fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Compute count/sum/avg server-side instead of downloading documents.
+
+        Returns ``{"count": n, "sum_<field>": total, "avg_<field>": mean}`` for
+        the requested aggregations, or None on error. Sums skip documents
+        where the field is missing or not numeric; an average over no values
+        is None. Billed as one read per 1000 matched index entries.
+        """
+        spec = (("count", None, "count"),) if count else ()
+        # Aliases must be plain identifiers, so dotted paths use underscores
+        spec += tuple(("sum", field, "sum_" + field.replace(".", "_")) for field in sum_fields or [])
+        spec += tuple(("avg", field, "avg_" + field.replace(".", "_")) for field in avg_fields or [])
+        if not spec:
+            raise ValueError("No aggregation requested")
+
+        cache = self.cache if self.cache is not None and self.cache.enabled_for(collection) else None
+        key = QueryCache.aggregate_key(collection, filters, spec)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                self.metrics.record_cache_hit(collection, "aggregate")
+                return dict(cached)
+
+        async def fetch() -> Optional[Dict[str, Any]]:
+            generation = cache.generation(collection) if cache is not None else None
+            started = time.perf_counter()
+            try:
+                aggregation = self._build_query(collection, filters)
+                for kind, field, alias in spec:
+                    if kind == "count":
+                        aggregation = aggregation.count(alias=alias)
+                    else:
+                        aggregation = getattr(aggregation, kind)(field, alias=alias)
+
+                def _get(**options):
+                    return {result.alias: result.value
+                            for row in aggregation.get(**options) for result in row}
+
+                results = await self._call(collection, "aggregate", _get)
+                matched = results.get("count", 0) or 0
+                self._record(collection, "aggregate", started, reads=max(1, -(-matched // 1000)))
+
+                logger.info("Documents aggregated", collection=collection, results=results)
+                if cache is not None:
+                    cache.set(key, results, generation)
+                return results
+            except Exception as e:
+                self._record(collection, "aggregate", started, error=True)
+                logger.error("Failed to aggregate documents",
+                             collection=collection, error=str(e))
+                return None
+
+        results, _ = await self._read_once(key, "aggregate", fetch)
+        return dict(results) if results is not None else None
+
+    async def count_documents(self, collection: str,
+                              filters: Optional[List[tuple]] = None) -> Optional[int]:
+        """Count matching documents server-side; None on error."""
+        results = await self.aggregate(collection, filters, count=True)
+        return results["count"] if results is not None else None
+
+    async def stream_documents(self, collection: str, filters: Optional[List[tuple]] = None,
+                               order_by: Optional[str] = None,
+                               page_size: int = DEFAULT_PAGE_SIZE,
+                               select: Optional[List[str]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield query results one page at a time.
+
+        Pages are fetched with ``start_after`` cursors, so only a single page is
+        held in memory regardless of how many documents match. Unlike
+        query_documents, errors are logged and re-raised so a consumer never
+        mistakes a truncated scan for a complete one.
+        """
+        query = self._build_query(collection, filters, order_by, select=select)
+
+        def _fetch_page(cursor, **options):
+            page_query = query.limit(page_size)
+            if cursor is not None:
+                page_query = page_query.start_after(cursor)
+            snapshots = list(page_query.stream(**options))
+            last = snapshots[-1] if snapshots else None
+            return [self._snapshot_to_dict(doc) for doc in snapshots], last
+
+        cursor = None
+        pages = 0
+        count = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    page, cursor = await self._call(collection, "stream", _fetch_page, cursor)
+                except Exception:
+                    self._record(collection, "stream", started, error=True)
+                    raise
+                self._record(collection, "stream", started, reads=max(1, len(page)))
+                if not page:
+                    break
+                pages += 1
+                count += len(page)
+                yield page
+                if len(page) < page_size:
+                    break
+        except Exception as e:
+            logger.error("Failed to stream documents",
+                         collection=collection, pages=pages, error=str(e))
+            raise
+
+        logger.info("Documents streamed", collection=collection,
+                    pages=pages, count=count)
+
+    def listen(self, collection: str, filters: Optional[List[tuple]],
+               on_change: Callable[[List[Tuple[str, str, Optional[Dict[str, Any]]]]], None]
+               ) -> Optional[SnapshotListener]:
+        """Attach a snapshot listener to a query; returns a handle to it.
+
+        ``on_change`` is called on the listener's own thread with a list of
+        ``(change_type, document_id, data)`` tuples, change_type being ADDED,
+        MODIFIED or REMOVED (data is None for removals). The first call
+        delivers every matching document as ADDED. A watch that fails for
+        good stops without a further call, so callers should check the
+        handle's ``active``. Returns None when the backend has no listeners
+        (the local stand-in), so callers can poll.
+        """
+        query = self._build_query(collection, filters)
+        if not hasattr(query, "on_snapshot"):
+            return None
+
+        def _callback(snapshots, changes, read_time):
+            batch = []
+            for change in changes:
+                kind = change.type.name
+                data = None if kind == "REMOVED" else change.document.to_dict()
+                batch.append((kind, change.document.id, data))
+            # Listeners are billed one read per document added or modified
+            self._record(collection, "listen", time.perf_counter(),
+                         reads=sum(1 for kind, _, _ in batch if kind != "REMOVED"))
+            on_change(batch)
+
+        watch = query.on_snapshot(_callback)
+        logger.info("Snapshot listener attached", collection=collection)
+        return SnapshotListener(watch)
+
     async def delete_document(self, collection: str, document_id: str) -> bool:
         """Delete a document."""
+        started = time.perf_counter()
         try:
             doc_ref = self.db.collection(collection).document(document_id)
-            doc_ref.delete()
+            await self._call(collection, "delete", doc_ref.delete)
+            duration_ms = self._record(collection, "delete", started, deletes=1)
             logger.info("Document deleted", collection=collection,
-                        document_id=document_id)
+                        document_id=document_id, duration_ms=duration_ms)
             return True
         except Exception as e:
+            self._record(collection, "delete", started, error=True)
             logger.error("Failed to delete document", collection=collection,
                          document_id=document_id, error=str(e))
             return False
+        finally:
+            self._invalidate(collection)
+
+    async def update_in_transaction(self, collection: str, document_id: str,
+                                    update: Callable[[Optional[Dict[str, Any]]],
+                                                     Tuple[Optional[Dict[str, Any]], Any]]) -> Any:
+        """Atomically read a document, pass it to ``update`` and write what it returns.
+
+        ``update`` receives the document (None if it does not exist) and
+        returns ``(new_data, result)``; the document is replaced with
+        ``new_data`` unless that is None. Under contention ``update`` runs
+        again on fresh data, so it must not have side effects. Returns
+        ``result``, or None if the transaction failed.
+        """
+        started = time.perf_counter()
+        doc_ref = self.db.collection(collection).document(document_id)
+
+        def _transact(**options):
+            if hasattr(self.db, "read_modify_write"):  # local stand-in
+                return self.db.read_modify_write(doc_ref, update)
+
+            @firestore.transactional
+            def run(transaction):
+                snapshot = doc_ref.get(transaction=transaction, **options)
+                new_data, result = update(snapshot.to_dict() if snapshot.exists else None)
+                if new_data is not None:
+                    transaction.set(doc_ref, new_data)
+                return result
+
+            return run(self.db.transaction())
 
-    async def batch_write(self, operations: List[Dict[str, Any]]) -> bool:
-        """Perform batch write operations."""
         try:
-            batch = self.db.batch()
+            result = await self._call(collection, "transaction", _transact)
+            duration_ms = self._record(collection, "transaction", started, reads=1, writes=1)
+            logger.debug("Document transaction committed", collection=collection,
+                         document_id=document_id, duration_ms=duration_ms)
+            return result
+        except Exception as e:
+            self._record(collection, "transaction", started, error=True)
+            logger.error("Document transaction failed", collection=collection,
+                         document_id=document_id, error=str(e))
+            return None
+        finally:
+            self._invalidate(collection)
 
-            for op in operations:
-                collection = op['collection']
-                document_id = op['document_id']
-                data = op['data']
-                operation = op.get('operation', 'set')
+    def _commit_batch(self, operations: List[Dict[str, Any]], **options):
+        """Build and commit one WriteBatch (blocking, at most MAX_BATCH_SIZE ops).
 
-                doc_ref = self.db.collection(collection).document(document_id)
+        The batch is rebuilt on every attempt, so a retry resends all of it.
+        """
+        batch = self.db.batch()
+
+        for op in operations:
+            collection = op['collection']
+            document_id = op['document_id']
+            data = op.get('data')
+            operation = op.get('operation', 'set')
+
+            doc_ref = self.db.collection(collection).document(document_id)
 
-                if operation == 'set':
-                    batch.set(doc_ref, data)
-                elif operation == 'update':
-                    batch.update(doc_ref, data)
-                elif operation == 'delete':
-                    batch.delete(doc_ref)
+            if operation == 'set':
+                batch.set(doc_ref, data)
+            elif operation == 'upsert':
+                batch.set(doc_ref, data, merge=True)
+            elif operation == 'update':
+                batch.update(doc_ref, data)
+            elif operation == 'delete':
+                batch.delete(doc_ref)
 
-            batch.commit()
+        batch.commit(**options)
+
+    async def _commit_chunk(self, operations: List[Dict[str, Any]],
+                            policy: Optional[RetryPolicy] = None):
+        """Commit one chunk on the pool and invalidate the collections it touched."""
+        counts: Dict[str, Dict[str, int]] = {}
+        for op in operations:
+            kind = "deletes" if op.get('operation') == 'delete' else "writes"
+            per_collection = counts.setdefault(op['collection'], {"writes": 0, "deletes": 0})
+            per_collection[kind] += 1
+
+        started = time.perf_counter()
+        try:
+            await self._call(",".join(counts), "batch", self._commit_batch, operations,
+                             policy=policy)
+        except Exception:
+            for collection in counts:
+                self._record(collection, "batch", started, error=True)
+            raise
+        else:
+            for collection, billed in counts.items():
+                self._record(collection, "batch", started, **billed)
+        finally:
+            for collection in counts:
+                self._invalidate(collection)
+
+    async def commit_batch(self, operations: List[Dict[str, Any]]):
+        """Commit up to MAX_BATCH_SIZE operations atomically, raising on failure.
+
+        Unlike batch_write the error propagates, so callers that retry (the
+        write-behind queue) can tell transient failures from bad data.
+        """
+        if len(operations) > MAX_BATCH_SIZE:
+            raise ValueError(f"At most {MAX_BATCH_SIZE} operations per batch")
+        await self._commit_chunk(operations)
+
+    async def batch_write(self, operations: List[Dict[str, Any]]) -> bool:
+        """Perform batch write operations, chunked to Firestore's batch limit."""
+        try:
+            for start in range(0, len(operations), MAX_BATCH_SIZE):
+                await self._commit_chunk(operations[start:start + MAX_BATCH_SIZE])
             logger.info("Batch write completed",
                         operations_count=len(operations))
             return True
         except Exception as e:
             logger.error("Failed to perform batch write", error=str(e))
             return False
+
+    def bulk_writer(self, **kwargs) -> "BulkWriter":
+        """Create a BulkWriter that coalesces upserts into batched commits."""
+        return BulkWriter(self, **kwargs)
+
+
+class BulkWriter:
+    """Coalesces a stream of writes into chunked batch commits.
+
+    Writes are buffered and committed in chunks of up to 500 operations as the
+    buffer fills, with at most ``max_in_flight`` commits outstanding. A chunk
+    hitting a transient error is retried on its own under ``retry_policy``
+    (the client's by default), so one bad commit does not replay the chunks
+    that already landed.
+
+    Usage:
+        async with firestore_client.bulk_writer() as writer:
+            for price in prices:
+                await writer.upsert("di_prices_daily", doc_id, price.dict())
+    """
+
+    def __init__(self, client: FirestoreClient, batch_size: int = MAX_BATCH_SIZE,
+                 max_in_flight: int = 4, retry_policy: Optional[RetryPolicy] = None):
+        self.client = client
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.retry_policy = retry_policy
+        self.written = 0
+        self.failed = 0
+        self.flush_latencies: List[float] = []
+        self._buffer: List[Dict[str, Any]] = []
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "BulkWriter":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def upsert(self, collection: str, document_id: str, data: Dict[str, Any]):
+        """Queue a merge write of ``data`` into a document."""
+        await self.add({'collection': collection, 'document_id': document_id,
+                        'data': data, 'operation': 'upsert'})
+
+    async def delete(self, collection: str, document_id: str):
+        """Queue a document delete."""
+        await self.add({'collection': collection, 'document_id': document_id,
+                        'operation': 'delete'})
+
+    async def add(self, operation: Dict[str, Any]):
+        """Queue a raw batch_write-style operation."""
+        self._buffer.append(operation)
+        if len(self._buffer) >= self.batch_size:
+            await self._dispatch()
+
+    async def _dispatch(self):
+        chunk, self._buffer = self._buffer, []
+        # Waiting for a free slot applies backpressure to the producer
+        await self._in_flight.acquire()
+        task = asyncio.create_task(self._commit(chunk))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _commit(self, chunk: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        try:
+            await self.client._commit_chunk(chunk, policy=self.retry_policy)
+        except Exception as e:
+            self.failed += len(chunk)
+            logger.error("Bulk writer chunk failed",
+                         operations_count=len(chunk), error=str(e))
+            return
+        finally:
+            self._in_flight.release()
+
+        latency = time.perf_counter() - started
+        self.flush_latencies.append(latency)
+        self.written += len(chunk)
+        logger.info("Bulk writer chunk committed",
+                    operations_count=len(chunk),
+                    latency_ms=round(latency * 1000, 1))
+
+    async def flush(self) -> bool:
+        """Commit everything buffered and wait for outstanding chunks."""
+        if self._buffer:
+            await self._dispatch()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+        return self.failed == 0
+
+    async def close(self) -> bool:
+        """Flush remaining writes; returns False if any chunk was dropped."""
+        return await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """Summary of writes and per-flush commit latency."""
+        latencies = sorted(self.flush_latencies)
+        return {
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": len(latencies),
+            "flush_latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "flush_latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+        }
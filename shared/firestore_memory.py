@@ -0,0 +1,580 @@
+"""
+In-process stand-in for the google-cloud-firestore client.
+
+Implements the subset of the synchronous ``firestore.Client`` API that
+FirestoreClient uses (documents, batches, single-document transactions,
+filtered/ordered/limited queries and cursors) on top of an in-memory dict,
+optionally persisted to SQLite so several local service processes can share
+one database. A fixed latency and a rate of transient UNAVAILABLE errors can
+be injected per round trip to approximate a real Firestore RPC and exercise
+retries.
+
+Selected through FirestoreClient with:
+    FIRESTORE_BACKEND=memory          in-process dict, lost on exit
+    FIRESTORE_BACKEND=sqlite          shared SQLite file (FIRESTORE_SQLITE_PATH)
+    FIRESTORE_LATENCY_MS=20           injected per-RPC latency
+    FIRESTORE_FAILURE_RATE=0.05       fraction of RPCs failing with UNAVAILABLE
+
+Values are stored the way Firestore returns them: naive datetimes come back as
+UTC-aware and enums as their values. One deviation: Decimal values are stored
+as floats, where Firestore itself rejects them.
+"""
+
+import contextlib
+import copy
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1.base_aggregation import AggregationResult
+
+from . import serialization
+
+DEFAULT_SQLITE_PATH = "/tmp/moda-firestore.sqlite3"
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+
+# Values
+
+def _normalize(value: Any) -> Any:
+    """Copy a value the way Firestore would store it."""
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        # Firestore hands timestamps back as UTC-aware datetimes
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    return value
+
+
+def _type_rank(value: Any) -> int:
+    # Firestore's cross-type ordering: null < bool < number < timestamp
+    # < string < bytes < array < map
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, (bytes, bytearray)):
+        return 5
+    if isinstance(value, list):
+        return 6
+    return 7
+
+
+def _comparable(value: Any) -> Any:
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, list):
+        return [(_type_rank(v), _comparable(v)) for v in value]
+    if isinstance(value, dict):
+        return sorted((k, _type_rank(v), _comparable(v)) for k, v in value.items())
+    return value
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    return _type_rank(value), _comparable(value)
+
+
+_MISSING = object()
+
+
+def _get_field(data: Dict[str, Any], field_path: str) -> Any:
+    value: Any = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_field(data: Dict[str, Any], field_path: str, value: Any):
+    parts = field_path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    data[parts[-1]] = value
+
+
+def _merge(target: Dict[str, Any], source: Dict[str, Any]):
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def _matches(data: Dict[str, Any], field_path: str, op: str, expected: Any) -> bool:
+    actual = _get_field(data, field_path)
+    if actual is _MISSING:
+        return False
+
+    if op == "array-contains":
+        return isinstance(actual, list) and any(
+            _sort_key(v) == _sort_key(expected) for v in actual)
+    if op == "array-contains-any":
+        return isinstance(actual, list) and any(
+            _sort_key(v) == _sort_key(e) for v in actual for e in expected)
+    if op == "in":
+        return any(_sort_key(actual) == _sort_key(e) for e in expected)
+    if op == "not-in":
+        return actual is not None and all(_sort_key(actual) != _sort_key(e) for e in expected)
+
+    actual_key, expected_key = _sort_key(actual), _sort_key(expected)
+    if op == "==":
+        return actual_key == expected_key
+    if op == "!=":
+        return actual is not None and actual_key != expected_key
+    # Range filters only match values of the same type
+    if actual_key[0] != expected_key[0]:
+        return False
+    if op == "<":
+        return actual_key < expected_key
+    if op == "<=":
+        return actual_key <= expected_key
+    if op == ">":
+        return actual_key > expected_key
+    if op == ">=":
+        return actual_key >= expected_key
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+# Storage
+
+class _DictStore:
+    """Process-local document storage."""
+
+    def __init__(self):
+        self._collections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def get(self, collection: str, document_id: str) -> Optional[Dict[str, Any]]:
+        return self._collections.get(collection, {}).get(document_id)
+
+    def put(self, collection: str, document_id: str, data: Dict[str, Any]):
+        self._collections.setdefault(collection, {})[document_id] = data
+
+    def delete(self, collection: str, document_id: str):
+        self._collections.get(collection, {}).pop(document_id, None)
+
+    def scan(self, collection: str) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        return list(self._collections.get(collection, {}).items())
+
+    def transaction(self):
+        return contextlib.nullcontext()
+
+
+class _SQLiteStore:
+    """Document storage in a SQLite file shared between local processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False,
+                                     isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (collection, id))")
+
+    def get(self, collection: str, document_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT data FROM documents WHERE collection = ? AND id = ?",
+            (collection, document_id)).fetchone()
+        return serialization.loads(row[0]) if row else None
+
+    def put(self, collection: str, document_id: str, data: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)",
+            (collection, document_id, serialization.dumps(data)))
+
+    def delete(self, collection: str, document_id: str):
+        self._conn.execute(
+            "DELETE FROM documents WHERE collection = ? AND id = ?",
+            (collection, document_id))
+
+    def scan(self, collection: str) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        rows = self._conn.execute(
+            "SELECT id, data FROM documents WHERE collection = ?", (collection,))
+        return [(doc_id, serialization.loads(data)) for doc_id, data in rows]
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # IMMEDIATE takes the write lock up front so concurrent processes
+        # serialise their commits instead of failing mid-batch
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+
+# Client API
+
+class MemoryDocumentSnapshot:
+    """Mirror of firestore DocumentSnapshot."""
+
+    def __init__(self, reference: "MemoryDocumentReference", data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class MemoryDocumentReference:
+    """Mirror of firestore DocumentReference."""
+
+    def __init__(self, client: "MemoryFirestore", collection: str, document_id: str):
+        self._client = client
+        self.collection_name = collection
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self.collection_name}/{self.id}"
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False, **kwargs):
+        self._client._rpc()
+        self._client._apply([("set", self, document_data, merge)])
+
+    def update(self, field_updates: Dict[str, Any], **kwargs):
+        self._client._rpc()
+        self._client._apply([("update", self, field_updates, False)])
+
+    def delete(self, **kwargs):
+        self._client._rpc()
+        self._client._apply([("delete", self, None, False)])
+
+    def get(self, field_paths: Optional[Iterable[str]] = None, **kwargs) -> MemoryDocumentSnapshot:
+        self._client._rpc()
+        return self._client._snapshot(self, field_paths)
+
+
+class MemoryQuery:
+    """Mirror of firestore Query / CollectionReference (immutable builder)."""
+
+    def __init__(self, client: "MemoryFirestore", collection: str, filters=(), orders=(),
+                 limit: Optional[int] = None, cursor=None, projection=None):
+        self._client = client
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._cursor = cursor
+        self._projection = projection
+
+    def _copy(self, **changes) -> "MemoryQuery":
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                     cursor=self._cursor, projection=self._projection)
+        state.update(changes)
+        return MemoryQuery(self._client, self._collection, **state)
+
+    def document(self, document_id: str) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._collection, document_id)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, *, filter=None) -> "MemoryQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if not isinstance(op_string, str):
+            # FieldFilter stores "== None" as a unary IS_NULL operator
+            op_string, value = "==", None
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "MemoryQuery":
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields_or_snapshot) -> "MemoryQuery":
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def select(self, field_paths: Iterable[str]) -> "MemoryQuery":
+        return self._copy(projection=list(field_paths))
+
+    def count(self, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self).count(alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self).sum(field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return MemoryAggregationQuery(self).avg(field_ref, alias)
+
+    def _sorted_matches(self) -> List[Tuple[str, Dict[str, Any]]]:
+        docs = [
+            (doc_id, data) for doc_id, data in self._client._store.scan(self._collection)
+            if all(_matches(data, f, op, v) for f, op, v in self._filters)
+        ]
+        # Ordering on a field drops documents that do not have it
+        for field_path, _ in self._orders:
+            docs = [(i, d) for i, d in docs if _get_field(d, field_path) is not _MISSING]
+
+        docs.sort(key=lambda item: item[0])
+        for field_path, direction in reversed(self._orders):
+            docs.sort(key=lambda item: _sort_key(_get_field(item[1], field_path)),
+                      reverse=direction == DESCENDING)
+        return docs
+
+    def _after_cursor(self, docs: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, Dict[str, Any]]]:
+        cursor = self._cursor
+        cursor_id = None
+        if isinstance(cursor, MemoryDocumentSnapshot):
+            for index, (doc_id, _) in enumerate(docs):
+                if doc_id == cursor.id:
+                    return docs[index + 1:]
+            # Cursor document no longer matches (e.g. deleted mid-scan):
+            # position by its field values, then by ID like Firestore does
+            cursor_id = cursor.id
+            cursor = cursor.to_dict() or {}
+        fields = [f for f, _ in self._orders]
+        if not fields and cursor_id is None:
+            return docs
+        target = tuple(_sort_key(cursor.get(f)) for f in fields)
+        descending = bool(fields) and self._orders[0][1] == DESCENDING
+
+        def after(doc_id, data):
+            key = tuple(_sort_key(_get_field(data, f)) for f in fields)
+            if key != target:
+                return key < target if descending else key > target
+            return cursor_id is not None and doc_id > cursor_id
+
+        return [(i, d) for i, d in docs if after(i, d)]
+
+    def _results(self) -> List[MemoryDocumentSnapshot]:
+        with self._client._lock:
+            docs = self._sorted_matches()
+        if self._cursor is not None:
+            docs = self._after_cursor(docs)
+        if self._limit is not None:
+            docs = docs[:self._limit]
+
+        snapshots = []
+        for doc_id, data in docs:
+            if self._projection is not None:
+                projected: Dict[str, Any] = {}
+                for field_path in self._projection:
+                    value = _get_field(data, field_path)
+                    if value is not _MISSING:
+                        _set_field(projected, field_path, value)
+                data = projected
+            ref = MemoryDocumentReference(self._client, self._collection, doc_id)
+            snapshots.append(MemoryDocumentSnapshot(ref, data))
+        return snapshots
+
+    def stream(self, **kwargs) -> Iterator[MemoryDocumentSnapshot]:
+        self._client._rpc()
+        return iter(self._results())
+
+    def get(self, **kwargs) -> List[MemoryDocumentSnapshot]:
+        return list(self.stream())
+
+
+class MemoryAggregationQuery:
+    """Mirror of firestore AggregationQuery: count/sum/avg over a query's matches."""
+
+    def __init__(self, query: MemoryQuery):
+        self._query = query
+        self._aggregations: List[Tuple[str, Optional[str], str]] = []
+
+    def _add(self, kind: str, field_path: Optional[str], alias: Optional[str]):
+        self._aggregations.append(
+            (kind, field_path, alias or f"field_{len(self._aggregations) + 1}"))
+        return self
+
+    def count(self, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return self._add("count", None, alias)
+
+    def sum(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return self._add("sum", field_ref, alias)
+
+    def avg(self, field_ref: str, alias: Optional[str] = None) -> "MemoryAggregationQuery":
+        return self._add("avg", field_ref, alias)
+
+    def _value(self, kind: str, field_path: Optional[str], docs: List[Dict[str, Any]]):
+        if kind == "count":
+            return len(docs)
+        # Like Firestore, only numeric values take part (bools are not numbers)
+        values = [value for value in (_get_field(doc, field_path) for doc in docs)
+                  if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        if kind == "sum":
+            return sum(values) if all(isinstance(v, int) for v in values) else float(sum(values))
+        return sum(values) / len(values) if values else None
+
+    def stream(self, **kwargs) -> Iterator[List[AggregationResult]]:
+        self._query._client._rpc()
+        docs = [snapshot._data for snapshot in self._query._copy(projection=None)._results()]
+        yield [AggregationResult(alias, self._value(kind, field_path, docs))
+               for kind, field_path, alias in self._aggregations]
+
+    def get(self, **kwargs) -> List[List[AggregationResult]]:
+        return list(self.stream())
+
+
+class MemoryWriteBatch:
+    """Mirror of firestore WriteBatch; commits atomically."""
+
+    def __init__(self, client: "MemoryFirestore"):
+        self._client = client
+        self._writes: List[tuple] = []
+
+    def set(self, reference: MemoryDocumentReference, document_data: Dict[str, Any],
+            merge: bool = False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def update(self, reference: MemoryDocumentReference, field_updates: Dict[str, Any]):
+        self._writes.append(("update", reference, field_updates, False))
+
+    def delete(self, reference: MemoryDocumentReference):
+        self._writes.append(("delete", reference, None, False))
+
+    def commit(self, **kwargs):
+        self._client._rpc()
+        self._client._apply(self._writes)
+        self._writes = []
+
+
+class MemoryFirestore:
+    """Drop-in stand-in for ``firestore.Client`` backed by memory or SQLite."""
+
+    def __init__(self, path: Optional[str] = None, latency: float = 0.0,
+                 failure_rate: float = 0.0):
+        self.path = path
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._store = _SQLiteStore(path) if path else _DictStore()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_env(cls) -> "MemoryFirestore":
+        """Build from FIRESTORE_BACKEND / _SQLITE_PATH / _LATENCY_MS / _FAILURE_RATE."""
+        backend = os.getenv("FIRESTORE_BACKEND", "memory").lower()
+        path = None
+        if backend == "sqlite":
+            path = os.getenv("FIRESTORE_SQLITE_PATH", DEFAULT_SQLITE_PATH)
+        latency = float(os.getenv("FIRESTORE_LATENCY_MS", "0")) / 1000
+        failure_rate = float(os.getenv("FIRESTORE_FAILURE_RATE", "0"))
+        return cls(path=path, latency=latency, failure_rate=failure_rate)
+
+    def _rpc(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise exceptions.ServiceUnavailable("Injected failure")
+
+    def collection(self, name: str) -> MemoryQuery:
+        return MemoryQuery(self, name)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def read_modify_write(self, reference: MemoryDocumentReference,
+                          update: Callable[[Optional[Dict[str, Any]]], tuple]) -> Any:
+        """Single-document transaction, standing in for ``firestore.transactional``.
+
+        The store lock (and with SQLite, the database write lock) is held
+        from the read to the write, so concurrent callers are serialized
+        instead of retried.
+        """
+        self._rpc()
+        key = (reference.collection_name, reference.id)
+        with self._lock, self._store.transaction():
+            data = self._store.get(*key)
+            new_data, result = update(copy.deepcopy(data))
+            if new_data is not None:
+                self._store.put(*key, _normalize(new_data))
+        return result
+
+    def get_all(self, references: Iterable[MemoryDocumentReference],
+                field_paths: Optional[Iterable[str]] = None,
+                **kwargs) -> Iterator[MemoryDocumentSnapshot]:
+        self._rpc()
+        for reference in references:
+            yield self._snapshot(reference, field_paths)
+
+    def _snapshot(self, reference: MemoryDocumentReference,
+                  field_paths: Optional[Iterable[str]] = None) -> MemoryDocumentSnapshot:
+        with self._lock:
+            data = self._store.get(reference.collection_name, reference.id)
+        if data is not None and field_paths is not None:
+            projected: Dict[str, Any] = {}
+            for field_path in field_paths:
+                value = _get_field(data, field_path)
+                if value is not _MISSING:
+                    _set_field(projected, field_path, value)
+            data = projected
+        return MemoryDocumentSnapshot(reference, data)
+
+    def _apply(self, writes: List[tuple]):
+        """Apply set/update/delete writes atomically."""
+        with self._lock, self._store.transaction():
+            staged: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+
+            def current(ref):
+                key = (ref.collection_name, ref.id)
+                if key not in staged:
+                    staged[key] = self._store.get(*key)
+                return staged[key]
+
+            for kind, ref, data, merge in writes:
+                key = (ref.collection_name, ref.id)
+                if kind == "delete":
+                    staged[key] = None
+                elif kind == "set":
+                    existing = current(ref)
+                    if merge and existing is not None:
+                        merged = copy.deepcopy(existing)
+                        _merge(merged, _normalize(data))
+                        staged[key] = merged
+                    else:
+                        staged[key] = _normalize(data)
+                elif kind == "update":
+                    existing = current(ref)
+                    if existing is None:
+                        raise exceptions.NotFound(f"No document to update: {ref.path}")
+                    updated = copy.deepcopy(existing)
+                    for field_path, value in data.items():
+                        _set_field(updated, field_path, _normalize(value))
+                    staged[key] = updated
+
+            for (collection, document_id), data in staged.items():
+                if data is None:
+                    self._store.delete(collection, document_id)
+                else:
+                    self._store.put(collection, document_id, data)
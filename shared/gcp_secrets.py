@@ -1,23 +1,50 @@
 """
 Google Cloud Secret Manager client for secure API key management.
+
+Each process shares one Secret Manager client, created on first use, and one
+SecretCache. Services prefetch the secrets they need at startup with
+``await secret_cache.start([...])``; after that, key lookups are served from
+memory and a background task re-reads every cached secret each
+SECRET_CACHE_TTL_S seconds (default 300), so rotated keys are picked up
+without a restart. Secrets that could not be read at startup are retried by
+the same task every SECRET_RETRY_S seconds (default 30); until then lookups
+return None rather than calling Secret Manager on the event loop.
 """
 
+import asyncio
 import os
-from typing import Optional
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
 from google.cloud import secretmanager
 import structlog
 
 logger = structlog.get_logger()
 
+DEFAULT_PROJECT_ID = "moda-trader"
+
+_client: Optional[secretmanager.SecretManagerServiceClient] = None
+_client_lock = threading.Lock()
+
+
+def secret_manager_client() -> secretmanager.SecretManagerServiceClient:
+    """The process-wide Secret Manager client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = secretmanager.SecretManagerServiceClient()
+                logger.info("Secret Manager client initialized")
+    return _client
+
 
 class GCPSecrets:
     """Client for Google Cloud Secret Manager."""
 
-    def __init__(self, project_id: str = "moda-trader"):
+    def __init__(self, project_id: str = DEFAULT_PROJECT_ID):
         """Initialize Secret Manager client."""
         self.project_id = project_id
-        self.client = secretmanager.SecretManagerServiceClient()
-        logger.info("Secret Manager client initialized", project_id=project_id)
+        self.client = secret_manager_client()
 
     def get_secret(self, secret_name: str, version: str = "latest") -> Optional[str]:
         """Retrieve a secret value."""
@@ -91,26 +118,146 @@ class GCPSecrets:
             return False
 
 
-# Convenience functions for common API keys
+class SecretCache:
+    """Process-wide cache of secret values with background refresh.
+
+    A cached value is served until a refresh succeeds; a failed refresh keeps
+    the last good value. Without the refresh task (e.g. in scripts), a
+    lookup that is missing or older than ``ttl`` reads the secret inline
+    instead; with it, lookups never block on Secret Manager.
+    """
+
+    def __init__(self, project_id: str = DEFAULT_PROJECT_ID, ttl: Optional[float] = None,
+                 retry_interval: Optional[float] = None):
+        self.project_id = project_id
+        self.ttl = ttl if ttl is not None else float(os.getenv("SECRET_CACHE_TTL_S", "300"))
+        self.retry_interval = retry_interval if retry_interval is not None else float(
+            os.getenv("SECRET_RETRY_S", "30"))
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self._names: Set[str] = set()
+        self._values: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._refresher: Optional[asyncio.Task] = None
+
+    def _fetch(self, secret_name: str) -> Optional[str]:
+        self.fetches += 1
+        value = GCPSecrets(self.project_id).get_secret(secret_name)
+        if value is not None:
+            with self._lock:
+                self._values[secret_name] = (value, time.monotonic())
+        return value
+
+    def get(self, secret_name: str) -> Optional[str]:
+        """Cached secret value, fetched on first use."""
+        cached = self._values.get(secret_name)
+        if cached is not None:
+            value, fetched_at = cached
+            if self._refresher is not None or time.monotonic() - fetched_at < self.ttl:
+                self.hits += 1
+                return value
+            # Stale and nobody is refreshing it: re-read, or keep the old value
+            return self._fetch(secret_name) or value
+        if self._refresher is not None:
+            # Not found at startup; the refresher retries it off the event loop
+            self.misses += 1
+            return None
+        return self._fetch(secret_name)
+
+    async def prefetch(self, secret_names: Iterable[str]) -> Dict[str, bool]:
+        """Fetch secrets concurrently; returns which ones were found."""
+        names = list(secret_names)
+        loop = asyncio.get_running_loop()
+        values = await asyncio.gather(
+            *[loop.run_in_executor(None, self._fetch, name) for name in names])
+        return {name: value is not None for name, value in zip(names, values)}
+
+    async def start(self, secret_names: Iterable[str] = ()) -> Dict[str, bool]:
+        """Prefetch a service's secrets and start refreshing the cache."""
+        names = list(secret_names)
+        self._names.update(names)
+        try:
+            found = await self.prefetch(names)
+        except Exception as e:
+            # e.g. no credentials for the client; the refresher keeps retrying
+            logger.error("Secret prefetch failed", secrets=names, error=str(e))
+            found = {name: False for name in names}
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_forever())
+        logger.info("Secret cache started", secrets=found, ttl_s=self.ttl)
+        return found
+
+    async def stop(self):
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    def _missing(self) -> Set[str]:
+        return self._names.difference(self._values)
+
+    async def _refresh_forever(self):
+        refreshed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(min(self.ttl, self.retry_interval) if self._missing() else self.ttl)
+            try:
+                if time.monotonic() - refreshed_at >= self.ttl:
+                    await self.prefetch(self._names.union(self._values))
+                    refreshed_at = time.monotonic()
+                elif self._missing():
+                    await self.prefetch(self._missing())
+            except Exception as e:
+                logger.error("Secret cache refresh failed", error=str(e))
+
+    def stats(self) -> Dict[str, object]:
+        return {"cached": len(self._values), "missing": sorted(self._missing()),
+                "hits": self.hits, "misses": self.misses, "fetches": self.fetches,
+                "refreshing": self._refresher is not None}
+
+
+secret_cache = SecretCache()
+
+# Secret Manager name of each provider's API key -> environment override
+API_KEY_SECRETS = {
+    "alphavantage-api-key": "ALPHAVANTAGE_API_KEY",
+    "finnhub-api-key": "FINNHUB_API_KEY",
+    "polygon-api-key": "POLYGON_API_KEY",
+    "tiingo-api-key": "TIINGO_API_KEY",
+}
+
+
+def get_api_key(secret_name: str) -> Optional[str]:
+    """Provider API key, from its environment variable or the secret cache."""
+    return os.getenv(API_KEY_SECRETS[secret_name]) or secret_cache.get(secret_name)
+
+
+async def start_secret_cache(*secret_names: str) -> Dict[str, bool]:
+    """Prefetch a service's API keys (except env overrides) and start refreshing."""
+    return await secret_cache.start(
+        [name for name in secret_names if not os.getenv(API_KEY_SECRETS[name])])
+
+
+# Convenience functions for common API keys. An environment variable of the
+# same name (e.g. POLYGON_API_KEY) takes precedence, for local runs without GCP.
 def get_alphavantage_key() -> Optional[str]:
     """Get Alpha Vantage API key."""
-    secrets = GCPSecrets()
-    return secrets.get_secret("alphavantage-api-key")
+    return get_api_key("alphavantage-api-key")
 
 
 def get_finnhub_key() -> Optional[str]:
     """Get Finnhub API key."""
-    secrets = GCPSecrets()
-    return secrets.get_secret("finnhub-api-key")
+    return get_api_key("finnhub-api-key")
 
 
 def get_polygon_key() -> Optional[str]:
     """Get Polygon.io API key."""
-    secrets = GCPSecrets()
-    return secrets.get_secret("polygon-api-key")
+    return get_api_key("polygon-api-key")
 
 
 def get_tiingo_key() -> Optional[str]:
     """Get Tiingo API key."""
-    secrets = GCPSecrets()
-    return secrets.get_secret("tiingo-api-key")
+    return get_api_key("tiingo-api-key")
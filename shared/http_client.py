@@ -0,0 +1,135 @@
+"""
+Process-wide pooled HTTP clients for calls to external APIs.
+
+Each base URL (one per provider) gets one ``httpx.AsyncClient`` for the life
+of the process, so requests reuse kept-alive connections instead of paying a
+TCP and TLS handshake per background task. Services open the pool at startup
+with ``await http_clients.start(BASE_URL)`` and close it at shutdown; clients
+are also created on first use.
+
+Limits apply per base URL and are read from the environment:
+
+    HTTP_MAX_CONNECTIONS     connections open at once (default 20)
+    HTTP_MAX_KEEPALIVE       idle connections kept open (default 10)
+    HTTP_KEEPALIVE_EXPIRY    seconds an idle connection is kept (default 30)
+    HTTP_TIMEOUT             request timeout in seconds (default 30)
+    HTTP2                    on, off or auto (default): HTTP/2 is offered when
+                             the h2 package is installed; servers without it
+                             answer over HTTP/1.1
+
+Requests go through TracingTransport, so they are still recorded as client
+spans. Pool utilization per base URL is reported by ``http_clients.stats()``.
+"""
+
+import asyncio
+import importlib.util
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+import structlog
+
+from .tracing import TracingTransport
+
+logger = structlog.get_logger(__name__)
+
+
+def _http2_default() -> bool:
+    setting = os.getenv("HTTP2", "auto").lower()
+    if setting not in ("on", "off", "auto"):
+        raise ValueError(f"Unknown HTTP2 setting: {setting}")
+    available = importlib.util.find_spec("h2") is not None
+    if setting == "on" and not available:
+        logger.warning("HTTP2=on but the h2 package is not installed; using HTTP/1.1")
+    return available and setting != "off"
+
+
+class _PoolTransport(httpx.AsyncHTTPTransport):
+    """AsyncHTTPTransport that counts requests and failures."""
+
+    def __init__(self, limits: httpx.Limits, **kwargs):
+        super().__init__(limits=limits, **kwargs)
+        self.max_connections = limits.max_connections
+        self.requests = 0
+        self.errors = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            self.errors += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        pool = self._pool
+        connections = list(pool.connections)
+        active = sum(1 for connection in connections if not connection.is_idle())
+        queued = sum(1 for request in getattr(pool, "_requests", ()) if request.is_queued())
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "connections": len(connections),
+            "active": active,
+            "idle": len(connections) - active,
+            "queued": queued,
+            "max_connections": self.max_connections,
+            "utilization": round(active / self.max_connections, 3),
+        }
+
+
+class HTTPClientPool:
+    """One long-lived, pooled httpx client per base URL."""
+
+    def __init__(self, max_connections: Optional[int] = None,
+                 max_keepalive: Optional[int] = None,
+                 keepalive_expiry: Optional[float] = None,
+                 timeout: Optional[float] = None, http2: Optional[bool] = None):
+        self.limits = httpx.Limits(
+            max_connections=max_connections or int(os.getenv("HTTP_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=max_keepalive or int(os.getenv("HTTP_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=keepalive_expiry or float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+        )
+        self.timeout = timeout or float(os.getenv("HTTP_TIMEOUT", "30"))
+        self._http2 = http2
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, _PoolTransport] = {}
+
+    @property
+    def http2(self) -> bool:
+        if self._http2 is None:
+            self._http2 = _http2_default()
+        return self._http2
+
+    def client(self, base_url: str) -> httpx.AsyncClient:
+        """The shared client for ``base_url``, created on first use; requests use full URLs."""
+        base_url = base_url.rstrip("/")
+        client = self._clients.get(base_url)
+        if client is None or client.is_closed:
+            transport = _PoolTransport(limits=self.limits, http2=self.http2)
+            client = httpx.AsyncClient(timeout=self.timeout, transport=TracingTransport(transport))
+            self._clients[base_url] = client
+            self._transports[base_url] = transport
+            logger.info("HTTP client pool opened", base_url=base_url, http2=self.http2,
+                        max_connections=self.limits.max_connections)
+        return client
+
+    async def start(self, *base_urls: str):
+        """Create the clients for ``base_urls`` up front."""
+        for base_url in base_urls:
+            self.client(base_url)
+
+    async def close(self):
+        """Close every client and its connections."""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._transports.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"http2": self.http2,
+                "pools": {base_url: transport.stats()
+                          for base_url, transport in self._transports.items()}}
+
+
+http_clients = HTTPClientPool()
@@ -0,0 +1,257 @@
+"""
+Live in-memory views of small Firestore collections.
+
+A LiveCollection mirrors the documents matching a query and keeps them current
+through a Firestore snapshot listener, so hot reads such as "the active
+position for AAPL" become dictionary lookups with no Firestore reads or
+latency. After the initial snapshot, Firestore bills one read per document
+added or changed, instead of one per document on every poll.
+
+The local stand-in has no listeners, so there the view re-reads the query
+every LIVE_VIEW_POLL_INTERVAL seconds (default 5) instead. The listener is
+checked at the same interval; if its watch has stopped (Firestore closes it
+on a non-retryable error without a further snapshot), the view stops
+serving and falls back to polling. With LIVE_VIEW_MAX_AGE set, a view whose
+last update is older than that many seconds also reports not ready, so
+callers read Firestore rather than a stale mirror.
+
+Views are eventually consistent: a write becomes visible a few hundred
+milliseconds later (or one poll interval later when polling). Read-modify-write code
+should keep reading Firestore directly. On Cloud Run, listeners only make
+progress while the instance has CPU, so services relying on them should run
+with CPU always allocated.
+
+Usage:
+    positions = LiveCollection(firestore_client, "pf_positions_active",
+                               filters=[("status", "==", "active")])
+    await positions.start()
+    position = positions.get("AAPL")     # copy of the document, or None
+    await positions.stop()
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import structlog
+
+from .firestore_client import FirestoreClient, SnapshotListener
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_POLL_INTERVAL = float(os.getenv("LIVE_VIEW_POLL_INTERVAL", "5"))
+# Seconds without an update before a view stops serving; 0 disables. Quiet
+# collections get no listener updates, so keep this well above their write gap.
+DEFAULT_MAX_AGE = float(os.getenv("LIVE_VIEW_MAX_AGE", "0"))
+
+
+class LiveCollection:
+    """In-memory mirror of a query's documents, indexed by one field.
+
+    ``key`` is the field lookups go through (``symbol`` by default). Several
+    documents may share a key value; get() returns one of them and find()
+    returns all. ``retain`` is an optional predicate for documents that stop
+    being relevant without changing in Firestore (e.g. expired signals); they
+    are dropped from the view once it returns False.
+    """
+
+    def __init__(self, client: FirestoreClient, collection: str,
+                 filters: Optional[List[tuple]] = None, key: str = "symbol",
+                 retain: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 max_age: float = DEFAULT_MAX_AGE):
+        self.client = client
+        self.collection = collection
+        self.filters = filters
+        self.key = key
+        self.retain = retain
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self.mode: Optional[str] = None
+        self.updates = 0
+        self.last_update: Optional[float] = None
+
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._by_key: Dict[Any, Dict[str, Dict[str, Any]]] = {}
+        self._ready = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[SnapshotListener] = None
+        self._poller: Optional[asyncio.Task] = None
+
+    # Lifecycle
+
+    async def start(self, timeout: float = 10.0) -> bool:
+        """Load the initial snapshot and start tracking changes.
+
+        Returns whether the view is ready; if not, callers should read
+        Firestore until it is.
+        """
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._listener = self.client.listen(self.collection, self.filters,
+                                                self._on_snapshot)
+        except Exception as e:
+            logger.warning("Snapshot listener unavailable; polling instead",
+                           collection=self.collection, error=str(e))
+
+        if self._listener is not None:
+            self.mode = "listener"
+            self._poller = asyncio.create_task(self._watch_listener())
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Live view initial snapshot timed out",
+                               collection=self.collection, timeout_s=timeout)
+        else:
+            self.mode = "polling"
+            await self._poll()
+            self._poller = asyncio.create_task(self._poll_forever())
+
+        logger.info("Live view started", collection=self.collection,
+                    mode=self.mode, documents=len(self._docs), ready=self.ready)
+        return self.ready
+
+    async def stop(self):
+        self._detach()
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+        self._ready.clear()
+
+    @property
+    def ready(self) -> bool:
+        if not self._ready.is_set():
+            return False
+        return not self.max_age or time.monotonic() - self.last_update <= self.max_age
+
+    # Lookups (synchronous, O(1) per key)
+
+    def get(self, key_value: Any) -> Optional[Dict[str, Any]]:
+        """A document with ``key == key_value``, or None."""
+        for doc in self._matching(key_value):
+            return dict(doc)
+        return None
+
+    def find(self, key_value: Any) -> List[Dict[str, Any]]:
+        """All documents with ``key == key_value``."""
+        return [dict(doc) for doc in self._matching(key_value)]
+
+    def __contains__(self, key_value: Any) -> bool:
+        return self.get(key_value) is not None
+
+    def values(self) -> List[Dict[str, Any]]:
+        """Every document in the view."""
+        return [dict(doc) for doc in list(self._docs.values()) if self._keep(doc)]
+
+    def __len__(self) -> int:
+        return len(self.values()) if self.retain else len(self._docs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "ready": self.ready,
+            "documents": len(self._docs),
+            "keys": len(self._by_key),
+            "updates": self.updates,
+            "listener_active": self._listener.active if self._listener is not None else None,
+            "age_s": round(time.monotonic() - self.last_update, 1) if self.last_update else None,
+        }
+
+    def _matching(self, key_value: Any) -> List[Dict[str, Any]]:
+        docs = self._by_key.get(key_value)
+        if not docs:
+            return []
+        return [doc for doc in list(docs.values()) if self._keep(doc)]
+
+    def _keep(self, doc: Dict[str, Any]) -> bool:
+        if self.retain is None or self.retain(doc):
+            return True
+        self._remove(doc['id'])
+        return False
+
+    # Maintenance
+
+    def _on_snapshot(self, changes: List[Tuple[str, str, Optional[Dict[str, Any]]]]):
+        # Called on the listener thread; apply on the event loop
+        self._loop.call_soon_threadsafe(self._apply, changes)
+
+    def _apply(self, changes: List[Tuple[str, str, Optional[Dict[str, Any]]]]):
+        for kind, document_id, data in changes:
+            if kind == "REMOVED":
+                self._remove(document_id)
+            else:
+                self._put(document_id, data)
+        self._touch()
+
+    def _put(self, document_id: str, data: Dict[str, Any]):
+        self._remove(document_id)
+        doc = dict(data, id=document_id)
+        if self.retain is not None and not self.retain(doc):
+            return
+        self._docs[document_id] = doc
+        self._by_key.setdefault(doc.get(self.key), {})[document_id] = doc
+
+    def _remove(self, document_id: str):
+        doc = self._docs.pop(document_id, None)
+        if doc is None:
+            return
+        key_value = doc.get(self.key)
+        docs = self._by_key.get(key_value)
+        if docs is not None:
+            docs.pop(document_id, None)
+            if not docs:
+                del self._by_key[key_value]
+
+    def _touch(self):
+        self.updates += 1
+        self.last_update = time.monotonic()
+        self._ready.set()
+
+    async def _poll(self):
+        """Replace the view with a fresh read of the query."""
+        try:
+            fresh = [doc async for page in self.client.stream_documents(
+                self.collection, filters=self.filters) for doc in page]
+        except Exception as e:
+            # Keep serving the last good state rather than an empty view
+            logger.warning("Live view poll failed", collection=self.collection,
+                           error=str(e))
+            return
+        self._docs.clear()
+        self._by_key.clear()
+        for doc in fresh:
+            self._put(doc.pop('id'), doc)
+        self._touch()
+
+    def _detach(self):
+        if self._listener is not None:
+            try:
+                self._listener.unsubscribe()
+            except Exception as e:
+                logger.warning("Snapshot listener unsubscribe failed",
+                               collection=self.collection, error=str(e))
+            self._listener = None
+
+    async def _watch_listener(self):
+        """Fall back to polling once the listener's watch has stopped."""
+        while self._listener is not None and self._listener.active:
+            await asyncio.sleep(self.poll_interval)
+        if self._listener is None:
+            return
+        logger.warning("Snapshot listener stopped; polling instead",
+                       collection=self.collection)
+        self._detach()
+        self._ready.clear()
+        self.mode = "polling"
+        await self._poll()
+        await self._poll_forever()
+
+    async def _poll_forever(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self._poll()
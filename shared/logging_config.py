@@ -1,28 +1,377 @@
 """
 Structured logging configuration for all services.
+
+By default (LOG_PIPELINE=queue) nothing is rendered or written on the calling
+thread: structlog only builds the event dict, a QueueHandler puts the record
+on a bounded queue, and a QueueListener thread renders it to JSON (orjson
+when installed) and writes it to stdout.
+
+The queue holds LOG_QUEUE_SIZE records (default 10000). When it is full,
+new records are dropped instead of blocking the caller; warnings and errors
+may still use a reserve of a tenth of the queue, so they are only lost under
+sustained overload. Dropped records are counted per level, reported by the
+listener as a "Log records dropped" warning and exposed through
+log_pipeline_stats(). LOG_PIPELINE=sync renders and writes on the calling
+thread instead.
+
+High-frequency debug/info events are sampled per event name before any other
+processing (see DEFAULT_SAMPLING and LogSampler), and every
+LOG_SUMMARY_INTERVAL_S seconds (default 60) a "Log summary" event reports
+how often each sampled event occurred, with p50/p99 of its ``duration_ms``.
 """
 
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
 import os
+import queue
+import random
 import sys
+import threading
+import time
 import structlog
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _dumps(obj: Any, default=None, **kwargs) -> str:
+    """JSON serializer for JSONRenderer: orjson if available, else json."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, default=default, **kwargs)
+
+
+def _capture_exc_info(logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve ``exc_info=True`` now; the exception is gone by the time the listener runs."""
+    if event_dict.get("exc_info") is True:
+        event_dict["exc_info"] = sys.exc_info()
+    return event_dict
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and never formats on the calling thread."""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.reserve = max(1, self.capacity // 10)
+        super().__init__(queue.Queue(maxsize=self.capacity + self.reserve))
+        self.dropped: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # structlog records carry a fresh event dict that is rendered by the
+        # listener; only foreign (stdlib) messages are interpolated here, since
+        # their arguments may change before the listener gets to them
+        if not isinstance(record.msg, dict):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if record.levelno < logging.WARNING and self.queue.qsize() >= self.capacity:
+            self._count_drop(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._count_drop(record)
+
+    def _count_drop(self, record: logging.LogRecord):
+        with self._lock:
+            self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+
+    def total_dropped(self) -> int:
+        return sum(self.dropped.values())
+
+
+class _ReportingListener(logging.handlers.QueueListener):
+    """QueueListener that logs a warning whenever records have been dropped."""
+
+    def __init__(self, handler: logging.Handler, source: DroppingQueueHandler):
+        super().__init__(source.queue, handler, respect_handler_level=True)
+        self.source = source
+        self.reported = 0
+
+    def handle(self, record: logging.LogRecord):
+        dropped = self.source.total_dropped()
+        if dropped > self.reported:
+            super().handle(self._dropped_record(dropped - self.reported))
+            self.reported = dropped
+        super().handle(record)
+
+    def _dropped_record(self, count: int) -> logging.LogRecord:
+        # Shaped like a structlog record so it renders like the rest
+        warning = logging.LogRecord(__name__, logging.WARNING, __file__, 0, {
+            "event": "Log records dropped",
+            "dropped": count,
+            "dropped_total": dict(self.source.dropped),
+            "logger": __name__,
+            "level": "warning",
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+        }, None, None)
+        warning._logger = logging.getLogger(__name__)
+        warning._name = "warning"
+        return warning
+
+    def stop(self):
+        # The stop sentinel must get through even if the queue is full
+        while True:
+            try:
+                self.queue.put_nowait(self._sentinel)
+                break
+            except queue.Full:
+                try:
+                    self.source._count_drop(self.queue.get_nowait())
+                except queue.Empty:
+                    pass
+        self._thread.join()
+        self._thread = None
+
+
+# Sampling rules per event name: "1/N" logs every Nth occurrence, "N/s" at
+# most N per second, "all" disables sampling for the event. LOG_SAMPLING
+# adds or overrides rules ("Document upserted=1/1000,Documents queried=all");
+# LOG_SAMPLING=off turns sampling off.
+DEFAULT_SAMPLING = {
+    "Document created": "1/100",
+    "Document updated": "1/100",
+    "Document upserted": "1/100",
+    "Document deleted": "1/100",
+    "Documents queried": "20/s",
+    "Position size calculated": "10/s",
+}
+
+# Durations kept per event and summary window for the percentiles
+SUMMARY_RESERVOIR_SIZE = 1024
+
+
+def sampling_rules() -> Dict[str, str]:
+    """DEFAULT_SAMPLING merged with LOG_SAMPLING."""
+    configured = os.getenv("LOG_SAMPLING", "").strip()
+    if configured.lower() == "off":
+        return {}
+    rules = dict(DEFAULT_SAMPLING)
+    for item in filter(None, (part.strip() for part in configured.split(","))):
+        event, _, rule = item.rpartition("=")
+        rules[event.strip()] = rule.strip()
+    return {event: rule for event, rule in rules.items() if rule != "all"}
+
+
+class _EventWindow:
+    """Counts and sampled durations of one event within a summary window."""
+
+    def __init__(self):
+        self.count = 0
+        self.logged = 0
+        self.durations: List[float] = []
+        self.seen_durations = 0
+
+    def observe_duration(self, value: float):
+        # Reservoir sampling keeps the percentiles unbiased at bounded memory
+        self.seen_durations += 1
+        if len(self.durations) < SUMMARY_RESERVOIR_SIZE:
+            self.durations.append(value)
+        else:
+            slot = random.randrange(self.seen_durations)
+            if slot < SUMMARY_RESERVOIR_SIZE:
+                self.durations[slot] = value
+
+    def summary(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"count": self.count, "logged": self.logged}
+        if self.durations:
+            ordered = sorted(self.durations)
+            result["p50_ms"] = ordered[int(0.50 * (len(ordered) - 1))]
+            result["p99_ms"] = ordered[int(0.99 * (len(ordered) - 1))]
+        return result
+
+
+class LogSampler:
+    """structlog processor that samples high-frequency events by name.
+
+    Only debug and info events with a rule are sampled; warnings and errors
+    always pass. Logged samples carry ``sampled=<rule>``. Every occurrence,
+    logged or not, is counted for the periodic "Log summary" event.
+    """
+
+    def __init__(self, rules: Dict[str, str], summary_interval: float = 60.0):
+        self.rules = {event: self._parse(event, rule) for event, rule in rules.items()}
+        self.summary_interval = summary_interval
+        self._windows: Dict[str, _EventWindow] = {}
+        self._window_started = time.monotonic()
+        self._rate_windows: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _parse(event: str, rule: str) -> Tuple[str, int, str]:
+        try:
+            if rule.startswith("1/"):
+                return ("every", max(1, int(rule[2:])), rule)
+            if rule.endswith("/s"):
+                return ("rate", max(0, int(rule[:-2])), rule)
+        except ValueError:
+            pass
+        raise ValueError(f"Invalid log sampling rule for {event!r}: {rule!r}")
+
+    def __call__(self, logger, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        event = event_dict.get("event")
+        rule = self.rules.get(event) if method_name in ("debug", "info") else None
+        if rule is None:
+            return event_dict
 
+        kind, amount, text = rule
+        with self._lock:
+            window = self._windows.get(event)
+            if window is None:
+                window = self._windows[event] = _EventWindow()
+            window.count += 1
+            duration = event_dict.get("duration_ms")
+            if isinstance(duration, (int, float)):
+                window.observe_duration(duration)
 
-def setup_logging(service_name: str = "moda-trader", level: str = "INFO") -> None:
-    """Configure structured logging for the service."""
+            if kind == "every":
+                keep = window.count % amount == 1 or amount == 1
+            else:
+                second = int(time.monotonic())
+                started, logged = self._rate_windows.get(event, (second, 0))
+                if started != second:
+                    started, logged = second, 0
+                keep = logged < amount
+                self._rate_windows[event] = (started, logged + keep)
+            if keep:
+                window.logged += 1
 
-    # Configure structlog
+        if not keep:
+            raise structlog.DropEvent
+        event_dict["sampled"] = text
+        return event_dict
+
+    def start(self):
+        if self._thread is None and self.rules:
+            self._stop.clear()
+            # Run in a copy of the caller's context to keep the bound service fields
+            context = contextvars.copy_context()
+            self._thread = threading.Thread(target=context.run, args=(self._summarize_forever,),
+                                            name="log-summary", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the summary thread, emitting the last window's summary."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.emit_summary()
+
+    def emit_summary(self):
+        with self._lock:
+            windows, self._windows = self._windows, {}
+            elapsed = time.monotonic() - self._window_started
+            self._window_started = time.monotonic()
+        if windows:
+            structlog.get_logger(__name__).info(
+                "Log summary", window_s=round(elapsed, 1),
+                events={event: window.summary() for event, window in windows.items()})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            current = {event: window.summary() for event, window in self._windows.items()}
+        return {"rules": {event: rule[2] for event, rule in self.rules.items()},
+                "current_window": current}
+
+    def _summarize_forever(self):
+        while not self._stop.wait(self.summary_interval):
+            self.emit_summary()
+
+
+class _LogPipeline:
+    """The handler and listener installed on the root logger."""
+
+    def __init__(self, handler: logging.Handler, listener: Optional[_ReportingListener] = None):
+        self.handler = handler
+        self.listener = listener
+
+    def stats(self) -> Dict[str, Any]:
+        if self.listener is None:
+            return {"mode": "sync"}
+        return {
+            "mode": "queue",
+            "queued": self.handler.queue.qsize(),
+            "capacity": self.handler.capacity,
+            "dropped": dict(self.handler.dropped),
+        }
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+        logging.getLogger().removeHandler(self.handler)
+
+
+_pipeline: Optional[_LogPipeline] = None
+_sampler: Optional[LogSampler] = None
+
+
+def log_pipeline_stats() -> Optional[Dict[str, Any]]:
+    """Queue depth, dropped-record counts and sampling of the active log pipeline."""
+    if _pipeline is None:
+        return None
+    stats = _pipeline.stats()
+    if _sampler is not None:
+        stats["sampling"] = _sampler.stats()
+    return stats
+
+
+def shutdown_logging():
+    """Emit the last log summary, flush queued records and stop the threads."""
+    global _pipeline, _sampler
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler = None
+    if _pipeline is not None:
+        _pipeline.close()
+        _pipeline = None
+
+
+atexit.register(shutdown_logging)
+
+
+def setup_logging(service_name: str = "moda-trader", level: str = "INFO",
+                  pipeline: Optional[str] = None) -> None:
+    """Configure structured logging for the service.
+
+    ``pipeline`` is "queue" or "sync" and defaults to LOG_PIPELINE.
+    """
+    global _pipeline, _sampler
+    pipeline = (pipeline or os.getenv("LOG_PIPELINE", "queue")).lower()
+    if pipeline not in ("queue", "sync"):
+        raise ValueError(f"Unknown LOG_PIPELINE: {pipeline}")
+
+    shutdown_logging()
+    _sampler = LogSampler(sampling_rules(),
+                          summary_interval=float(os.getenv("LOG_SUMMARY_INTERVAL_S", "60")))
+
+    # Configure structlog. Only cheap processors run on the calling thread;
+    # rendering happens in the ProcessorFormatter below.
     structlog.configure(
         processors=[
             structlog.stdlib.filter_by_level,
+            _sampler,
+            structlog.contextvars.merge_contextvars,
             structlog.stdlib.add_logger_name,
             structlog.stdlib.add_log_level,
             structlog.stdlib.PositionalArgumentsFormatter(),
             structlog.processors.TimeStamper(fmt="iso"),
             structlog.processors.StackInfoRenderer(),
-            structlog.processors.format_exc_info,
-            structlog.processors.UnicodeDecoder(),
-            structlog.processors.JSONRenderer()
+            _capture_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
         ],
         context_class=dict,
         logger_factory=structlog.stdlib.LoggerFactory(),
@@ -30,19 +379,42 @@ def setup_logging(service_name: str = "moda-trader", level: str = "INFO") -> Non
         cache_logger_on_first_use=True,
     )
 
-    # Set up standard library logging
-    import logging
-    logging.basicConfig(
-        format="%(message)s",
-        stream=sys.stdout,
-        level=getattr(logging, level.upper())
+    formatter = structlog.stdlib.ProcessorFormatter(
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.format_exc_info,
+            structlog.processors.UnicodeDecoder(),
+            structlog.processors.JSONRenderer(serializer=_dumps),
+        ],
+        # Records from stdlib loggers (uvicorn, google libraries, ...)
+        foreign_pre_chain=[
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso"),
+        ],
     )
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+
+    # Set up standard library logging
+    if pipeline == "queue":
+        handler = DroppingQueueHandler(int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        listener = _ReportingListener(output, handler)
+        listener.start()
+        _pipeline = _LogPipeline(handler, listener)
+    else:
+        _pipeline = _LogPipeline(output)
+
+    root = logging.getLogger()
+    root.addHandler(_pipeline.handler)
+    root.setLevel(getattr(logging, level.upper()))
 
     # Add service context
     structlog.contextvars.bind_contextvars(
         service=service_name,
         environment=os.getenv("ENVIRONMENT", "development")
     )
+    _sampler.start()
 
 
 def get_logger(name: str = None) -> structlog.BoundLogger:
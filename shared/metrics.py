@@ -0,0 +1,312 @@
+"""
+In-process metrics for Firestore usage and per-request attribution.
+
+FirestoreClient records every call here: a latency histogram per
+(collection, operation), billed document reads/writes/deletes, and an
+estimated cost. While a request is being served, the same counts are also
+added to that request's Usage through a context variable, so the /metrics
+endpoint can show which routes drive reads and cost, e.g.
+
+    "POST /positions/update-values": {"count": 3, "reads_per_request": 21.0, ...}
+
+Prices per 100k operations default to Firestore's list prices and can be
+overridden with FIRESTORE_PRICE_PER_100K_READS / _WRITES / _DELETES.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from .logging_config import log_pipeline_stats
+from .tracing import tracing_stats
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+PRICE_PER_100K = {
+    "reads": float(os.getenv("FIRESTORE_PRICE_PER_100K_READS", "0.06")),
+    "writes": float(os.getenv("FIRESTORE_PRICE_PER_100K_WRITES", "0.18")),
+    "deletes": float(os.getenv("FIRESTORE_PRICE_PER_100K_DELETES", "0.02")),
+}
+
+
+class Histogram:
+    """Fixed-bucket latency histogram with approximate quantiles."""
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float):
+        index = len(self.bounds)
+        for i, bound in enumerate(self.bounds):
+            if value_ms <= bound:
+                index = i
+                break
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value_ms
+        self.max = max(self.max, value_ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.buckets):
+            cumulative += count
+            if cumulative >= target and count:
+                value = min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+                return round(value, 2)
+        return round(self.max, 2)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max, 2),
+        }
+
+
+class Usage:
+    """Billed Firestore document operations."""
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+
+    def add(self, reads: int = 0, writes: int = 0, deletes: int = 0):
+        self.reads += reads
+        self.writes += writes
+        self.deletes += deletes
+
+    def cost(self) -> float:
+        """Estimated cost in USD at PRICE_PER_100K."""
+        return (self.reads * PRICE_PER_100K["reads"]
+                + self.writes * PRICE_PER_100K["writes"]
+                + self.deletes * PRICE_PER_100K["deletes"]) / 100_000
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "reads": self.reads,
+            "writes": self.writes,
+            "deletes": self.deletes,
+            "estimated_cost_usd": round(self.cost(), 6),
+        }
+
+
+_request_usage: ContextVar[Optional[Usage]] = ContextVar("firestore_request_usage", default=None)
+
+
+def current_usage() -> Optional[Usage]:
+    """Usage of the request or job currently being served, if any."""
+    return _request_usage.get()
+
+
+class _OperationStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.usage = Usage()
+
+
+class FirestoreMetrics:
+    """Per-collection, per-operation Firestore call statistics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations: Dict[Tuple[str, str], _OperationStats] = {}
+        self.usage = Usage()
+
+    def _stats(self, collection: str, operation: str) -> _OperationStats:
+        key = (collection, operation)
+        stats = self._operations.get(key)
+        if stats is None:
+            stats = self._operations[key] = _OperationStats()
+        return stats
+
+    def record(self, collection: str, operation: str, seconds: float,
+               reads: int = 0, writes: int = 0, deletes: int = 0, error: bool = False):
+        """Record one Firestore call and bill it to the current request."""
+        with self._lock:
+            stats = self._stats(collection, operation)
+            stats.latency.observe(seconds * 1000)
+            stats.usage.add(reads, writes, deletes)
+            if error:
+                stats.errors += 1
+            self.usage.add(reads, writes, deletes)
+
+        usage = _request_usage.get()
+        if usage is not None:
+            usage.add(reads, writes, deletes)
+
+    def record_cache_hit(self, collection: str, operation: str):
+        with self._lock:
+            self._stats(collection, operation).cache_hits += 1
+
+    def record_coalesced(self, collection: str, operation: str):
+        """Record a read that joined an identical call already in flight."""
+        with self._lock:
+            self._stats(collection, operation).coalesced += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            collections: Dict[str, Dict[str, Any]] = {}
+            for (collection, operation), stats in sorted(self._operations.items()):
+                collections.setdefault(collection, {})[operation] = {
+                    **stats.latency.snapshot(),
+                    **stats.usage.snapshot(),
+                    "errors": stats.errors,
+                    "cache_hits": stats.cache_hits,
+                    "coalesced": stats.coalesced,
+                }
+            return {"totals": self.usage.snapshot(), "collections": collections}
+
+
+class _RouteStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.usage = Usage()
+
+
+class RequestMetrics:
+    """Per-route request latency and the Firestore usage each route caused."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, _RouteStats] = {}
+
+    def record(self, route: str, seconds: float, error: bool, usage: Usage):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = _RouteStats()
+            stats.latency.observe(seconds * 1000)
+            stats.usage.add(usage.reads, usage.writes, usage.deletes)
+            if error:
+                stats.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            routes = {}
+            for route, stats in sorted(self._routes.items()):
+                count = stats.latency.count
+                routes[route] = {
+                    **stats.latency.snapshot(),
+                    **stats.usage.snapshot(),
+                    "errors": stats.errors,
+                    "reads_per_request": round(stats.usage.reads / count, 2) if count else None,
+                    "writes_per_request": round(stats.usage.writes / count, 2) if count else None,
+                }
+            return routes
+
+
+# Process-wide registries shared by every FirestoreClient and the middleware
+firestore_metrics = FirestoreMetrics()
+request_metrics = RequestMetrics()
+
+
+@contextmanager
+def attribute(name: str) -> Iterator[Usage]:
+    """Attribute Firestore usage inside the block to ``name``.
+
+    Use this for scheduled jobs and other work that does not run under a
+    request, e.g. ``with attribute("job:daily_collection"): ...``.
+    """
+    usage = Usage()
+    token = _request_usage.set(usage)
+    started = time.perf_counter()
+    error = False
+    try:
+        yield usage
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _request_usage.reset(token)
+        request_metrics.record(name, time.perf_counter() - started, error, usage)
+
+
+class MetricsMiddleware:
+    """ASGI middleware that attributes Firestore usage to the matched route.
+
+    It wraps the whole ASGI call, so background tasks started by a request are
+    billed to that request's route. Latency is measured up to the end of the
+    response body.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        usage = Usage()
+        token = _request_usage.set(usage)
+        started = time.perf_counter()
+        response = {"status": 500, "elapsed": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                response["elapsed"] = time.perf_counter() - started
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_usage.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            elapsed = response["elapsed"]
+            if elapsed is None:
+                elapsed = time.perf_counter() - started
+            request_metrics.record(f"{scope['method']} {path}", elapsed,
+                                   response["status"] >= 500, usage)
+
+
+def install_metrics(app, service_name: str,
+                    client_getter: Optional[Callable[[], Any]] = None,
+                    path: str = "/metrics",
+                    extra: Optional[Dict[str, Callable[[], Any]]] = None) -> None:
+    """Add the attribution middleware and a JSON metrics endpoint to a FastAPI app.
+
+    ``client_getter`` returns the service's FirestoreClient (created at
+    startup), whose cache and single-flight statistics are included when
+    available, along with log pipeline and trace exporter counts. ``extra``
+    maps additional section names to callables returning their stats.
+    """
+    app.add_middleware(MetricsMiddleware)
+    started_at = time.time()
+
+    @app.get(path, include_in_schema=False)
+    async def metrics() -> Dict[str, Any]:
+        client = client_getter() if client_getter else None
+        return {
+            "service": service_name,
+            "uptime_s": round(time.time() - started_at, 1),
+            "firestore": firestore_metrics.snapshot(),
+            "requests": request_metrics.snapshot(),
+            "cache": client.cache_stats() if client is not None else None,
+            "single_flight": client.single_flight_stats() if client is not None else None,
+            "logging": log_pipeline_stats(),
+            "tracing": tracing_stats(),
+            **{name: source() for name, source in (extra or {}).items()},
+        }
@@ -2,10 +2,13 @@
 Shared data models and Pydantic schemas used across services.
 """
 
-from datetime import datetime
+import math
+import typing
+from array import array
+from datetime import datetime, timezone
 from decimal import Decimal
 from enum import Enum
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, FrozenSet
 from pydantic import BaseModel, Field, validator
 
 
@@ -33,12 +36,49 @@ class DataProvider(str, Enum):
     TIINGO = "tiingo"
 
 
+# Decimal-typed fields per model, for the trusted construction path
+_DECIMAL_FIELDS: Dict[type, FrozenSet[str]] = {}
+
+
+def _decimal_fields(model: type) -> FrozenSet[str]:
+    fields = _DECIMAL_FIELDS.get(model)
+    if fields is None:
+        fields = frozenset(
+            name for name, field in model.model_fields.items()
+            if field.annotation is Decimal or Decimal in typing.get_args(field.annotation)
+        )
+        _DECIMAL_FIELDS[model] = fields
+    return fields
+
+
 # Base Models
 class BaseDocument(BaseModel):
     """Base model for all Firestore documents."""
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+    @classmethod
+    def from_trusted(cls, data: Optional[Dict[str, Any]] = None, **fields):
+        """Build a model from values that were already validated, skipping validation.
+
+        For documents read back from Firestore or values computed from
+        validated models. The document ``id`` (and any other unknown key) is
+        dropped and stored floats are turned back into Decimal for Decimal
+        fields; nothing else is converted or checked.
+        """
+        values = dict(data or {}, **fields)
+        values.pop("id", None)
+        for name in _decimal_fields(cls):
+            value = values.get(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values[name] = Decimal(str(value))
+        return cls.model_construct(**values)
+
+    @classmethod
+    def from_documents(cls, rows: List[Dict[str, Any]]) -> list:
+        """from_trusted() for each document of a Firestore query result."""
+        return [cls.from_trusted(row) for row in rows]
+
 
 # Data Ingestion Models
 class PriceData(BaseDocument):
@@ -73,6 +113,159 @@ class IntradayPriceData(BaseDocument):
         }
 
 
+class BarBatch:
+    """Daily bars for one symbol and provider, held as parallel typed columns.
+
+    Provider parsers append raw values and validate the batch once, instead
+    of building and re-serializing a PriceData per bar. Columns are stdlib
+    ``array``s in the packed layout of ``di_prices_daily_columnar`` (see
+    shared/price_columns.py); ``adjusted_close`` is NaN when the provider
+    has none.
+    """
+
+    # Column name -> (array typecode, matching NumPy dtype)
+    COLUMN_TYPES = {
+        "dates": ("q", "<i8"),
+        "open_price": ("d", "<f8"),
+        "high_price": ("d", "<f8"),
+        "low_price": ("d", "<f8"),
+        "close_price": ("d", "<f8"),
+        "adjusted_close": ("d", "<f8"),
+        "volume": ("q", "<i8"),
+    }
+
+    def __init__(self, symbol: str, provider: DataProvider,
+                 columns: Optional[Dict[str, array]] = None):
+        self.symbol = symbol
+        self.provider = provider
+        self.columns = columns or {name: array(typecode)
+                                   for name, (typecode, _) in self.COLUMN_TYPES.items()}
+        self.validated = False
+
+    @property
+    def dtypes(self) -> Dict[str, str]:
+        return {name: dtype for name, (_, dtype) in self.COLUMN_TYPES.items()}
+
+    def __len__(self) -> int:
+        return len(self.columns["dates"])
+
+    def append(self, date: int, open_price: float, high_price: float, low_price: float,
+               close_price: float, volume: int, adjusted_close: Optional[float] = None):
+        """Add one bar; ``date`` is epoch seconds (UTC)."""
+        columns = self.columns
+        columns["dates"].append(date)
+        columns["open_price"].append(open_price)
+        columns["high_price"].append(high_price)
+        columns["low_price"].append(low_price)
+        columns["close_price"].append(close_price)
+        columns["adjusted_close"].append(math.nan if adjusted_close is None else adjusted_close)
+        columns["volume"].append(volume)
+        self.validated = False
+
+    def _arrays(self) -> Dict[str, Any]:
+        """Zero-copy NumPy views of the columns."""
+        import numpy as np
+        return {name: np.frombuffer(column, dtype=column.typecode)
+                for name, column in self.columns.items()}
+
+    def validate(self) -> int:
+        """Drop invalid bars, sort by date keeping the last bar per date.
+
+        Prices must be finite and positive, high at least low, and volume
+        non-negative. Returns the number of bars dropped.
+        """
+        import numpy as np
+        count = len(self)
+        if count:
+            arrays = self._arrays()
+            prices = np.stack([arrays[name] for name in
+                               ("open_price", "high_price", "low_price", "close_price")])
+            valid = (np.isfinite(prices).all(axis=0) & (prices > 0).all(axis=0)
+                     & (arrays["high_price"] >= arrays["low_price"])
+                     & (arrays["volume"] >= 0)
+                     & ~(arrays["adjusted_close"] <= 0))
+
+            # Stable sort on reversed order puts the last bar of each date first
+            order = np.flatnonzero(valid)[::-1]
+            order = order[np.argsort(arrays["dates"][order], kind="stable")]
+            keep = np.ones(len(order), dtype=bool)
+            keep[1:] = np.diff(arrays["dates"][order]) != 0
+            order = order[keep]
+
+            if len(order) != count or np.any(np.diff(order) < 0):
+                self.columns = {name: array(typecode, arrays[name][order].tobytes())
+                                for name, (typecode, _) in self.COLUMN_TYPES.items()}
+        self.validated = True
+        return count - len(self)
+
+    def years(self) -> Dict[int, "BarBatch"]:
+        """Split into one validated batch per calendar year (UTC)."""
+        if not self.validated:
+            self.validate()
+        by_year: Dict[int, BarBatch] = {}
+        dates = self.columns["dates"]
+        start = 0
+        while start < len(dates):
+            year = datetime.utcfromtimestamp(dates[start]).year
+            end = start
+            while end < len(dates) and datetime.utcfromtimestamp(dates[end]).year == year:
+                end += 1
+            part = BarBatch(self.symbol, self.provider,
+                            {name: column[start:end] for name, column in self.columns.items()})
+            part.validated = True
+            by_year[year] = part
+            start = end
+        return by_year
+
+    def document_ids(self) -> List[str]:
+        """``di_prices_daily`` document ids, ``{symbol}_{YYYY-MM-DD}``."""
+        return [f"{self.symbol}_{datetime.utcfromtimestamp(ts):%Y-%m-%d}"
+                for ts in self.columns["dates"]]
+
+    def to_documents(self) -> List[tuple]:
+        """``(document_id, data)`` write payloads for ``di_prices_daily``.
+
+        Fields are those of PriceData, with prices as floats (Firestore does
+        not store Decimals).
+        """
+        if not self.validated:
+            self.validate()
+        now = datetime.utcnow()
+        provider = self.provider.value
+        columns = self.columns
+        documents = []
+        for document_id, ts, o, h, low, c, adj, v in zip(
+                self.document_ids(), columns["dates"], columns["open_price"],
+                columns["high_price"], columns["low_price"], columns["close_price"],
+                columns["adjusted_close"], columns["volume"]):
+            documents.append((document_id, {
+                "symbol": self.symbol,
+                "date": datetime.fromtimestamp(ts, tz=timezone.utc),
+                "open_price": o,
+                "high_price": h,
+                "low_price": low,
+                "close_price": c,
+                "volume": v,
+                "adjusted_close": None if math.isnan(adj) else adj,
+                "provider": provider,
+                "created_at": now,
+                "updated_at": now,
+            }))
+        return documents
+
+    def to_frame(self):
+        """pandas DataFrame viewing the columns without copying them.
+
+        ``dates`` becomes a ``date`` column of datetime64[s]. The frame is
+        read-only and only valid while the batch is not appended to.
+        """
+        import pandas as pd
+        arrays = self._arrays()
+        frame = {"date": arrays.pop("dates").view("datetime64[s]")}
+        frame.update(arrays)
+        return pd.DataFrame(frame, copy=False)
+
+
 class FundamentalData(BaseDocument):
     """Company fundamental data model."""
     symbol: str
@@ -167,6 +360,7 @@ class Position(BaseDocument):
     symbol: str
     quantity: int
     average_cost: Decimal
+    cost_basis: Optional[Decimal] = None  # average_cost * quantity, kept for aggregation
     current_price: Optional[Decimal] = None
     market_value: Optional[Decimal] = None
     unrealized_pnl: Optional[Decimal] = None
@@ -0,0 +1,187 @@
+"""
+Columnar per-symbol-year layout for daily price history.
+
+Instead of one ``di_prices_daily`` document per (symbol, date), each
+``di_prices_daily_columnar/{symbol}_{year}`` document holds a whole year of
+bars as parallel arrays packed into little-endian bytes fields:
+
+    dates           int64 epoch seconds (UTC)
+    open/high/low/close_price, adjusted_close
+                    float64 (adjusted_close is NaN when the provider has none)
+    volume          int64
+
+A year of bars is ~16KB, well under Firestore's 1MB document limit, and a
+training read costs one document per symbol-year instead of ~250.
+
+PRICE_STORAGE_LAYOUT selects what ingestion writes and readers use:
+    rows        per-bar documents only (default)
+    columnar    per-symbol-year documents only
+    both        write both, read columnar
+"""
+
+import math
+import os
+import sys
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from .models import BarBatch
+
+COLUMNAR_COLLECTION = "di_prices_daily_columnar"
+
+# Packed column name -> (array typecode, matching NumPy dtype); a BarBatch
+# holds bars in exactly this layout
+COLUMN_TYPES = BarBatch.COLUMN_TYPES
+
+_BIG_ENDIAN = sys.byteorder == "big"
+
+
+def storage_layout() -> str:
+    """Configured price layout: rows, columnar or both."""
+    layout = os.getenv("PRICE_STORAGE_LAYOUT", "rows").lower()
+    if layout not in ("rows", "columnar", "both"):
+        raise ValueError(f"Unknown PRICE_STORAGE_LAYOUT: {layout}")
+    return layout
+
+
+def writes_rows() -> bool:
+    return storage_layout() in ("rows", "both")
+
+
+def writes_columnar() -> bool:
+    return storage_layout() in ("columnar", "both")
+
+
+def reads_columnar() -> bool:
+    return storage_layout() in ("columnar", "both")
+
+
+def document_id(symbol: str, year: int) -> str:
+    return f"{symbol}_{year}"
+
+
+def pack(typecode: str, values: Iterable) -> bytes:
+    """Pack values into little-endian bytes."""
+    packed = array(typecode, values)
+    if _BIG_ENDIAN:
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack(typecode: str, data: bytes) -> array:
+    """Inverse of pack()."""
+    values = array(typecode)
+    values.frombytes(data)
+    if _BIG_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def epoch_seconds(value: datetime) -> int:
+    """Epoch seconds for a datetime, treating naive values as UTC like Firestore does."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _as_float(value: Any) -> float:
+    return math.nan if value is None else float(value)
+
+
+def decode_document(doc: Dict[str, Any]) -> Dict[str, array]:
+    """Unpack a columnar document into one array per column."""
+    return {name: unpack(typecode, doc[name]) for name, (typecode, _) in COLUMN_TYPES.items()}
+
+
+def merge_rows(symbol: str, year: int, existing: Optional[Dict[str, Any]],
+               rows: Union[BarBatch, Iterable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Merge per-bar rows or a batch into a symbol-year document, newest value winning per date."""
+    bars: Dict[int, tuple] = {}
+    provider = None
+
+    if existing:
+        columns = decode_document(existing)
+        provider = existing.get("provider")
+        for i, ts in enumerate(columns["dates"]):
+            bars[ts] = tuple(columns[name][i] for name in list(COLUMN_TYPES)[1:])
+
+    if isinstance(rows, BarBatch):
+        provider = rows.provider
+        columns = [rows.columns[name] for name in COLUMN_TYPES]
+        bars.update((ts, values) for ts, *values in zip(*columns))
+        rows = ()
+
+    for row in rows:
+        provider = row.get("provider", provider)
+        bars[epoch_seconds(row["date"])] = (
+            _as_float(row["open_price"]),
+            _as_float(row["high_price"]),
+            _as_float(row["low_price"]),
+            _as_float(row["close_price"]),
+            _as_float(row.get("adjusted_close")),
+            int(row["volume"]),
+        )
+
+    dates = sorted(bars)
+    doc: Dict[str, Any] = {
+        "symbol": symbol,
+        "year": year,
+        "provider": getattr(provider, "value", provider),
+        "count": len(dates),
+        "first_date": datetime.fromtimestamp(dates[0], tz=timezone.utc) if dates else None,
+        "last_date": datetime.fromtimestamp(dates[-1], tz=timezone.utc) if dates else None,
+        "updated_at": datetime.utcnow(),
+        "dates": pack("q", dates),
+    }
+    for index, (name, (typecode, _)) in enumerate(list(COLUMN_TYPES.items())[1:]):
+        doc[name] = pack(typecode, (bars[ts][index] for ts in dates))
+    return doc
+
+
+async def store_columnar_prices(client, symbol: str,
+                                rows: Union[BarBatch, List[Dict[str, Any]]]) -> bool:
+    """Merge daily bars (row dicts or a BarBatch) for one symbol into its symbol-year documents.
+
+    This is a read-modify-write of one document per year touched, so two
+    writers updating the same symbol concurrently can lose bars; the
+    orchestrator assigns each symbol to a single provider per cycle.
+    """
+    if isinstance(rows, BarBatch):
+        by_year: Dict[int, Any] = rows.years()
+    else:
+        by_year = {}
+        for row in rows:
+            by_year.setdefault(row["date"].year, []).append(row)
+    if not by_year:
+        return True
+
+    years = sorted(by_year)
+    ids = [document_id(symbol, year) for year in years]
+    existing = await client.get_documents(COLUMNAR_COLLECTION, ids)
+
+    operations = [
+        {
+            "collection": COLUMNAR_COLLECTION,
+            "document_id": doc_id,
+            "data": merge_rows(symbol, year, current, by_year[year]),
+            "operation": "set",
+        }
+        for year, doc_id, current in zip(years, ids, existing)
+    ]
+    return await client.batch_write(operations)
+
+
+async def latest_closes(client, symbols: List[str]) -> Dict[str, float]:
+    """Most recent close per symbol, read from this year's and last year's documents."""
+    year = datetime.utcnow().year
+    ids = [document_id(symbol, y) for symbol in symbols for y in (year, year - 1)]
+    docs = await client.get_documents(COLUMNAR_COLLECTION, ids)
+
+    closes: Dict[str, float] = {}
+    for index, symbol in enumerate(symbols):
+        for doc in docs[2 * index:2 * index + 2]:
+            if doc and doc.get("count"):
+                closes[symbol] = unpack("d", doc["close_price"])[-1]
+                break
+    return closes
@@ -0,0 +1,236 @@
+"""
+Per-provider API rate limits, enforced where the provider clients send requests.
+
+Each provider has one token bucket per limit window (per minute, per day, or
+any other period). A bucket holds up to ``requests`` tokens and refills at
+``requests / period`` tokens per second. ``await rate_limiter.acquire(p)``
+reserves a token from every bucket of provider ``p`` and sleeps until the
+reservation is due, so concurrent fetches are released at the provider's
+maximum rate instead of behind fixed delays. A reservation further away
+than RATE_LIMIT_MAX_WAIT_S (e.g. once the daily budget is spent) is not
+made and raises RateLimitExceeded instead.
+
+Limits default to PROVIDER_LIMITS and can be overridden per provider:
+
+    RATE_LIMIT_POLYGON="5/min,100/day"     comma-separated requests/period,
+                                           period in s, min, hour, day or seconds
+
+Buckets are kept by the backend chosen with RATE_LIMIT_BACKEND:
+
+    local       in this process (default)
+    firestore   in di_rate_limits/{provider}, updated in a transaction, so all
+                instances of a service share one budget; a failed transaction
+                falls back to the local buckets for that request
+"""
+
+import asyncio
+import math
+import os
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+RATE_LIMIT_COLLECTION = "di_rate_limits"
+
+PERIODS = {"s": 1, "sec": 1, "min": 60, "hour": 3600, "h": 3600, "day": 86400}
+
+
+class Limit(NamedTuple):
+    """``requests`` per ``period`` seconds."""
+
+    requests: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.requests / self.period
+
+    @property
+    def key(self) -> str:
+        """Bucket name; a changed limit starts a fresh bucket."""
+        return f"{self.requests}_per_{self.period:g}s"
+
+
+# Free tier limits; the daily budgets are kept conservative
+PROVIDER_LIMITS: Dict[str, Tuple[Limit, ...]] = {
+    "alphavantage": (Limit(5, 60), Limit(100, 86400)),
+    "finnhub": (Limit(60, 60), Limit(250, 86400)),
+    "polygon": (Limit(5, 60), Limit(100, 86400)),
+    "tiingo": (Limit(50, 3600), Limit(500, 86400)),
+}
+
+
+class RateLimitExceeded(Exception):
+    """No request slot for ``provider`` within the maximum wait."""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"Rate limit for {provider} exceeded; retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def parse_limits(spec: str) -> Tuple[Limit, ...]:
+    """Parse ``"5/min,100/day"`` (or ``"5/60,100/86400"``) into limits."""
+    limits = []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        requests, _, period = part.strip().partition("/")
+        period = period.strip().lower()
+        seconds = PERIODS.get(period) or float(period)
+        if int(requests) <= 0 or seconds <= 0:
+            raise ValueError(f"Invalid rate limit: {part}")
+        limits.append(Limit(int(requests), float(seconds)))
+    return tuple(limits)
+
+
+def provider_limits(provider: Any) -> Tuple[Limit, ...]:
+    """Limits for ``provider`` (a DataProvider or its value)."""
+    name = getattr(provider, "value", provider)
+    spec = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if spec is not None:
+        return parse_limits(spec)
+    return PROVIDER_LIMITS.get(name, ())
+
+
+def daily_limit(provider: Any) -> Optional[int]:
+    """Requests per day allowed for ``provider``, None if unlimited."""
+    budgets = [math.floor(limit.requests * 86400 / limit.period)
+               for limit in provider_limits(provider) if limit.period >= 86400]
+    return min(budgets) if budgets else None
+
+
+def reserve(buckets: Optional[Dict[str, Dict[str, float]]], limits: Tuple[Limit, ...],
+            now: float, max_wait: float) -> Tuple[Optional[Dict[str, Dict[str, float]]], float]:
+    """Refill ``buckets`` to ``now`` and reserve one token from each.
+
+    Returns the updated buckets and the seconds until the reservation is
+    due. If that is more than ``max_wait`` nothing is reserved and the
+    buckets are returned as None.
+    """
+    buckets = buckets or {}
+    updated = {}
+    wait = 0.0
+    for limit in limits:
+        bucket = buckets.get(limit.key)
+        if bucket is None:
+            tokens = float(limit.requests)
+        else:
+            elapsed = max(0.0, now - bucket["updated"])
+            tokens = min(float(limit.requests), bucket["tokens"] + elapsed * limit.rate)
+        tokens -= 1
+        if tokens < 0:
+            wait = max(wait, -tokens / limit.rate)
+        updated[limit.key] = {"tokens": tokens, "updated": now}
+    if wait > max_wait:
+        return None, wait
+    return updated, wait
+
+
+class LocalBackend:
+    """Buckets kept in this process."""
+
+    name = "local"
+
+    def __init__(self):
+        self._buckets: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    async def reserve(self, provider: str, limits: Tuple[Limit, ...], max_wait: float) -> float:
+        buckets, wait = reserve(self._buckets.get(provider), limits, time.time(), max_wait)
+        if buckets is not None:
+            self._buckets[provider] = buckets
+        return wait
+
+
+class FirestoreBackend:
+    """Buckets in one document per provider, shared by every instance."""
+
+    name = "firestore"
+
+    def __init__(self, firestore_client, fallback: LocalBackend):
+        self.firestore_client = firestore_client
+        self.fallback = fallback
+        self.fallbacks = 0
+
+    async def reserve(self, provider: str, limits: Tuple[Limit, ...], max_wait: float) -> float:
+        def update(data: Optional[Dict[str, Any]]):
+            buckets, wait = reserve((data or {}).get("buckets"), limits, time.time(), max_wait)
+            if buckets is None:
+                return None, wait
+            return {"provider": provider, "buckets": buckets}, wait
+
+        wait = await self.firestore_client.update_in_transaction(
+            RATE_LIMIT_COLLECTION, provider, update)
+        if wait is None:
+            self.fallbacks += 1
+            logger.warning("Shared rate limit unavailable; using local buckets",
+                           provider=provider)
+            return await self.fallback.reserve(provider, limits, max_wait)
+        return wait
+
+
+class RateLimiter:
+    """Token-bucket limits per provider, shared across instances when configured."""
+
+    def __init__(self, max_wait: Optional[float] = None,
+                 limits: Callable[[Any], Tuple[Limit, ...]] = provider_limits):
+        self.max_wait = max_wait if max_wait is not None else float(
+            os.getenv("RATE_LIMIT_MAX_WAIT_S", "300"))
+        self._limits = limits
+        self.local = LocalBackend()
+        self.backend = self.local
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def configure(self, firestore_client=None, backend: Optional[str] = None):
+        """Select the bucket backend (RATE_LIMIT_BACKEND unless given)."""
+        backend = (backend or os.getenv("RATE_LIMIT_BACKEND", "local")).lower()
+        if backend == "local":
+            self.backend = self.local
+        elif backend == "firestore":
+            if firestore_client is None:
+                raise ValueError("RATE_LIMIT_BACKEND=firestore needs a Firestore client")
+            self.backend = FirestoreBackend(firestore_client, self.local)
+        else:
+            raise ValueError(f"Unknown rate limit backend: {backend}")
+        logger.info("Rate limiter configured", backend=self.backend.name)
+
+    def limits(self, provider: Any) -> Tuple[Limit, ...]:
+        return self._limits(provider)
+
+    async def acquire(self, provider: Any):
+        """Wait for a request slot for ``provider``; raises RateLimitExceeded."""
+        name = getattr(provider, "value", provider)
+        limits = self.limits(name)
+        if not limits:
+            return
+        stats = self._stats.setdefault(
+            name, {"granted": 0, "rejected": 0, "waited": 0, "wait_s": 0.0})
+        wait = await self.backend.reserve(name, limits, self.max_wait)
+        if wait > self.max_wait:
+            stats["rejected"] += 1
+            logger.warning("Rate limit exceeded", provider=name, retry_after_s=round(wait))
+            raise RateLimitExceeded(name, wait)
+        stats["granted"] += 1
+        if wait > 0:
+            stats["waited"] += 1
+            stats["wait_s"] += wait
+            await asyncio.sleep(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        providers: List[str] = sorted(self._stats)
+        return {
+            "backend": self.backend.name,
+            "max_wait_s": self.max_wait,
+            "fallbacks": getattr(self.backend, "fallbacks", 0),
+            "providers": {
+                name: {**self._stats[name], "wait_s": round(self._stats[name]["wait_s"], 3),
+                       "limits": [limit.key for limit in self.limits(name)]}
+                for name in providers
+            },
+        }
+
+
+rate_limiter = RateLimiter()
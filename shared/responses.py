@@ -0,0 +1,101 @@
+"""
+Fast JSON responses for the FastAPI services.
+
+FastAPI passes whatever an endpoint returns through ``jsonable_encoder``,
+which rebuilds every dict and list and converts Decimal and datetime values
+one at a time, before the response class renders it. For endpoints returning
+thousands of documents that pass dominates the request.
+
+FastJSONResponse renders content with orjson, which handles datetime, enums
+and NumPy arrays and scalars natively; Decimals become floats and pydantic
+models their ``.dict()``. FastJSONRoute hands endpoint results straight to
+it, skipping ``jsonable_encoder``. Routes declaring a ``response_model`` are
+still validated and encoded by FastAPI as before.
+
+Usage:
+    app = FastAPI(title=..., default_response_class=FastJSONResponse)
+    app.router.route_class = FastJSONRoute    # before any route is added
+"""
+
+import asyncio
+import functools
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable
+
+from fastapi.routing import APIRoute, request_response
+from pydantic import BaseModel
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+_ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def _default(value: Any) -> Any:
+    """Types orjson (or json) does not serialize by itself."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):  # e.g. pandas Timestamp
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "tolist"):  # NumPy values the json fallback meets
+        return value.tolist()
+    if hasattr(value, "value"):  # str/int Enums in the json fallback
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def render_json(content: Any) -> bytes:
+    """Encode content as compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(content, default=_default, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return render_json(content)
+
+
+def _respond_with(endpoint: Callable, response_class: type, status_code) -> Callable:
+    """Wrap an endpoint so its result is returned as an already built response."""
+    def build(result):
+        if isinstance(result, Response):
+            return result
+        if status_code is None:
+            return response_class(result)
+        return response_class(result, status_code=status_code)
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            return build(await endpoint(*args, **kwargs))
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            return build(endpoint(*args, **kwargs))
+    return wrapper
+
+
+class FastJSONRoute(APIRoute):
+    """APIRoute whose results skip jsonable_encoder when rendered with FastJSONResponse."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        response_class = getattr(self.response_class, "value", self.response_class)
+        if (self.response_model is None and isinstance(response_class, type)
+                and issubclass(response_class, FastJSONResponse)):
+            self.dependant.call = _respond_with(self.dependant.call, response_class,
+                                                self.status_code)
+            self.app = request_response(self.get_route_handler())
@@ -0,0 +1,189 @@
+"""
+Retry policy and deadline budgets for Firestore calls.
+
+Every FirestoreClient RPC runs through a RetryPolicy:
+
+    * transient gRPC errors (ABORTED, DEADLINE_EXCEEDED, UNAVAILABLE,
+      RESOURCE_EXHAUSTED, INTERNAL) are retried with exponential backoff and
+      full jitter, up to ``max_attempts`` attempts in total
+    * each attempt gets its own RPC timeout (``call_timeout``) instead of the
+      library's 60s default, and the library's own retries are disabled so
+      the two do not multiply
+    * if a deadline budget is active, attempt timeouts are clipped to what is
+      left of it and no retry is started that could not finish in time
+
+Budgets are set per request by DeadlineMiddleware, or around any block with
+``deadline(seconds)``. They are process-local and cover only the work done
+while serving the request, not background tasks it schedules.
+
+Policies are read from the environment, so each service is tuned by its
+deployment:
+    FIRESTORE_RETRY_ATTEMPTS        attempts per call, including the first (4)
+    FIRESTORE_RETRY_INITIAL_DELAY   first backoff cap in seconds (0.1)
+    FIRESTORE_RETRY_MAX_DELAY       backoff cap in seconds (5)
+    FIRESTORE_CALL_TIMEOUT          per-attempt RPC timeout in seconds (10)
+    REQUEST_DEADLINE_S              per-request budget for DeadlineMiddleware (30)
+"""
+
+import asyncio
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+import structlog
+from google.api_core import exceptions as gcp_exceptions
+
+logger = structlog.get_logger(__name__)
+
+# Worth retrying as-is: the request may succeed if simply sent again
+RETRYABLE_ERRORS = (
+    gcp_exceptions.Aborted,
+    gcp_exceptions.DeadlineExceeded,
+    gcp_exceptions.ServiceUnavailable,
+    gcp_exceptions.ResourceExhausted,
+    gcp_exceptions.InternalServerError,
+    gcp_exceptions.TooManyRequests,
+    gcp_exceptions.GatewayTimeout,
+    gcp_exceptions.RetryError,
+    ConnectionError,
+    TimeoutError,
+    asyncio.TimeoutError,
+)
+
+
+class Deadline:
+    """Absolute expiry on the monotonic clock; ``expires_at=None`` means unbounded."""
+
+    def __init__(self, seconds: Optional[float]):
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def clear(self):
+        self.expires_at = None
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left in the current deadline budget, or None if there is none."""
+    current = _deadline.get()
+    return current.remaining() if current is not None else None
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[Deadline]:
+    """Bound Firestore calls inside the block to ``seconds`` in total.
+
+    Nested budgets never extend an outer one.
+    """
+    outer = remaining_budget()
+    budget = Deadline(seconds if outer is None else min(seconds, outer))
+    token = _deadline.set(budget)
+    try:
+        yield budget
+    finally:
+        _deadline.reset(token)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and deadline."""
+
+    def __init__(self, max_attempts: int = 4, initial_delay: float = 0.1,
+                 max_delay: float = 5.0, multiplier: float = 2.0,
+                 call_timeout: Optional[float] = 10.0):
+        self.max_attempts = max(1, max_attempts)
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.call_timeout = call_timeout
+
+    @classmethod
+    def from_env(cls, **overrides) -> "RetryPolicy":
+        """Build from FIRESTORE_RETRY_* / FIRESTORE_CALL_TIMEOUT; keyword arguments win."""
+        settings = {
+            "max_attempts": int(os.getenv("FIRESTORE_RETRY_ATTEMPTS", "4")),
+            "initial_delay": float(os.getenv("FIRESTORE_RETRY_INITIAL_DELAY", "0.1")),
+            "max_delay": float(os.getenv("FIRESTORE_RETRY_MAX_DELAY", "5")),
+            "call_timeout": float(os.getenv("FIRESTORE_CALL_TIMEOUT", "10")),
+        }
+        settings.update(overrides)
+        return cls(**settings)
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number ``attempt`` (0-based), with full jitter."""
+        cap = min(self.max_delay, self.initial_delay * (self.multiplier ** attempt))
+        return random.uniform(0, cap)
+
+    def attempt_timeout(self, timeout: Optional[float] = None) -> Optional[float]:
+        """RPC timeout for the next attempt, clipped to the deadline budget.
+
+        Raises DeadlineExceeded if the budget is already spent.
+        """
+        timeout = timeout if timeout is not None else self.call_timeout
+        budget = remaining_budget()
+        if budget is None:
+            return timeout
+        if budget <= 0:
+            raise gcp_exceptions.DeadlineExceeded("Request deadline budget exhausted")
+        return budget if timeout is None else min(timeout, budget)
+
+    async def run(self, call: Callable[[Optional[float]], Awaitable[Any]],
+                  timeout: Optional[float] = None, **log_context) -> Any:
+        """Await ``call(attempt_timeout)`` until it succeeds or may not be retried.
+
+        ``log_context`` (e.g. collection, operation) is added to retry logs.
+        """
+        attempt = 0
+        while True:
+            try:
+                return await call(self.attempt_timeout(timeout))
+            except RETRYABLE_ERRORS as e:
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+                delay = self.backoff(attempt - 1)
+                budget = remaining_budget()
+                if budget is not None and budget <= delay:
+                    raise
+                logger.warning("Retrying Firestore call", attempt=attempt,
+                               retry_in_s=round(delay, 3), error=str(e), **log_context)
+                await asyncio.sleep(delay)
+
+
+class DeadlineMiddleware:
+    """ASGI middleware giving each HTTP request a Firestore deadline budget.
+
+    The budget is lifted once the response body is sent, so background tasks
+    started by the request are not cut short by it.
+    """
+
+    def __init__(self, app, seconds: Optional[float] = None):
+        self.app = app
+        self.seconds = seconds if seconds is not None else float(
+            os.getenv("REQUEST_DEADLINE_S", "30"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = Deadline(self.seconds)
+        token = _deadline.set(budget)
+
+        async def send_wrapper(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                budget.clear()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _deadline.reset(token)
@@ -0,0 +1,49 @@
+"""
+Lossless JSON encoding for Firestore document payloads.
+
+Plain JSON loses the types our documents carry (datetime, Decimal, bytes), so
+they are written as single-key tagged objects and restored on load.
+"""
+
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+_DATETIME_TAG = "$dt"
+_DECIMAL_TAG = "$dec"
+_BYTES_TAG = "$bytes"
+
+
+def _encode_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {_DATETIME_TAG: value.isoformat()}
+    if isinstance(value, Decimal):
+        return {_DECIMAL_TAG: str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {_BYTES_TAG: base64.b64encode(bytes(value)).decode("ascii")}
+    if hasattr(value, "value"):  # str/int Enums
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _decode_hook(obj: dict) -> Any:
+    if len(obj) == 1:
+        if _DATETIME_TAG in obj:
+            return datetime.fromisoformat(obj[_DATETIME_TAG])
+        if _DECIMAL_TAG in obj:
+            return Decimal(obj[_DECIMAL_TAG])
+        if _BYTES_TAG in obj:
+            return base64.b64decode(obj[_BYTES_TAG])
+    return obj
+
+
+def dumps(data: Any) -> str:
+    """Encode a document payload as tagged JSON."""
+    return json.dumps(data, default=_encode_default, separators=(",", ":"))
+
+
+def loads(text: str) -> Any:
+    """Decode tagged JSON produced by dumps()."""
+    return json.loads(text, object_hook=_decode_hook)
@@ -0,0 +1,367 @@
+"""
+Lightweight distributed tracing across the services.
+
+Spans are recorded around incoming FastAPI requests (TracingMiddleware), the
+background work a request leaves behind, outgoing httpx calls
+(TracingTransport), Firestore RPCs (FirestoreClient._call) and any block
+wrapped in ``span()`` or function decorated with ``@traced()``. The current
+span lives in a context variable, so tasks created with asyncio inherit it.
+
+Trace context crosses services in the W3C ``traceparent`` header, so one
+orchestrated cycle is a single trace from the orchestrator through the
+provider services, ML, strategy and portfolio.
+
+Finished spans are written as JSON lines by a background thread, one object
+per span, to the destination in TRACE_EXPORT:
+
+    off           no spans are recorded (default)
+    stdout        standard output, next to the logs
+    file          TRACE_FILE (default /tmp/moda-traces.jsonl)
+
+Services sharing a host can append to the same file. scripts/trace_report.py
+prints the span tree and critical path of a trace from these files.
+"""
+
+import atexit
+import functools
+import json
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import httpx
+
+TRACEPARENT_HEADER = "traceparent"
+
+# Finished spans waiting for the writer thread; new spans are dropped when full
+EXPORT_QUEUE_SIZE = 10000
+
+
+class Span:
+    """One timed operation in a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "service",
+                 "attributes", "start", "_started", "duration_ms", "status", "children")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 kind: str = "internal", attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.service = _service_name
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status = "ok"
+        self.children = 0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException):
+        self.status = "error"
+        self.attributes["error"] = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.duration_ms is None:
+            self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+            _exporter.export(self)
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": self.service,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _Exporter:
+    """Writes finished spans as JSON lines from a background thread."""
+
+    def __init__(self):
+        self.destination = "off"
+        self.dropped = 0
+        self.exported = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.destination != "off"
+
+    def configure(self, destination: str):
+        self.close()
+        self.destination = destination
+        if self.enabled:
+            self._thread = threading.Thread(target=self._write_forever,
+                                            name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write out queued spans and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _write_forever(self):
+        if self.destination == "stdout":
+            stream, owned = sys.stdout, False
+        else:
+            stream, owned = open(os.getenv("TRACE_FILE", "/tmp/moda-traces.jsonl"), "a"), True
+        try:
+            while True:
+                span = self._queue.get()
+                if span is None:
+                    break
+                stream.write(json.dumps(span.to_dict(), default=str) + "\n")
+                self.exported += 1
+                if self._queue.empty():
+                    stream.flush()
+        finally:
+            if owned:
+                stream.close()
+            else:
+                stream.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"export": self.destination, "exported": self.exported,
+                "queued": self._queue.qsize(), "dropped": self.dropped}
+
+
+_exporter = _Exporter()
+_service_name = "moda-trader"
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+atexit.register(_exporter.close)
+
+
+def configure_tracing(service_name: str, export: Optional[str] = None):
+    """Set the service name and exporter (default TRACE_EXPORT)."""
+    global _service_name
+    export = (export or os.getenv("TRACE_EXPORT", "off")).lower()
+    if export not in ("off", "stdout", "file"):
+        raise ValueError(f"Unknown TRACE_EXPORT: {export}")
+    _service_name = service_name
+    _exporter.configure(export)
+
+
+def tracing_enabled() -> bool:
+    return _exporter.enabled
+
+
+def tracing_stats() -> Dict[str, Any]:
+    return _exporter.stats()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple]:
+    """``(trace_id, parent_span_id)`` from a traceparent header, or None if invalid."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2]
+
+
+def start_span(name: str, kind: str = "internal", parent: Optional[Span] = None,
+               remote: Optional[tuple] = None, start_trace: bool = True,
+               **attributes) -> Optional[Span]:
+    """Start a span without making it current; None when it is not recorded.
+
+    The parent is ``parent``, else the remote ``(trace_id, span_id)``, else
+    the current span. Without any of them the span starts a new trace, or
+    is not recorded if ``start_trace`` is False.
+    """
+    if not _exporter.enabled:
+        return None
+    parent = parent or (None if remote else _current.get())
+    if parent is not None:
+        parent.children += 1
+        return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+    if remote is not None:
+        return Span(name, remote[0], remote[1], kind, attributes)
+    if not start_trace:
+        return None
+    return Span(name, secrets.token_hex(16), None, kind, attributes)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", start_trace: bool = True,
+         **attributes) -> Iterator[Optional[Span]]:
+    """Record the enclosed block as a child of the current span.
+
+    Yields the span (None when it is not recorded) so callers can add
+    attributes. With ``start_trace=False`` the block is only recorded inside
+    an existing trace; Firestore and HTTP client spans use this, so periodic
+    background work (live view polls, write-behind drains) does not produce
+    a stream of one-span traces.
+    """
+    current = start_span(name, kind, start_trace=start_trace, **attributes)
+    if current is None:
+        yield None
+        return
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def traced(name: Optional[str] = None, kind: str = "internal"):
+    """Decorator recording each call of an async function as a span."""
+    def decorator(func: Callable):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(span_name, kind):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracingMiddleware:
+    """ASGI middleware recording a server span per HTTP request.
+
+    The span continues the caller's trace when a traceparent header is
+    present and ends once the response body is sent. Work the request
+    leaves behind (FastAPI background tasks) is recorded as a "background"
+    child span, so what it does is still attributed to the trace.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _exporter.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        remote = parse_traceparent(headers.get(TRACEPARENT_HEADER.encode(), b"").decode())
+        server = start_span(f"{scope['method']} {scope['path']}", "server", remote=remote,
+                            method=scope["method"], path=scope["path"])
+        token = _current.set(server)
+        state = {"background": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                server.set(status_code=message["status"])
+                if message["status"] >= 500:
+                    server.status = "error"
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                self._name(server, scope)
+                server.end()
+                # Anything still running in this request is background work
+                state["background"] = start_span("background", "background", parent=server)
+                _current.set(state["background"])
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            (state["background"] or server).fail(e)
+            raise
+        finally:
+            _current.reset(token)
+            self._name(server, scope)
+            server.end()
+            background = state["background"]
+            if background is not None and (background.children
+                                           or time.perf_counter() - background._started > 0.001):
+                background.end()
+
+    @staticmethod
+    def _name(server: Span, scope):
+        route = scope.get("route")
+        if getattr(route, "path", None):
+            server.name = f"{scope['method']} {route.path}"
+
+
+class _TracedStream(httpx.AsyncByteStream):
+    """Response body stream that ends the client span when closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, client_span: Span):
+        self._stream = stream
+        self._span = client_span
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._span.end()
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records client spans and sends ``traceparent``.
+
+    Wraps another transport (a default AsyncHTTPTransport if none is
+    given); the span covers the request until the response body is read.
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None, **kwargs):
+        self._transport = transport or httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        client_span = start_span(f"HTTP {request.method} {request.url.host}", "client",
+                                 start_trace=False, method=request.method,
+                                 url=str(request.url).split("?")[0])
+        if client_span is None:
+            return await self._transport.handle_async_request(request)
+
+        request.headers[TRACEPARENT_HEADER] = client_span.traceparent()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as e:
+            client_span.fail(e)
+            client_span.end()
+            raise
+        client_span.set(status_code=response.status_code)
+        if response.status_code >= 500:
+            client_span.status = "error"
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_TracedStream(response.stream, client_span),
+                              extensions=response.extensions)
+
+    async def aclose(self):
+        await self._transport.aclose()
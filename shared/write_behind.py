@@ -0,0 +1,382 @@
+"""
+Write-behind queue for ingestion writes, backed by a local write-ahead log.
+
+Producers append writes to an append-only log on local disk and return
+immediately; a background flusher drains the log to Firestore in batches of
+up to 500, in order. A checkpoint file records the last committed sequence
+number, so writes still in the log when the process stops are replayed on
+the next start. Provider fetches therefore never wait on Firestore latency,
+and a Firestore outage delays writes instead of dropping them.
+
+Failures are classified per batch:
+    transient (unavailable, deadline, throttling, network)
+        the batch stays queued and is retried with exponential backoff
+    anything else (e.g. an unencodable value)
+        the batch is retried one write at a time, and writes that still fail
+        are moved to dead-letter.log instead of blocking the queue
+    local file errors (checkpoint, dead-letter log)
+        logged and retried with the same backoff; a flusher that dies anyway
+        is restarted, and its state is under flusher_alive in stats()
+
+Durability is that of WRITE_BEHIND_DIR: lines are flushed to the OS on every
+append and fsynced once per flush cycle. On Cloud Run the default /tmp is
+in-memory, so mount a volume there if writes must survive instance loss.
+
+Usage:
+    queue = WriteBehindQueue(firestore_client, "/var/lib/moda/polygon")
+    await queue.start()                  # replays anything left from last run
+    await queue.upsert_many("di_prices_daily", ((doc_id, data), ...))
+    await queue.stop()                   # drains, or leaves the rest for replay
+"""
+
+import asyncio
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+import structlog
+
+from .firestore_client import FirestoreClient, MAX_BATCH_SIZE
+from .retry import RETRYABLE_ERRORS
+from .serialization import dumps, loads
+
+logger = structlog.get_logger(__name__)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".wal"
+CHECKPOINT_FILE = "checkpoint"
+DEAD_LETTER_FILE = "dead-letter.log"
+
+# Errors worth retrying as-is; anything else is treated as a bad write.
+# commit_batch has already retried these briefly under the client's
+# RetryPolicy, so reaching the queue means a longer outage.
+TRANSIENT_ERRORS = RETRYABLE_ERRORS
+
+
+def default_wal_dir(service_name: str) -> str:
+    """WAL directory for a service, from WRITE_BEHIND_DIR."""
+    base = os.getenv("WRITE_BEHIND_DIR", "/tmp/moda-write-behind")
+    return os.path.join(base, service_name)
+
+
+class WriteBehindQueue:
+    """Durable, ordered, batched write-behind from a local log to Firestore."""
+
+    def __init__(self, client: FirestoreClient, wal_dir: str,
+                 batch_size: int = MAX_BATCH_SIZE, linger: float = 0.05,
+                 max_pending: int = 100_000, max_segment_bytes: int = 16 * 1024 * 1024,
+                 retry_delay: float = 0.5, max_retry_delay: float = 30.0,
+                 drain_timeout: float = 8.0):
+        self.client = client
+        self.wal_dir = wal_dir
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.linger = linger
+        self.max_pending = max_pending
+        self.max_segment_bytes = max_segment_bytes
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.drain_timeout = drain_timeout
+
+        self.appended = 0
+        self.committed = 0
+        self.replayed = 0
+        self.retries = 0
+        self.dead_lettered = 0
+
+        self._pending: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        self._segments: List[Tuple[int, str]] = []  # (first seq, path), oldest first
+        self._segment = None
+        self._segment_bytes = 0
+        self._next_seq = 1
+        self._checkpoint = 0
+        self._dirty = False
+        self._wake = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._has_space = asyncio.Event()
+        self._has_space.set()
+        self._stopping = False
+        self._flusher: Optional[asyncio.Task] = None
+
+    # Lifecycle
+
+    async def start(self):
+        """Replay unflushed writes from the log and start the flusher."""
+        os.makedirs(self.wal_dir, exist_ok=True)
+        self._checkpoint = self._read_checkpoint()
+        self._replay()
+        self._open_segment()
+        self._prune_segments()
+        if self._pending:
+            self._drained.clear()
+            self._wake.set()
+        self._start_flusher()
+        logger.info("Write-behind queue started", wal_dir=self.wal_dir,
+                    replayed=self.replayed, checkpoint=self._checkpoint)
+
+    async def stop(self):
+        """Drain within drain_timeout; anything left is replayed on next start."""
+        self._stopping = True
+        self._wake.set()
+        if self._flusher is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._flusher), self.drain_timeout)
+            except asyncio.TimeoutError:
+                self._flusher.cancel()
+                try:
+                    await self._flusher
+                except asyncio.CancelledError:
+                    pass
+        if self._segment is not None:
+            self._sync()
+            self._segment.close()
+            self._segment = None
+        logger.info("Write-behind queue stopped", **self.stats())
+
+    # Producers
+
+    async def upsert(self, collection: str, document_id: str, data: Dict[str, Any]):
+        """Queue a merge write; returns once it is in the log."""
+        await self.upsert_many(collection, [(document_id, data)])
+
+    async def upsert_many(self, collection: str, items: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Queue merge writes for many documents with a single log append."""
+        await self.add([{'collection': collection, 'document_id': document_id,
+                         'data': data, 'operation': 'upsert'}
+                        for document_id, data in items])
+
+    async def add(self, operations: List[Dict[str, Any]]):
+        """Queue raw batch_write-style operations."""
+        if not operations:
+            return
+        if self._segment is None:
+            raise RuntimeError("Write-behind queue is not running")
+
+        # Backpressure: bound memory if Firestore falls far behind
+        while len(self._pending) >= self.max_pending:
+            self._has_space.clear()
+            await self._has_space.wait()
+
+        lines = []
+        records = []
+        for op in operations:
+            seq = self._next_seq
+            self._next_seq += 1
+            lines.append(dumps({'seq': seq, **op}))
+            records.append((seq, op))
+
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        self._segment.write(payload)
+        self._segment.flush()
+        self._segment_bytes += len(payload)
+        self._dirty = True
+
+        self._pending.extend(records)
+        self.appended += len(records)
+        self._drained.clear()
+        self._wake.set()
+
+        if self._segment_bytes >= self.max_segment_bytes:
+            self._sync()
+            self._segment.close()
+            self._open_segment()
+
+    async def flush(self):
+        """Wait until everything queued so far has been committed."""
+        await self._drained.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "appended": self.appended,
+            "committed": self.committed,
+            "replayed": self.replayed,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+            "checkpoint": self._checkpoint,
+            "segments": len(self._segments),
+            "flusher_alive": self._flusher is not None and not self._flusher.done(),
+        }
+
+    # Flusher
+
+    def _start_flusher(self):
+        if self._stopping and self._flusher is not None:
+            return
+        self._flusher = asyncio.create_task(self._run_flusher())
+        self._flusher.add_done_callback(self._on_flusher_done)
+
+    def _on_flusher_done(self, task: asyncio.Task):
+        """Restart a flusher that died; producers would otherwise block on backpressure."""
+        if task.cancelled() or self._stopping:
+            return
+        error = task.exception()
+        logger.error("Write-behind flusher exited; restarting", pending=len(self._pending),
+                     restart_in_s=self.retry_delay, error=str(error) if error else None)
+        asyncio.get_running_loop().call_later(self.retry_delay, self._start_flusher)
+
+    async def _run_flusher(self):
+        delay = self.retry_delay
+        while True:
+            if not self._pending:
+                self._drained.set()
+                if self._stopping:
+                    return
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+
+            try:
+                # Let a trickle of writes coalesce into one batch
+                if len(self._pending) < self.batch_size and not self._stopping:
+                    await asyncio.sleep(self.linger)
+
+                batch = [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+                if self._dirty:
+                    await asyncio.get_running_loop().run_in_executor(None, self._sync)
+
+                committed = await self._commit(batch)
+            except Exception as e:
+                # e.g. the checkpoint or dead-letter file could not be written;
+                # unacknowledged writes stay queued (merges, safe to repeat)
+                logger.error("Write-behind flush failed", pending=len(self._pending),
+                             error=str(e))
+                committed = False
+
+            if committed:
+                delay = self.retry_delay
+                continue
+
+            self.retries += 1
+            logger.warning("Write-behind commit failed; retrying", pending=len(self._pending),
+                           retry_in_s=round(delay, 2))
+            if self._stopping:
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    async def _commit(self, batch: List[Tuple[int, Dict[str, Any]]]) -> bool:
+        """Commit a batch from the head of the queue; False on a transient failure."""
+        try:
+            await self.client.commit_batch([op for _, op in batch])
+        except TRANSIENT_ERRORS as e:
+            logger.warning("Write-behind batch hit a transient error",
+                           operations_count=len(batch), error=str(e))
+            return False
+        except Exception as e:
+            logger.error("Write-behind batch rejected; retrying writes individually",
+                         operations_count=len(batch), error=str(e))
+        else:
+            # Outside the try: a failing checkpoint write is not a rejected batch
+            self._acknowledge(len(batch))
+            return True
+
+        for seq, op in batch:
+            try:
+                await self.client.commit_batch([op])
+            except TRANSIENT_ERRORS:
+                return False
+            except Exception as e:
+                self._dead_letter(seq, op, e)
+            self._acknowledge(1)
+        return True
+
+    def _acknowledge(self, count: int):
+        last_seq = self._pending[count - 1][0]
+        for _ in range(count):
+            self._pending.popleft()
+        self.committed += count
+        if len(self._pending) < self.max_pending:
+            self._has_space.set()
+        self._write_checkpoint(last_seq)
+        self._prune_segments()
+
+    def _dead_letter(self, seq: int, op: Dict[str, Any], error: Exception):
+        self.dead_lettered += 1
+        logger.error("Write-behind write dead-lettered", seq=seq,
+                     collection=op.get('collection'),
+                     document_id=op.get('document_id'), error=str(error))
+        with open(os.path.join(self.wal_dir, DEAD_LETTER_FILE), "a", encoding="utf-8") as f:
+            f.write(dumps({'seq': seq, 'error': str(error), **op}) + "\n")
+
+    # Log files
+
+    def _segment_paths(self) -> List[Tuple[int, str]]:
+        segments = []
+        for name in os.listdir(self.wal_dir):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                first_seq = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                segments.append((first_seq, os.path.join(self.wal_dir, name)))
+        return sorted(segments)
+
+    def _replay(self):
+        max_seq = self._checkpoint
+        for first_seq, path in self._segment_paths():
+            self._segments.append((first_seq, path))
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-append
+                        logger.warning("Skipping unreadable WAL record", path=path)
+                        continue
+                    seq = record.pop('seq')
+                    max_seq = max(max_seq, seq)
+                    if seq > self._checkpoint:
+                        self._pending.append((seq, record))
+                        self.replayed += 1
+        self._next_seq = max_seq + 1
+        self._prune_segments()
+
+    def _open_segment(self):
+        path = os.path.join(self.wal_dir, f"{SEGMENT_PREFIX}{self._next_seq:012d}{SEGMENT_SUFFIX}")
+        self._segment = open(path, "ab")
+        self._segment_bytes = self._segment.tell()
+        if self._segment_bytes:
+            # Terminate a torn line so it cannot run into the next record
+            self._segment.write(b"\n")
+            self._segment.flush()
+        # An empty segment left by the previous run has the same name
+        if not self._segments or self._segments[-1][1] != path:
+            self._segments.append((self._next_seq, path))
+
+    def _sync(self):
+        self._dirty = False
+        segment = self._segment
+        if segment is not None:
+            try:
+                os.fsync(segment.fileno())
+            except (OSError, ValueError):
+                # Rotated and closed meanwhile; rotation syncs before closing
+                pass
+
+    def _read_checkpoint(self) -> int:
+        try:
+            with open(os.path.join(self.wal_dir, CHECKPOINT_FILE), "r") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_checkpoint(self, seq: int):
+        self._checkpoint = seq
+        path = os.path.join(self.wal_dir, CHECKPOINT_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(seq))
+        os.replace(tmp_path, path)
+
+    def _prune_segments(self):
+        """Delete sealed segments whose records are all committed.
+
+        The newest segment is always kept; it is the one being appended to.
+        """
+        while len(self._segments) > 1:
+            _, path = self._segments[0]
+            if self._segments[1][0] - 1 > self._checkpoint:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._segments.pop(0)
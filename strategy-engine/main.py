@@ -15,8 +15,15 @@ from shared.models import (
 )
 from shared.logging_config import setup_logging, get_logger
 from shared.firestore_client import FirestoreClient
+from shared.live_view import LiveCollection
+from shared.metrics import install_metrics
+from shared.retry import DeadlineMiddleware
+from shared.tracing import TracingMiddleware, configure_tracing
+from shared.responses import FastJSONResponse, FastJSONRoute
+from shared.price_columns import COLUMNAR_COLLECTION, latest_closes, reads_columnar
 import asyncio
 import os
+import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from decimal import Decimal
@@ -38,8 +45,11 @@ logger = get_logger()
 app = FastAPI(
     title="Strategy Engine Service",
     description="Generates actionable trade signals from ML recommendations",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+# Render results with orjson directly instead of through jsonable_encoder
+app.router.route_class = FastJSONRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,19 +59,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Firestore usage per route, served at /metrics
+install_metrics(app, "strategy-engine-service", lambda: firestore_client,
+                extra={"live_views": lambda: positions_view.stats() if positions_view else None})
+
+# Firestore time budget per request (REQUEST_DEADLINE_S)
+app.add_middleware(DeadlineMiddleware)
+
+# Spans per request, continuing the caller's trace (TRACE_EXPORT)
+configure_tracing("strategy-engine-service")
+app.add_middleware(TracingMiddleware)
+
+# Read cache TTLs (seconds); positions are written by the portfolio service,
+# so cached reads (used until the live view is ready) refresh when the TTL lapses
+FIRESTORE_CACHE_TTLS = {
+    "di_prices_daily": 60,
+    COLUMNAR_COLLECTION: 60,
+    "pf_positions_active": 10,
+}
+
+# Window for batched latest-price reads; older symbols fall back to a per-symbol query
+PRICE_LOOKBACK_DAYS = 10
+
 # Global clients
 firestore_client = None
 
+# Live mirror of active positions, keyed by symbol (see shared/live_view.py)
+positions_view = None
+
+
+def live_positions() -> Optional[LiveCollection]:
+    """The positions view once it is serving, else None (read Firestore)."""
+    return positions_view if positions_view is not None and positions_view.ready else None
+
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize clients on startup."""
-    global firestore_client
+    global firestore_client, positions_view
 
-    firestore_client = FirestoreClient()
+    firestore_client = FirestoreClient(cache_ttls=FIRESTORE_CACHE_TTLS)
+    positions_view = LiveCollection(firestore_client, "pf_positions_active",
+                                    filters=[("status", "==", "active")])
+    await positions_view.start()
     logger.info("Strategy Engine service started")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detach the live view."""
+    if positions_view is not None:
+        await positions_view.stop()
+
+
 class RiskManager:
     """Risk management rules and calculations."""
 
@@ -79,16 +129,18 @@ class RiskManager:
     async def get_portfolio_value(self) -> Decimal:
         """Get current total portfolio value."""
         try:
-            positions = await firestore_client.query_documents(
-                "pf_positions_active",
-                filters=[("status", "==", "active")]
-            )
-
-            total_value = Decimal('0')
-            for position in positions:
-                market_value = position.get('market_value', 0)
-                if market_value:
-                    total_value += Decimal(str(market_value))
+            view = live_positions()
+            if view is not None:
+                total_value = sum((Decimal(str(position['market_value']))
+                                   for position in view.values() if position.get('market_value')),
+                                  Decimal('0'))
+            else:
+                totals = await firestore_client.aggregate(
+                    "pf_positions_active",
+                    filters=[("status", "==", "active")],
+                    sum_fields=["market_value"]
+                )
+                total_value = Decimal(str(totals['sum_market_value'])) if totals else Decimal('0')
 
             # Add cash if tracked separately
             # For now, assume minimum portfolio value for calculations
@@ -104,10 +156,15 @@ class RiskManager:
     async def get_position_value(self, symbol: str) -> Decimal:
         """Get current position value for a symbol."""
         try:
-            positions = await firestore_client.query_documents(
-                "pf_positions_active",
-                filters=[("symbol", "==", symbol), ("status", "==", "active")]
-            )
+            view = live_positions()
+            if view is not None:
+                positions = view.find(symbol)
+            else:
+                positions = await firestore_client.query_documents(
+                    "pf_positions_active",
+                    filters=[("symbol", "==", symbol), ("status", "==", "active")],
+                    select=["market_value"]
+                )
 
             if positions:
                 position = positions[0]
@@ -123,6 +180,7 @@ class RiskManager:
     async def calculate_position_size(self, symbol: str, current_price: Decimal,
                                       confidence: float) -> int:
         """Calculate appropriate position size based on risk rules."""
+        started = time.perf_counter()
         try:
             portfolio_value = await self.get_portfolio_value()
 
@@ -145,7 +203,8 @@ class RiskManager:
                              symbol=symbol,
                              shares=shares,
                              position_value=float(position_value),
-                             confidence=confidence)
+                             confidence=confidence,
+                             duration_ms=round((time.perf_counter() - started) * 1000, 1))
 
             return shares
 
@@ -176,15 +235,21 @@ class RiskManager:
         """Check if portfolio is within risk limits."""
         try:
             # For now, just check if we have too many positions
-            positions = await firestore_client.query_documents(
-                "pf_positions_active",
-                filters=[("status", "==", "active")]
-            )
+            view = live_positions()
+            if view is not None:
+                position_count = len(view)
+            else:
+                position_count = await firestore_client.count_documents(
+                    "pf_positions_active",
+                    filters=[("status", "==", "active")]
+                )
+            if position_count is None:
+                return False
 
             # Limit to 20 active positions max
-            if len(positions) >= 20:
+            if position_count >= 20:
                 self.logger.warning(
-                    "Portfolio position limit reached", count=len(positions))
+                    "Portfolio position limit reached", count=position_count)
                 return False
 
             return True
@@ -205,12 +270,20 @@ class StrategyEngine:
     async def get_current_price(self, symbol: str) -> Optional[Decimal]:
         """Get current price for a symbol."""
         try:
+            if reads_columnar():
+                closes = await latest_closes(firestore_client, [symbol])
+                if symbol in closes:
+                    return Decimal(str(closes[symbol]))
+                return None
+
             # Get most recent price data
             prices = await firestore_client.query_documents(
                 "di_prices_daily",
                 filters=[("symbol", "==", symbol)],
                 order_by="date",
-                limit=1
+                descending=True,
+                limit=1,
+                select=["close_price"]
             )
 
             if prices:
@@ -223,6 +296,39 @@ class StrategyEngine:
                               symbol=symbol, error=str(e))
             return None
 
+    async def get_current_prices(self, symbols: List[str]) -> Dict[str, Decimal]:
+        """Get current prices for several symbols in a handful of round trips."""
+        try:
+            if reads_columnar():
+                closes = await latest_closes(firestore_client, symbols)
+                return {symbol: Decimal(str(close)) for symbol, close in closes.items()}
+
+            cutoff_date = datetime.now() - timedelta(days=PRICE_LOOKBACK_DAYS)
+            prices = await firestore_client.query_documents_in(
+                "di_prices_daily", "symbol", symbols,
+                filters=[("date", ">=", cutoff_date)],
+                order_by="date",
+                descending=True,
+                select=["symbol", "close_price"]
+            )
+
+            current_prices = {}
+            for price in prices:
+                if price['symbol'] not in current_prices:
+                    current_prices[price['symbol']] = Decimal(str(price['close_price']))
+
+            missing = [symbol for symbol in dict.fromkeys(symbols) if symbol not in current_prices]
+            fallback = await asyncio.gather(*[self.get_current_price(symbol) for symbol in missing])
+            current_prices.update(
+                {symbol: price for symbol, price in zip(missing, fallback) if price})
+
+            return current_prices
+
+        except Exception as e:
+            self.logger.error("Error getting current prices",
+                              symbols=len(symbols), error=str(e))
+            return {}
+
     async def get_recent_ml_recommendations(self, hours_back: int = 24) -> List[Dict[str, Any]]:
         """Get recent ML recommendations."""
         try:
@@ -289,15 +395,17 @@ class StrategyEngine:
             self.logger.error("Error applying sell filters", error=str(e))
             return False
 
-    async def generate_trade_signal(self, recommendation: Dict[str, Any]) -> Optional[TradeSignal]:
+    async def generate_trade_signal(self, recommendation: Dict[str, Any],
+                                    current_price: Optional[Decimal] = None) -> Optional[TradeSignal]:
         """Generate a trade signal from an ML recommendation."""
         try:
             symbol = recommendation['symbol']
             rec_type = RecommendationType(recommendation['recommendation'])
             confidence = recommendation['confidence_score']
 
-            # Get current price
-            current_price = await self.get_current_price(symbol)
+            # Get current price unless the caller prefetched it
+            if current_price is None:
+                current_price = await self.get_current_price(symbol)
             if not current_price:
                 self.logger.warning(
                     "Cannot generate signal: no price data", symbol=symbol)
@@ -318,11 +426,16 @@ class StrategyEngine:
                     return None
 
                 # For sell signals, sell entire position
-                positions = await firestore_client.query_documents(
-                    "pf_positions_active",
-                    filters=[("symbol", "==", symbol),
-                             ("status", "==", "active")]
-                )
+                view = live_positions()
+                if view is not None:
+                    positions = view.find(symbol)
+                else:
+                    positions = await firestore_client.query_documents(
+                        "pf_positions_active",
+                        filters=[("symbol", "==", symbol),
+                                 ("status", "==", "active")],
+                        select=["quantity"]
+                    )
 
                 if not positions:
                     return None
@@ -339,8 +452,8 @@ class StrategyEngine:
             take_profit = self.risk_manager.calculate_take_profit(
                 current_price, rec_type)
 
-            # Create trade signal
-            signal = TradeSignal(
+            # Create trade signal; prices come from Firestore or the risk manager
+            signal = TradeSignal.from_trusted(
                 symbol=symbol,
                 signal_type=rec_type,
                 quantity=abs(quantity),  # Ensure positive quantity
@@ -376,6 +489,8 @@ class StrategyEngine:
 
             signals = []
             processed_symbols = set()  # Avoid duplicate signals for same symbol
+            current_prices = await self.get_current_prices(
+                [rec['symbol'] for rec in recommendations])
 
             # Process recommendations (most recent first)
             for rec in reversed(recommendations):
@@ -386,7 +501,8 @@ class StrategyEngine:
                     continue
 
                 # Generate trade signal
-                signal = await self.generate_trade_signal(rec)
+                signal = await self.generate_trade_signal(
+                    rec, current_prices.get(symbol))
 
                 if signal:
                     signals.append(signal)